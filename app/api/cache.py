@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from app.models.activity import today_epoch_day
+
+def goal_response_key(kind: str, goal_id: Hashable, version: int, fingerprint: str) -> tuple:
+    """Cache key (and ETag source) of a goal payload
+
+    Today's day number is part of it because the weekly window moves at
+    midnight even when nothing is written; the rules' fingerprint because
+    the payload depends on them.
+    """
+    return (kind, goal_id, version, today_epoch_day(), fingerprint)
+
+class ResponseCache:
+    """Bounded LRU cache of encoded response bodies
+
+    Keys carry the goal's version, so a write makes older entries
+    unreachable instead of requiring explicit invalidation; they simply age
+    out of the LRU.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value and mark it recently used"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def contains(self, key: Hashable) -> bool:
+        """Whether a key is cached, without counting a lookup or touching recency"""
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entries if full"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for tuning the cache size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,364 @@
+"""Request parsing and response payloads shared by the Flask blueprint and the ASGI app
+
+Both front ends route the ROUTES table and call these functions, so each
+endpoint's arguments, validation messages and response bodies are defined
+once; the front ends only read requests and write responses.
+"""
+import base64
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from app.api.cache import goal_response_key
+from app.encoding import dumps, join_array, loads
+from app.metrics import HTTP_REQUESTS, HTTP_ERRORS, HTTP_IN_FLIGHT, HTTP_LATENCY
+from app.models.activity import DAY_US, Activity, to_epoch_us
+from app.services.activity_service import validate_activity_data
+
+API_PREFIX = '/api'
+GOAL_ACTIVITIES_URL = API_PREFIX + '/goals/{goal_id}/activities'
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+# Endpoint name -> (method, rule under API_PREFIX). The Flask view and the
+# ASGI handler of an endpoint carry its name, and metrics use the full rule.
+ROUTES: Dict[str, Tuple[str, str]] = {
+    'create_activity': ('POST', '/activities'),
+    'create_activities_batch': ('POST', '/activities/batch'),
+    'get_dashboard': ('GET', '/dashboard/<int:goal_id>'),
+    'list_goal_activities': ('GET', '/goals/<int:goal_id>/activities'),
+    'stream_goal_dashboard': ('GET', '/goals/<int:goal_id>/stream'),
+    'get_optimization_insights': ('GET', '/insights/optimization'),
+    'get_bulk_insights': ('POST', '/insights/bulk'),
+    'get_insight_rules': ('GET', '/insights/rules'),
+    'get_leaderboard': ('GET', '/leaderboard'),
+    'get_goal_stats': ('GET', '/goals/<int:goal_id>/stats'),
+    'get_cache_stats': ('GET', '/cache/stats'),
+    'get_metrics': ('GET', '/metrics'),
+    'get_profiles': ('GET', '/metrics/profiles'),
+    'health_check': ('GET', '/health'),
+}
+
+NOT_FOUND = {
+    "error": "Endpoint not found",
+    "message": "Check the API documentation at /"
+}
+INTERNAL_ERROR = {
+    "error": "Internal server error",
+    "message": "Something went wrong on our end"
+}
+
+def error_payload(message: str) -> Dict[str, Any]:
+    return {"error": message, "status": "error"}
+
+def success_payload(data: Mapping[str, Any]) -> Dict[str, Any]:
+    return {**data, "status": "success"}
+
+# ========== REQUEST PARSING ==========
+def load_json(body: bytes) -> Any:
+    """Decode a JSON request body; an empty body is None"""
+    if not body:
+        return None
+    try:
+        return loads(body)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+
+def int_arg(args: Mapping[str, str], name: str, default: Optional[int] = None) -> Optional[int]:
+    """An integer query parameter; a missing or malformed one gives the default"""
+    value = args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+def parse_time_arg(args: Mapping[str, str], name: str) -> Optional[datetime]:
+    """Read an optional ISO timestamp query parameter"""
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid '{name}' timestamp: {value}")
+
+def encode_cursor(activity) -> str:
+    """Opaque keyset cursor for the position just after an activity"""
+    return base64.urlsafe_b64encode(f"{activity.ts}:{activity.id}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    """Turn a cursor back into the (epoch microseconds, id) key"""
+    try:
+        epoch_us, activity_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return int(epoch_us), int(activity_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+def parse_page_request(args: Mapping[str, str],
+                       settings: Mapping[str, Any]) -> Tuple[int, Dict[str, Any]]:
+    """Validate listing arguments into (limit, get_goal_page keyword arguments)"""
+    limit = int_arg(args, 'limit', settings.get('PAGE_SIZE_DEFAULT', 100))
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    cursor = args.get('cursor')
+    return min(limit, settings.get('PAGE_SIZE_MAX', 1000)), {
+        "after": decode_cursor(cursor) if cursor else None,
+        "start": parse_time_arg(args, 'from'),
+        "end": parse_time_arg(args, 'to'),
+        "activity_type": args.get('activity_type') or None
+    }
+
+def parse_insights_goal_id(args: Mapping[str, str]) -> int:
+    goal_id = int_arg(args, 'goal_id')
+    if not goal_id:
+        raise ValueError("Missing goal_id parameter")
+    return goal_id
+
+def parse_leaderboard_request(args: Mapping[str, str], settings: Mapping[str, Any]) -> Tuple[str, int]:
+    """Validate leaderboard arguments into (metric, k)"""
+    k = int_arg(args, 'k', settings.get('LEADERBOARD_DEFAULT_K', 10))
+    if k < 1:
+        raise ValueError("k must be a positive integer")
+    return args.get('metric', 'consistency_score'), min(k, settings.get('LEADERBOARD_MAX_K', 100))
+
+DEFAULT_QUANTILES = '0.5,0.9'
+MAX_QUANTILES = 20
+
+def parse_stats_request(args: Mapping[str, str]) -> Tuple[List[float], Optional[int], Optional[int]]:
+    """Validate stats arguments into (quantiles, first_day, last_day) for the day window [from, to)"""
+    quantiles = args.get('quantiles')
+    try:
+        qs = [float(q) for q in (quantiles or DEFAULT_QUANTILES).split(',')]
+    except ValueError:
+        raise ValueError(f"Invalid quantiles: {quantiles}")
+    if len(qs) > MAX_QUANTILES:
+        raise ValueError(f"At most {MAX_QUANTILES} quantiles per request")
+    if not all(0 <= q <= 1 for q in qs):
+        raise ValueError("Quantiles must be between 0 and 1")
+    start, end = parse_time_arg(args, 'from'), parse_time_arg(args, 'to')
+    first_day = to_epoch_us(start) // DAY_US if start is not None else None
+    last_day = (to_epoch_us(end) - 1) // DAY_US if end is not None else None
+    return qs, first_day, last_day
+
+BULK_FILTER_FIELDS = {
+    'activity_type': str,
+    'min_activities': int,
+    'goal_id_min': int,
+    'goal_id_max': int
+}
+
+def parse_bulk_insights_request(data):
+    """Validate a bulk insights body into (goal_ids, filter keyword arguments)"""
+    if not isinstance(data, dict) or ('goal_ids' not in data and 'filter' not in data):
+        raise ValueError("Expected a JSON object with 'goal_ids' and/or 'filter'")
+
+    goal_ids = data.get('goal_ids')
+    if goal_ids is not None and (not isinstance(goal_ids, list) or
+                                 not all(isinstance(goal_id, int) for goal_id in goal_ids)):
+        raise ValueError("'goal_ids' must be a list of integers")
+
+    goal_filter = data.get('filter') or {}
+    if not isinstance(goal_filter, dict):
+        raise ValueError("'filter' must be an object")
+    for name, value in goal_filter.items():
+        expected = BULK_FILTER_FIELDS.get(name)
+        if expected is None:
+            raise ValueError(f"Unknown filter field: {name}")
+        if not isinstance(value, expected):
+            raise ValueError(f"Filter field '{name}' must be of type {expected.__name__}")
+    return goal_ids, goal_filter
+
+def wants_ndjson(accept: Optional[str]) -> bool:
+    """Whether the Accept header prefers NDJSON over a JSON envelope"""
+    accepted = parse_accept_header(accept, MIMEAccept)
+    return accepted.best_match(('application/json',) + NDJSON_MIMETYPES) in NDJSON_MIMETYPES
+
+def wants_profile(settings: Mapping[str, Any], header: Optional[str], arg: Optional[str]) -> bool:
+    """Whether to sample this request's stack (X-Profile: 1 or ?profile=1)"""
+    return bool(settings.get('PROFILING_ENABLED')) and (header == '1' or arg == '1')
+
+# ========== BATCH INGEST ==========
+def batch_array_records(body: bytes) -> List[Any]:
+    """Records of a JSON batch body: an array, or an object with an 'activities' array"""
+    data = load_json(body)
+    if isinstance(data, dict):
+        data = data.get('activities')
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of activities or an NDJSON body")
+    return data
+
+def iter_ndjson_records(lines: Iterable[bytes]) -> Iterator[Any]:
+    """One record per non-blank line; a line that is not JSON yields its error in its place"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield loads(line)
+        except ValueError as e:
+            yield ValueError(f"Invalid JSON: {e}")
+
+class BatchIngest:
+    """Validates batch records one by one and groups the valid ones into insert chunks
+
+    Invalid records are kept by index for the response, so the rest of the
+    batch is still stored.
+    """
+
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.errors: List[Dict[str, Any]] = []
+        self._chunk: List[dict] = []
+        self._index = 0
+
+    def add(self, record: Any) -> Optional[List[dict]]:
+        """Validate the next record; returns a chunk when one is full and due for insertion"""
+        index = self._index
+        self._index += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            self._chunk.append(validate_activity_data(record))
+        except ValueError as e:
+            self.errors.append({"index": index, "error": str(e)})
+            return None
+        if len(self._chunk) < self.chunk_size:
+            return None
+        return self.flush()
+
+    def flush(self) -> Optional[List[dict]]:
+        """The remaining valid records, if any"""
+        chunk, self._chunk = self._chunk, []
+        return chunk or None
+
+    def stored(self, activities: List[Activity]) -> None:
+        self.created += len(activities)
+
+    def result(self) -> Tuple[Dict[str, Any], int]:
+        """Response payload and status: 201 when every record was stored, else 207"""
+        return {
+            "message": f"Logged {self.created} activities",
+            "created": self.created,
+            "failed": len(self.errors),
+            "errors": self.errors,
+            "status": "success" if not self.errors else "partial"
+        }, 201 if not self.errors else 207
+
+# ========== RESPONSE PAYLOADS ==========
+def notify_writes(activities: List[Activity], precompute, dashboard_stream) -> List[Activity]:
+    """Queue the written goals for background precompute and stream pushes, when running"""
+    if not activities:
+        return activities
+    goal_ids = {activity.goal_id for activity in activities}
+    if precompute is not None:
+        precompute.mark_dirty(goal_ids)
+    if dashboard_stream is not None:
+        dashboard_stream.notify(goal_ids)
+    return activities
+
+def created_payload(activity: Activity) -> Dict[str, Any]:
+    return {
+        "message": "Activity logged successfully",
+        "activity": activity.to_dict(),
+        "status": "success"
+    }
+
+def goal_cache_key(kind: str, goal_id: int, version: int, rules) -> Tuple[tuple, str]:
+    """Cache key of a goal payload and the ETag made from it
+
+    The key is the goal's write version plus today's day number, since the
+    weekly health window moves at midnight, plus the insight rules'
+    fingerprint, so edited rules take effect at once.
+    """
+    key = goal_response_key(kind, goal_id, version, rules.plan().fingerprint)
+    return key, '-'.join(str(part) for part in key)
+
+def activity_page_body(goal_id: int, page: List[Activity], next_cursor: Optional[str]) -> bytes:
+    """Listing response body, concatenated from the activities' cached JSON fragments"""
+    return b'{"goal_id":%b,"activities":%b,"count":%d,"next_cursor":%b,"status":"success"}' % (
+        dumps(goal_id), join_array(activity.to_json() for activity in page), len(page), dumps(next_cursor))
+
+def page_body(goal_id: int, rows: List[Activity], limit: int) -> bytes:
+    """Listing body from up to limit + 1 rows; the extra row only shows another page exists"""
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(rows) > limit else None
+    return activity_page_body(goal_id, page, next_cursor)
+
+def iter_bulk_body(insights: Iterable[Dict[str, Any]], ndjson: bool) -> Iterator[bytes]:
+    """Bulk insights as NDJSON lines or a streamed {"goals": [...]} envelope"""
+    if ndjson:
+        for payload in insights:
+            yield dumps(payload) + b'\n'
+        return
+    yield b'{"goals":['
+    count = 0
+    for payload in insights:
+        yield (b',' if count else b'') + dumps(payload)
+        count += 1
+    yield b'],"count":%d,"status":"success"}' % count
+
+def rules_payload(rules) -> Dict[str, Any]:
+    """The insight rules in effect and whether the rules file last loaded cleanly"""
+    plan = rules.plan()
+    return {
+        "source": rules.path or "built-in",
+        "fingerprint": plan.fingerprint,
+        "last_error": rules.last_error,
+        "rules": plan.spec,
+        "status": "success"
+    }
+
+def cache_stats_payload(cache, precompute, dashboard_stream) -> Dict[str, Any]:
+    return {
+        **cache.stats(),
+        "precompute": precompute.stats() if precompute is not None else None,
+        "dashboard_stream": dashboard_stream.stats() if dashboard_stream is not None else None,
+        "status": "success"
+    }
+
+def profiles_payload(settings: Mapping[str, Any], profile_log) -> Dict[str, Any]:
+    return {
+        "enabled": bool(settings.get('PROFILING_ENABLED')),
+        "profiles": profile_log.entries(),
+        "status": "success"
+    }
+
+def health_payload() -> Dict[str, Any]:
+    return {
+        "status": "healthy",
+        "service": "Life Design Backend",
+        "timestamp": datetime.now().isoformat()
+    }
+
+# Server-Sent Events framing of GET /goals/<goal_id>/stream
+SSE_PREAMBLE = b'retry: 3000\n\n'
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+def sse_chunk(events: List[bytes]) -> bytes:
+    # A comment line keeps proxies from timing an idle stream out
+    return b''.join(events) if events else b': keepalive\n\n'
+
+# ========== REQUEST METRICS ==========
+def observe_request(labels: Tuple[str, str], elapsed: float, status: int) -> None:
+    """Record a finished request under its (method, rule) labels"""
+    HTTP_IN_FLIGHT.dec(*labels)
+    HTTP_LATENCY.observe(elapsed, *labels)
+    HTTP_REQUESTS.inc(*labels, str(status))
+    if status >= 500:
+        HTTP_ERRORS.inc(*labels)
+
+def profile_entry(method: str, path: str, status: int, elapsed: float, samples) -> Dict[str, Any]:
+    """A sampled request for the profile log"""
+    return {
+        "method": method,
+        "path": path,
+        "status": status,
+        "duration_ms": round(elapsed * 1000, 3),
+        "samples": sum(samples.values()),
+        "stacks": [{"stack": stack, "samples": count}
+                   for stack, count in samples.most_common(25)]
+    }
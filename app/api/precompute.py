@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, Iterable, Mapping, Optional, Set
+
+from app.api.cache import ResponseCache, goal_response_key
+from app.encoding import dumps
+from app.metrics import PRECOMPUTED_PAYLOADS
+from app.models.activity import DAY_US, to_epoch_us, today_epoch_day
+from app.repository import BaseRepository
+from app.services.dashboard_service import DashboardService
+from app.services.rules import RuleBook
+
+class PrecomputeScheduler:
+    """Rebuilds the dashboard and insight bodies of changed goals in the background
+
+    Writes mark goals dirty. A goal is picked up by one of ``workers``
+    threads once it has been dirty for ``coalesce_seconds``, so a burst of
+    writes to it costs one recomputation; a goal marked again while being
+    computed is queued once more. Results land in the response cache under
+    the same keys the request handlers use, so handlers serve them directly
+    and only compute on a miss.
+
+    Goals written or requested within the last ``active_days`` days are
+    recomputed just after midnight, when the weekly window moves.
+    """
+
+    KINDS = ('dashboard', 'insights')
+
+    def __init__(self, repository: BaseRepository, cache: ResponseCache, rules: RuleBook,
+                 activities_url: str, workers: int = 2, coalesce_seconds: float = 0.1,
+                 active_days: int = 7):
+        self.repository = repository
+        self.cache = cache
+        self.rules = rules
+        self.coalesce_seconds = coalesce_seconds
+        self.active_days = active_days
+        self.dashboard_service = DashboardService(repository, activities_url, rules)
+
+        # goal_id -> monotonic time it was first marked, oldest first
+        self._dirty: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._running: Set[Hashable] = set()
+        # goal_id -> epoch day it was last written or requested
+        self._active: Dict[Hashable, int] = {}
+        self._condition = threading.Condition()
+        self._stopping = False
+        self.computed = 0
+        self.failed = 0
+
+        self._threads = [threading.Thread(target=self._work, name=f'precompute-{index}', daemon=True)
+                         for index in range(workers)]
+        self._threads.append(threading.Thread(target=self._watch_day_boundary,
+                                              name='precompute-clock', daemon=True))
+
+    def start(self) -> "PrecomputeScheduler":
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join()
+
+    # ========== TRACKING ==========
+    def mark_dirty(self, goal_ids: Iterable[Hashable]) -> None:
+        """Queue goals whose activities changed"""
+        now = time.monotonic()
+        today = today_epoch_day()
+        with self._condition:
+            for goal_id in goal_ids:
+                self._active[goal_id] = today
+                if goal_id not in self._dirty:
+                    self._dirty[goal_id] = now
+            self._condition.notify_all()
+
+    def touch(self, goal_id: Hashable, version: int) -> None:
+        """Note a request for a goal, keeping it in the day-boundary set
+
+        Goals without activities (version 0) are not recorded, so polling
+        unknown ids does not queue them for recomputation at midnight.
+        """
+        if version <= 0:
+            return
+        with self._condition:
+            self._active[goal_id] = today_epoch_day()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "pending": len(self._dirty),
+                "running": len(self._running),
+                "active_goals": len(self._active),
+                "computed": self.computed,
+                "failed": self.failed
+            }
+
+    # ========== WORKERS ==========
+    def _next_goal(self) -> Optional[Hashable]:
+        """Wait for a goal whose coalescing window has passed and claim it"""
+        with self._condition:
+            while not self._stopping:
+                wait = None
+                now = time.monotonic()
+                for goal_id, marked in self._dirty.items():
+                    if goal_id in self._running:
+                        continue
+                    ready_in = marked + self.coalesce_seconds - now
+                    if ready_in <= 0:
+                        del self._dirty[goal_id]
+                        self._running.add(goal_id)
+                        return goal_id
+                    # Marks are in time order, so later goals are not ready either
+                    wait = ready_in
+                    break
+                self._condition.wait(wait)
+            return None
+
+    def _work(self) -> None:
+        while True:
+            goal_id = self._next_goal()
+            if goal_id is None:
+                return
+            try:
+                self.precompute(goal_id)
+                succeeded = True
+            except Exception:
+                # The request path computes it synchronously on a miss instead
+                succeeded = False
+            with self._condition:
+                self._running.discard(goal_id)
+                if succeeded:
+                    self.computed += 1
+                else:
+                    self.failed += 1
+                self._condition.notify_all()
+
+    def precompute(self, goal_id: Hashable) -> None:
+        """Build and cache every payload of a goal that is not cached yet"""
+        fingerprint = self.rules.plan().fingerprint
+        version = self.repository.get_goal_version(goal_id)
+        for kind in self.KINDS:
+            key = goal_response_key(kind, goal_id, version, fingerprint)
+            if self.cache.contains(key):
+                continue
+            build = self.dashboard_service.build_dashboard if kind == 'dashboard' \
+                else self.dashboard_service.build_insights
+            self.cache.put(key, dumps(build(goal_id)))
+            PRECOMPUTED_PAYLOADS.inc(kind)
+
+    # ========== DAY BOUNDARY ==========
+    def _watch_day_boundary(self) -> None:
+        while True:
+            # Wake just after local midnight
+            tomorrow_us = (today_epoch_day() + 1) * DAY_US
+            seconds = (tomorrow_us - to_epoch_us(datetime.now())) / 1e6 + 0.5
+            with self._condition:
+                if self._condition.wait_for(lambda: self._stopping, timeout=seconds):
+                    return
+            self.start_new_day()
+
+    def start_new_day(self) -> None:
+        """Forget long-idle goals and queue the rest for recomputation"""
+        today = today_epoch_day()
+        now = time.monotonic()
+        with self._condition:
+            self._active = {goal_id: day for goal_id, day in self._active.items()
+                            if today - day < self.active_days}
+            for goal_id in self._active:
+                self._dirty.setdefault(goal_id, now)
+            self._condition.notify_all()
+
+def start_precompute(repository: BaseRepository, cache: ResponseCache, rules: RuleBook,
+                     activities_url: str,
+                     settings: Mapping[str, Any]) -> Optional[PrecomputeScheduler]:
+    """Start a scheduler with PRECOMPUTE_WORKERS threads (0 disables it)"""
+    workers = settings.get('PRECOMPUTE_WORKERS', 2)
+    if not workers:
+        return None
+    return PrecomputeScheduler(repository, cache, rules, activities_url, workers,
+                               settings.get('PRECOMPUTE_COALESCE_MS', 100) / 1000,
+                               settings.get('PRECOMPUTE_ACTIVE_DAYS', 7)).start()
@@ -1,251 +1,297 @@
-from flask import Blueprint, request, jsonify
-from datetime import datetime, timedelta 
-import json
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context, g
+import threading
+import time
+from typing import List
+from app.encoding import dumps
+from app.metrics import REGISTRY, HTTP_IN_FLIGHT, SamplingProfiler
+from app.services.activity_service import ActivityService, validate_activity_data
+from app.services.insight_service import InsightService
+from app.services.dashboard_service import DashboardService
+from app.api.endpoints import (GOAL_ACTIVITIES_URL, NDJSON_MIMETYPES, ROUTES, SSE_HEADERS, SSE_PREAMBLE,
+                               BatchIngest, batch_array_records, cache_stats_payload, created_payload,
+                               error_payload, goal_cache_key, health_payload, iter_bulk_body,
+                               iter_ndjson_records, load_json, notify_writes, observe_request, page_body,
+                               parse_bulk_insights_request, parse_insights_goal_id,
+                               parse_leaderboard_request, parse_page_request, parse_stats_request,
+                               profile_entry, profiles_payload, rules_payload, sse_chunk,
+                               success_payload, wants_ndjson, wants_profile)
+from app.api.stream import StreamLimitError, StreamSubscriber
+from app.models.activity import Activity
 
 # Create blueprint
 api_bp = Blueprint('api', __name__)
 
-# Simple in-memory storage for now
-activities_db = []
-next_id = 1
+def route(endpoint: str):
+    """Register a view under its method and rule from the shared ROUTES table"""
+    method, rule = ROUTES[endpoint]
+    return api_bp.route(rule, methods=[method], endpoint=endpoint)
 
 # ========== HELPER FUNCTIONS ==========
-def calculate_consistency_score(goal_activities):
-    """Calculate consistency score 0.0 to 1.0"""
-    if not goal_activities:
-        return 0.0
-    
-    # Get unique dates
-    dates = sorted(set(datetime.fromisoformat(a["timestamp"]).date() 
-                      for a in goal_activities))
-    
-    if len(dates) < 2:
-        return 0.5
-    
-    # Find longest streak
-    max_streak = 0
-    current_streak = 1
-    
-    for i in range(1, len(dates)):
-        days_diff = (dates[i] - dates[i-1]).days
-        if days_diff == 1:
-            current_streak += 1
-            max_streak = max(max_streak, current_streak)
-        else:
-            current_streak = 1
-    
-    score = max_streak / len(dates)
-    return round(min(score, 1.0), 2)
-
-def get_weekly_health_total(goal_activities):
-    """Calculate total health activities for past week"""
-    one_week_ago = datetime.now() - timedelta(days=7)
-    
-    health_total = 0
-    for activity in goal_activities:
-        if activity["activity_type"] == "Health":
-            activity_time = datetime.fromisoformat(activity["timestamp"])
-            if activity_time >= one_week_ago:
-                health_total += activity["value"]
-    
-    return health_total
-
-def generate_recommendation(goal_activities):
-    """Generate personalized recommendation"""
-    if not goal_activities:
-        return "Start logging activities to get personalized recommendations!"
-    
-    # Calculate totals
-    health_total = 0
-    learning_total = 0
-    
-    for activity in goal_activities:
-        if activity["activity_type"] == "Health":
-            health_total += activity["value"]
-        elif activity["activity_type"] == "Learning":
-            learning_total += activity["value"]
-    
-    weekly_health = get_weekly_health_total(goal_activities)
-    
-    # Generate recommendations
-    if weekly_health < 150:
-        if learning_total > 300:
-            return "High learning activity detected but physical wellness is low. Consider rebalancing your growth plan."
-        else:
-            return "Try to reach 150+ minutes of health activities per week for optimal wellness."
-    
-    if learning_total > 400:
-        return "Great learning consistency! Keep maintaining your study habits."
-    
-    return "Your activity pattern looks balanced. Keep tracking your progress!"
+def get_services():
+    """Build services bound to the application's activity repository"""
+    repository = current_app.extensions['activity_repository']
+    return ActivityService(repository), InsightService(repository, current_app.extensions['insight_rules'])
+
+def error_response(message: str, status: int):
+    return jsonify(error_payload(message)), status
+
+def record_writes(activities: List[Activity]) -> List[Activity]:
+    """Queue the written goals for background precompute and stream pushes, when enabled"""
+    return notify_writes(activities, current_app.extensions['precompute'],
+                         current_app.extensions['dashboard_stream'])
+
+def cached_goal_response(kind: str, goal_id: int) -> Response:
+    """Serve a goal payload from the versioned cache, honouring If-None-Match"""
+    repository = current_app.extensions['activity_repository']
+    cache = current_app.extensions['response_cache']
+    rules = current_app.extensions['insight_rules']
+    precompute = current_app.extensions['precompute']
+    version = repository.get_goal_version(goal_id)
+    if precompute is not None:
+        precompute.touch(goal_id, version)
+    
+    key, etag = goal_cache_key(kind, goal_id, version, rules)
+    
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        body = cache.get(key)
+        if body is None:
+            # Not precomputed yet (or precompute is off): build it now
+            dashboard_service = DashboardService(repository, GOAL_ACTIVITIES_URL, rules)
+            build = dashboard_service.build_dashboard if kind == 'dashboard' else dashboard_service.build_insights
+            body = dumps(build(goal_id))
+            cache.put(key, body)
+        response = Response(body, mimetype='application/json')
+    
+    response.set_etag(etag)
+    return response
+
+def iter_stream_lines(stream, block_size=1 << 16):
+    """Split a byte stream into lines, reading it in fixed-size blocks"""
+    pending = b''
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        lines = (pending + block).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+def iter_batch_records():
+    """Raw records from the request body, one per activity
+    
+    NDJSON bodies are read line by line from the stream, so a large upload
+    is never held in memory at once.
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        return iter_ndjson_records(iter_stream_lines(request.stream))
+    return iter(batch_array_records(request.get_data()))
+
+# ========== REQUEST METRICS ==========
+@api_bp.before_request
+def start_request_metrics():
+    """Count the request in flight and, if asked to, start sampling its stack"""
+    if not current_app.config.get('METRICS_ENABLED', True):
+        return
+    # The rule, not the path, so goal ids do not multiply the label sets
+    g.metrics_labels = (request.method, request.url_rule.rule)
+    g.metrics_started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc(*g.metrics_labels)
+    
+    if wants_profile(current_app.config, request.headers.get('X-Profile'), request.args.get('profile')):
+        interval = current_app.config.get('PROFILE_SAMPLE_INTERVAL_MS', 1) / 1000
+        g.profiler = SamplingProfiler(threading.get_ident(), interval).start()
+
+@api_bp.after_request
+def record_response_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@api_bp.teardown_request
+def finish_request_metrics(error=None):
+    """Record latency and status once the response, streamed or not, is done"""
+    labels = g.pop('metrics_labels', None)
+    if labels is None:
+        return
+    elapsed = time.perf_counter() - g.pop('metrics_started')
+    status = 500 if error is not None else g.pop('metrics_status', 500)
+    observe_request(labels, elapsed, status)
+    
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        current_app.extensions['profile_log'].add(profile_entry(
+            request.method, request.full_path.rstrip('?'), status, elapsed, profiler.stop()
+        ))
 
 # ========== API ENDPOINTS ==========
-@api_bp.route('/activities', methods=['POST'])
+@route('create_activity')
 def create_activity():
     """Log a new activity"""
-    global next_id
-    
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        required_fields = ['goal_id', 'activity_type', 'value']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    "error": f"Missing required field: {field}",
-                    "status": "error"
-                }), 400
+        activity_service, _ = get_services()
+        data = load_json(request.get_data())
         
-        # Create activity
-        activity = {
-            "id": next_id,
-            "goal_id": data['goal_id'],
-            "activity_type": data['activity_type'],
-            "value": float(data['value']),
-            "timestamp": data.get('timestamp', datetime.now().isoformat()),
-            "notes": data.get('notes')
-        }
+        # Validate and create activity
+        activity = activity_service.create_activity(validate_activity_data(data))
+        record_writes([activity])
         
-        activities_db.append(activity)
-        next_id += 1
-        
-        return jsonify({
-            "message": "Activity logged successfully",
-            "activity": activity,
-            "status": "success"
-        }), 201
+        return jsonify(created_payload(activity)), 201
         
     except Exception as e:
-        return jsonify({
-            "error": str(e),
-            "status": "error"
-        }), 400
+        return error_response(str(e), 400)
+
+@route('create_activities_batch')
+def create_activities_batch():
+    """Log many activities from a JSON array or a streamed NDJSON body
+    
+    Invalid records are reported by index and the rest are stored; only a
+    body that is not an array or NDJSON fails the request as a whole.
+    """
+    activity_service, _ = get_services()
+    batch = BatchIngest(current_app.config.get('BATCH_CHUNK_SIZE', 5000))
+    try:
+        for record in iter_batch_records():
+            chunk = batch.add(record)
+            if chunk:
+                batch.stored(record_writes(activity_service.create_activities(chunk)))
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    chunk = batch.flush()
+    if chunk:
+        batch.stored(record_writes(activity_service.create_activities(chunk)))
+    
+    payload, status = batch.result()
+    return jsonify(payload), status
 
-@api_bp.route('/dashboard/<int:goal_id>', methods=['GET'])
+@route('get_dashboard')
 def get_dashboard(goal_id):
     """Get dashboard for a specific goal"""
     try:
-        # Get activities for this goal
-        goal_activities = [a for a in activities_db if a["goal_id"] == goal_id]
-        
-        if not goal_activities:
-            return jsonify({
-                "goal_id": goal_id,
-                "message": "No activities found",
-                "status": "success"
-            })
-        
-        # Calculate summary
-        total_value = sum(a["value"] for a in goal_activities)
-        
-        # Group by type
-        activity_by_type = {}
-        for activity in goal_activities:
-            activity_type = activity["activity_type"]
-            if activity_type not in activity_by_type:
-                activity_by_type[activity_type] = {
-                    "count": 0,
-                    "total_value": 0
-                }
-            activity_by_type[activity_type]["count"] += 1
-            activity_by_type[activity_type]["total_value"] += activity["value"]
+        return cached_goal_response('dashboard', goal_id)
         
-        # Calculate metrics
-        consistency_score = calculate_consistency_score(goal_activities)
-        weekly_health = get_weekly_health_total(goal_activities)
-        wellness_warning = weekly_health < 150
-        recommendation = generate_recommendation(goal_activities)
-        
-        # Get last activity
-        last_activity = max(goal_activities, 
-                           key=lambda x: datetime.fromisoformat(x["timestamp"]))
+    except Exception as e:
+        return error_response(str(e), 500)
+
+@route('list_goal_activities')
+def list_goal_activities(goal_id):
+    """List a goal's activities by timestamp, one cursor page at a time"""
+    try:
+        activity_service, _ = get_services()
+        limit, query = parse_page_request(request.args, current_app.config)
         
-        return jsonify({
-            "goal_id": goal_id,
-            "summary": {
-                "total_activities": len(goal_activities),
-                "total_value": total_value,
-                "average_value": total_value / len(goal_activities),
-                "activity_by_type": activity_by_type,
-                "last_activity": last_activity["timestamp"]
-            },
-            "activities": goal_activities,
-            "consistency_score": consistency_score,
-            "wellness_warning": wellness_warning,
-            "recommendation": recommendation,
-            "status": "success"
-        })
+        # Fetch one extra row to learn whether another page exists
+        rows = activity_service.repository.get_goal_page(goal_id, limit + 1, **query)
         
-    except Exception as e:
-        return jsonify({
-            "error": str(e),
-            "status": "error"
-        }), 500
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    return Response(page_body(goal_id, rows, limit), mimetype='application/json')
+
+@route('stream_goal_dashboard')
+def stream_goal_dashboard(goal_id):
+    """Server-Sent Events: the goal's dashboard as a snapshot, then merge-patch deltas"""
+    dashboard_stream = current_app.extensions['dashboard_stream']
+    if dashboard_stream is None:
+        return error_response("Dashboard streams are not running", 503)
+    try:
+        subscriber = dashboard_stream.subscribe(StreamSubscriber(goal_id))
+    except StreamLimitError as e:
+        return error_response(str(e), 503)
+    keepalive = current_app.config.get('STREAM_KEEPALIVE_S', 15)
+    
+    def generate():
+        try:
+            yield SSE_PREAMBLE
+            while not subscriber.closed:
+                yield sse_chunk(subscriber.get(keepalive))
+        finally:
+            dashboard_stream.unsubscribe(subscriber)
+    
+    return Response(generate(), mimetype='text/event-stream', headers=SSE_HEADERS)
 
-@api_bp.route('/insights/optimization', methods=['GET'])
+@route('get_optimization_insights')
 def get_optimization_insights():
     """Get optimization insights"""
     try:
-        goal_id = request.args.get('goal_id', type=int)
-        
-        if not goal_id:
-            return jsonify({
-                "error": "Missing goal_id parameter",
-                "status": "error"
-            }), 400
-        
-        # Get activities
-        goal_activities = [a for a in activities_db if a["goal_id"] == goal_id]
-        
-        if not goal_activities:
-            return jsonify({
-                "goal_id": goal_id,
-                "message": "No activities found",
-                "consistency_score": 0.0,
-                "wellness_warning": False,
-                "status": "success"
-            })
-        
-        # Calculate metrics
-        consistency_score = calculate_consistency_score(goal_activities)
-        weekly_health = get_weekly_health_total(goal_activities)
-        wellness_warning = weekly_health < 150
+        goal_id = parse_insights_goal_id(request.args)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    try:
+        return cached_goal_response('insights', goal_id)
         
-        # Calculate type totals
-        health_total = 0
-        learning_total = 0
-        for activity in goal_activities:
-            if activity["activity_type"] == "Health":
-                health_total += activity["value"]
-            elif activity["activity_type"] == "Learning":
-                learning_total += activity["value"]
+    except Exception as e:
+        return error_response(str(e), 500)
+
+@route('get_bulk_insights')
+def get_bulk_insights():
+    """Insights for many goals from one grouped pass, streamed as they are built"""
+    try:
+        goal_ids, goal_filter = parse_bulk_insights_request(load_json(request.get_data()))
+        dashboard_service = DashboardService(current_app.extensions['activity_repository'],
+                                             rules=current_app.extensions['insight_rules'])
+        insights = dashboard_service.iter_bulk_insights(goal_ids, **goal_filter)
         
-        # Generate recommendation
-        recommendation = generate_recommendation(goal_activities)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    ndjson = wants_ndjson(request.headers.get('Accept'))
+    return Response(stream_with_context(iter_bulk_body(insights, ndjson)),
+                    mimetype='application/x-ndjson' if ndjson else 'application/json')
+
+@route('get_insight_rules')
+def get_insight_rules():
+    """The insight rules in effect and whether the rules file last loaded cleanly"""
+    return jsonify(rules_payload(current_app.extensions['insight_rules']))
+
+@route('get_leaderboard')
+def get_leaderboard():
+    """Top k goals by consistency_score, total_value, weekly_total, total.<type> or weekly.<type>"""
+    try:
+        _, insight_service = get_services()
+        metric, k = parse_leaderboard_request(request.args, current_app.config)
+        leaderboard = insight_service.get_leaderboard(metric, k)
         
-        return jsonify({
-            "goal_id": goal_id,
-            "consistency_score": consistency_score,
-            "weekly_health_total": weekly_health,
-            "wellness_warning": wellness_warning,
-            "recommendation": recommendation,
-            "learning_total": learning_total,
-            "health_total": health_total,
-            "status": "success"
-        })
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    return jsonify(success_payload(leaderboard))
+
+@route('get_goal_stats')
+def get_goal_stats(goal_id):
+    """Approximate value quantiles and exact distinct active days of a goal, per type"""
+    try:
+        _, insight_service = get_services()
+        quantiles, first_day, last_day = parse_stats_request(request.args)
+        stats = insight_service.get_value_stats(goal_id, quantiles, first_day, last_day)
         
-    except Exception as e:
-        return jsonify({
-            "error": str(e),
-            "status": "error"
-        }), 500
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    return jsonify(success_payload(stats))
+
+@route('get_cache_stats')
+def get_cache_stats():
+    """Response cache counters for tuning RESPONSE_CACHE_SIZE"""
+    return jsonify(cache_stats_payload(current_app.extensions['response_cache'],
+                                       current_app.extensions['precompute'],
+                                       current_app.extensions['dashboard_stream']))
+
+@route('get_metrics')
+def get_metrics():
+    """Request, service and repository metrics in Prometheus text format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@route('get_profiles')
+def get_profiles():
+    """Recent sampled request profiles as collapsed stacks"""
+    return jsonify(profiles_payload(current_app.config, current_app.extensions['profile_log']))
 
-@api_bp.route('/health', methods=['GET'])
+@route('health_check')
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        "status": "healthy",
-        "service": "Life Design Backend",
-        "timestamp": datetime.now().isoformat()
-    })
\ No newline at end of file
+    return jsonify(health_payload())
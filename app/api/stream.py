@@ -0,0 +1,313 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Optional
+
+from app.api.cache import ResponseCache, goal_response_key
+from app.encoding import dumps, loads
+from app.metrics import STREAM_EVENTS, STREAM_SUBSCRIBERS
+from app.repository import BaseRepository
+from app.services.dashboard_service import DashboardService
+from app.services.rules import RuleBook
+
+_MISSING = object()
+
+def merge_patch(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON merge patch (RFC 7386) turning `before` into `after`; {} when they are equal
+
+    Nested objects are diffed key by key, anything else is replaced whole,
+    and removed keys are sent as null.
+    """
+    patch: Dict[str, Any] = {}
+    for key, value in after.items():
+        previous = before.get(key, _MISSING)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = merge_patch(previous, value)
+            if nested:
+                patch[key] = nested
+        elif previous is _MISSING or previous != value:
+            patch[key] = value
+    for key in before:
+        if key not in after:
+            patch[key] = None
+    return patch
+
+def encode_event(event: str, version: int, data: bytes) -> bytes:
+    """One Server-Sent Events message carrying encoded JSON; the goal's write version is its id"""
+    return b'id: %d\nevent: %s\ndata: %s\n\n' % (version, event.encode(), data)
+
+class StreamLimitError(Exception):
+    """Raised when a subscription would exceed the configured number of streams"""
+
+class StreamSubscriber:
+    """One client's queue of encoded events, drained by its response generator
+
+    A client that falls MAX_PENDING events behind has its queue replaced by
+    a single snapshot of the latest payload, so a stalled connection costs
+    bounded memory and resumes from a consistent state.
+    """
+
+    MAX_PENDING = 64
+
+    def __init__(self, goal_id: Hashable):
+        self.goal_id = goal_id
+        self.closed = False
+        self._events: List[bytes] = []
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def push(self, event: bytes, snapshot: bytes) -> None:
+        """Queue an event, or resynchronise with `snapshot` when too far behind"""
+        with self._lock:
+            if len(self._events) >= self.MAX_PENDING:
+                self._events = [snapshot]
+            else:
+                self._events.append(event)
+            self._signal()
+
+    def close(self) -> None:
+        """End the stream (the server is shutting down)"""
+        with self._lock:
+            self.closed = True
+            self._signal()
+
+    def _signal(self) -> None:
+        self._ready.set()
+
+    def _take(self) -> List[bytes]:
+        with self._lock:
+            events, self._events = self._events, []
+            self._clear()
+            return events
+
+    def _clear(self) -> None:
+        self._ready.clear()
+
+    def get(self, timeout: float) -> List[bytes]:
+        """Wait up to `timeout` seconds for events; [] on timeout"""
+        self._ready.wait(timeout)
+        return self._take()
+
+class AsyncStreamSubscriber(StreamSubscriber):
+    """A subscriber awaited from an event loop instead of a blocked thread"""
+
+    def __init__(self, goal_id: Hashable):
+        self._loop = asyncio.get_running_loop()
+        self._async_ready = asyncio.Event()
+        super().__init__(goal_id)
+
+    def _signal(self) -> None:
+        # push() runs on the broadcaster's thread
+        try:
+            self._loop.call_soon_threadsafe(self._async_ready.set)
+        except RuntimeError:
+            pass  # the event loop has closed; nobody is waiting any more
+
+    def _clear(self) -> None:
+        self._async_ready.clear()
+
+    async def get_async(self, timeout: float) -> List[bytes]:
+        """Wait up to `timeout` seconds for events; [] on timeout"""
+        try:
+            await asyncio.wait_for(self._async_ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._take()
+
+class _GoalChannel:
+    """A goal's subscribers and the last dashboard pushed to them"""
+    __slots__ = ('subscribers', 'key', 'payload', 'snapshot')
+
+    def __init__(self):
+        self.subscribers: List[StreamSubscriber] = []
+        self.key: Optional[tuple] = None
+        self.payload: Optional[Dict[str, Any]] = None
+        self.snapshot: Optional[bytes] = None
+
+class DashboardBroadcaster:
+    """Pushes dashboard changes of subscribed goals to their SSE streams
+
+    Writes notify the goals they touched. A subscribed goal is recomputed
+    ``coalesce_seconds`` after its first notification, so a burst of writes
+    costs one recomputation, and that one payload (taken from the response
+    cache when it is already there) is diffed against the last one pushed
+    and encoded once for every subscriber of the goal. Subscribed goals are
+    also re-checked every ``poll_seconds``, which picks up writes made by
+    other processes, edited rules and the weekly window moving at midnight;
+    a goal whose version, day and rules are unchanged costs one
+    get_goal_version() call.
+    """
+
+    def __init__(self, repository: BaseRepository, cache: ResponseCache, rules: RuleBook,
+                 activities_url: str, coalesce_seconds: float = 0.25, poll_seconds: float = 5,
+                 max_subscribers: int = 1000):
+        self.repository = repository
+        self.cache = cache
+        self.rules = rules
+        self.coalesce_seconds = coalesce_seconds
+        self.poll_seconds = poll_seconds
+        self.max_subscribers = max_subscribers
+        self.dashboard_service = DashboardService(repository, activities_url, rules)
+
+        self._channels: Dict[Hashable, _GoalChannel] = {}
+        # goal_id -> monotonic time its recomputation is due
+        self._due: Dict[Hashable, float] = {}
+        self._subscribers = 0
+        self._condition = threading.Condition()
+        self._stopping = False
+        self.computed = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._dispatch, name='dashboard-stream', daemon=True)
+
+    def start(self) -> "DashboardBroadcaster":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopping = True
+            channels = list(self._channels.values())
+            self._condition.notify_all()
+        for channel in channels:
+            for subscriber in list(channel.subscribers):
+                subscriber.close()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    # ========== SUBSCRIPTIONS ==========
+    def subscribe(self, subscriber: StreamSubscriber) -> StreamSubscriber:
+        """Attach a subscriber; it gets the goal's current dashboard as a snapshot first"""
+        with self._condition:
+            if self._stopping:
+                subscriber.close()
+                return subscriber
+            if self._subscribers >= self.max_subscribers:
+                raise StreamLimitError(f"Too many open streams (limit {self.max_subscribers})")
+
+            channel = self._channels.get(subscriber.goal_id)
+            if channel is None:
+                channel = self._channels[subscriber.goal_id] = _GoalChannel()
+            channel.subscribers.append(subscriber)
+            self._subscribers += 1
+            STREAM_SUBSCRIBERS.inc()
+
+            if channel.snapshot is not None:
+                subscriber.push(channel.snapshot, channel.snapshot)
+            else:
+                # First subscriber: the dispatcher sends everyone the snapshot
+                self._due[subscriber.goal_id] = time.monotonic()
+                self._condition.notify_all()
+        return subscriber
+
+    def unsubscribe(self, subscriber: StreamSubscriber) -> None:
+        """Detach a subscriber, dropping its goal's channel with the last one"""
+        with self._condition:
+            channel = self._channels.get(subscriber.goal_id)
+            if channel is None or subscriber not in channel.subscribers:
+                return
+            channel.subscribers.remove(subscriber)
+            self._subscribers -= 1
+            STREAM_SUBSCRIBERS.dec()
+            if not channel.subscribers:
+                del self._channels[subscriber.goal_id]
+                self._due.pop(subscriber.goal_id, None)
+
+    def notify(self, goal_ids: Iterable[Hashable]) -> None:
+        """Schedule the subscribed ones of some written goals for a push"""
+        due = time.monotonic() + self.coalesce_seconds
+        with self._condition:
+            scheduled = False
+            for goal_id in goal_ids:
+                if goal_id in self._channels and goal_id not in self._due:
+                    self._due[goal_id] = due
+                    scheduled = True
+            if scheduled:
+                self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "goals": len(self._channels),
+                "subscribers": self._subscribers,
+                "pending": len(self._due),
+                "computed": self.computed,
+                "failed": self.failed
+            }
+
+    # ========== DISPATCH ==========
+    def _ready_goals(self) -> Optional[List[Hashable]]:
+        """Wait for goals whose coalescing window (or the poll interval) has passed"""
+        next_poll = time.monotonic() + self.poll_seconds
+        with self._condition:
+            while not self._stopping:
+                now = time.monotonic()
+                if now >= next_poll:
+                    for goal_id in self._channels:
+                        self._due.setdefault(goal_id, now)
+                    next_poll = now + self.poll_seconds
+
+                ready = [goal_id for goal_id, due in self._due.items() if due <= now]
+                if ready:
+                    for goal_id in ready:
+                        del self._due[goal_id]
+                    return ready
+                wake = min([next_poll, *self._due.values()])
+                self._condition.wait(wake - now)
+            return None
+
+    def _dispatch(self) -> None:
+        while True:
+            goal_ids = self._ready_goals()
+            if goal_ids is None:
+                return
+            for goal_id in goal_ids:
+                try:
+                    self.push(goal_id)
+                except Exception:
+                    # Subscribers keep their last state; the next write or poll retries
+                    with self._condition:
+                        self.failed += 1
+
+    def push(self, goal_id: Hashable) -> None:
+        """Recompute a subscribed goal's dashboard and send subscribers what changed"""
+        with self._condition:
+            channel = self._channels.get(goal_id)
+            last_key = channel.key if channel is not None else None
+        if channel is None:
+            return
+
+        version = self.repository.get_goal_version(goal_id)
+        key = goal_response_key('dashboard', goal_id, version, self.rules.plan().fingerprint)
+        if key == last_key:
+            return
+        body = self.cache.get(key)
+        if body is None:
+            body = dumps(self.dashboard_service.build_dashboard(goal_id))
+            self.cache.put(key, body)
+        payload = loads(body)
+
+        with self._condition:
+            self.computed += 1
+            if self._channels.get(goal_id) is not channel:
+                return
+            snapshot = encode_event('snapshot', version, body)
+            if channel.payload is None:
+                event = snapshot
+                STREAM_EVENTS.inc('snapshot')
+            else:
+                patch = merge_patch(channel.payload, payload)
+                event = encode_event('delta', version, dumps(patch)) if patch else None
+                if event is not None:
+                    STREAM_EVENTS.inc('delta')
+            channel.key, channel.payload, channel.snapshot = key, payload, snapshot
+            if event is not None:
+                for subscriber in channel.subscribers:
+                    subscriber.push(event, snapshot)
+
+def start_dashboard_stream(repository: BaseRepository, cache: ResponseCache, rules: RuleBook,
+                           activities_url: str, settings: Mapping[str, Any]) -> DashboardBroadcaster:
+    """Start the broadcaster behind GET /api/goals/<goal_id>/stream"""
+    return DashboardBroadcaster(repository, cache, rules, activities_url,
+                                settings.get('STREAM_COALESCE_MS', 250) / 1000,
+                                settings.get('STREAM_POLL_S', 5),
+                                settings.get('STREAM_MAX_SUBSCRIBERS', 1000)).start()
@@ -0,0 +1,441 @@
+import asyncio
+import re
+import threading
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+
+from app.config import load_settings
+from app.encoding import dumps, set_encoder
+from app.main import SERVICE_INFO, start_jobs
+from app.metrics import REGISTRY, HTTP_IN_FLIGHT, ProfileLog, SamplingProfiler, instrument_repository
+from app.api.cache import ResponseCache
+from app.api.endpoints import (API_PREFIX, GOAL_ACTIVITIES_URL, INTERNAL_ERROR, NDJSON_MIMETYPES, NOT_FOUND,
+                               ROUTES, SSE_HEADERS, SSE_PREAMBLE, BatchIngest, batch_array_records,
+                               cache_stats_payload, created_payload, error_payload, goal_cache_key,
+                               health_payload, iter_bulk_body, iter_ndjson_records, load_json,
+                               notify_writes, observe_request, page_body, parse_bulk_insights_request,
+                               parse_insights_goal_id, parse_leaderboard_request, parse_page_request,
+                               parse_stats_request, profile_entry, profiles_payload, rules_payload,
+                               sse_chunk, success_payload, wants_ndjson, wants_profile)
+from app.api.stream import AsyncStreamSubscriber, StreamLimitError
+from app.repository.activity_repository import get_activity_repository
+from app.repository.async_repository import AsyncRepositoryAdapter
+from app.services.activity_service import validate_activity_data
+from app.services.async_services import AsyncActivityService, AsyncDashboardService
+from app.services.rules import RuleBook
+
+class Request:
+    """The parts of an ASGI HTTP request the handlers need"""
+
+    def __init__(self, scope: dict, receive):
+        self.method = scope['method']
+        self.path = scope['path']
+        # The matched Flask-style rule, set by dispatch(); metrics are labelled with it
+        self.rule: Optional[str] = None
+        self.metrics_started = False
+        self.profiler: Optional[SamplingProfiler] = None
+        self.query_string = scope.get('query_string', b'').decode('latin-1')
+        # A MultiDict, like Flask's request.args, so both front ends share the argument parsers
+        self.args = MultiDict(parse_qsl(self.query_string, keep_blank_values=True))
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope.get('headers', [])}
+        self._receive = receive
+
+    @property
+    def mimetype(self) -> str:
+        return self.headers.get('content-type', '').split(';')[0].strip().lower()
+
+    def if_none_match(self, etag: str) -> bool:
+        """Whether the If-None-Match header lists the given (strong) ETag"""
+        header = self.headers.get('if-none-match')
+        if not header:
+            return False
+        tags = [tag.strip() for tag in header.split(',')]
+        return '*' in tags or f'"{etag}"' in tags or f'W/"{etag}"' in tags
+
+    async def iter_body(self) -> AsyncIterator[bytes]:
+        """Yield the body as it arrives from the server"""
+        while True:
+            message = await self._receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunk = message.get('body', b'')
+            if chunk:
+                yield chunk
+            if not message.get('more_body', False):
+                return
+
+    async def iter_lines(self) -> AsyncIterator[bytes]:
+        """Split the body into lines as it arrives"""
+        pending = b''
+        async for chunk in self.iter_body():
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line
+        if pending:
+            yield pending
+
+    async def get_data(self) -> bytes:
+        return b''.join([chunk async for chunk in self.iter_body()])
+
+    async def wait_for_disconnect(self) -> None:
+        """Return once the client has gone away"""
+        while (await self._receive())['type'] != 'http.disconnect':
+            pass
+
+class Response:
+    """A status, headers and a body that is bytes or a (sync or async) iterable of str/bytes chunks"""
+
+    def __init__(self, body: Union[bytes, Iterable[Union[str, bytes]], AsyncIterable[bytes]] = b'',
+                 status: int = 200,
+                 content_type: Optional[str] = 'application/json',
+                 headers: Optional[Dict[str, str]] = None):
+        self.body = body
+        self.status = status
+        self.headers = {name.lower(): value for name, value in (headers or {}).items()}
+        if content_type:
+            self.headers['content-type'] = content_type
+
+    async def __call__(self, send) -> None:
+        streaming = not isinstance(self.body, bytes)
+        headers = [(name.encode('latin-1'), value.encode('latin-1'))
+                   for name, value in self.headers.items()]
+        if not streaming:
+            headers.append((b'content-length', str(len(self.body)).encode()))
+        await send({'type': 'http.response.start', 'status': self.status, 'headers': headers})
+
+        if not streaming:
+            await send({'type': 'http.response.body', 'body': self.body})
+            return
+        if hasattr(self.body, '__aiter__'):
+            try:
+                async for chunk in self.body:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            finally:
+                # Run the generator's cleanup now if send() failed part-way
+                if hasattr(self.body, 'aclose'):
+                    await self.body.aclose()
+        else:
+            for chunk in self.body:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+def compile_rule(rule: str) -> "re.Pattern":
+    """Regex for a Flask-style rule; <int:name> segments match digits"""
+    return re.compile(re.sub(r'<int:(\w+)>', r'(?P<\1>\\d+)', rule))
+
+def json_response(payload: Dict[str, Any], status: int = 200) -> Response:
+    return Response(dumps(payload), status)
+
+def error_response(message: str, status: int) -> Response:
+    return json_response(error_payload(message), status)
+
+class AsgiApplication:
+    """ASGI serving mode
+
+    Serves the same endpoints as the Flask app, but handlers await the
+    repository through AsyncRepositoryAdapter, so one worker process can
+    keep many slow (e.g. SQLite-backed) requests in flight at once.
+    """
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        set_encoder(settings.get('JSON_ENCODER', 'auto'))
+        self.repository = get_activity_repository(settings)
+        self.metrics_enabled = settings.get('METRICS_ENABLED', True)
+        if self.metrics_enabled:
+            instrument_repository(self.repository)
+        self.profile_log = ProfileLog()
+        self.async_repository = AsyncRepositoryAdapter(self.repository,
+                                                       settings.get('ASYNC_REPOSITORY_WORKERS', 32))
+        self.response_cache = ResponseCache(settings.get('RESPONSE_CACHE_SIZE', 4096))
+        self.compactor = None
+        self.precompute = None
+        self.dashboard_stream = None
+        self.rules = RuleBook(settings.get('INSIGHT_RULES_PATH', ''))
+        self.activity_service = AsyncActivityService(self.async_repository)
+        self.dashboard_service = AsyncDashboardService(self.async_repository,
+                                                       GOAL_ACTIVITIES_URL,
+                                                       self.rules)
+
+        # The Flask app's rules, so both modes report the same route labels
+        routes = [('GET', '/', self.root)] + [
+            (method, API_PREFIX + rule, getattr(self, endpoint))
+            for endpoint, (method, rule) in ROUTES.items()
+        ]
+        self.routes: List[Tuple[str, str, re.Pattern, Any]] = [
+            (method, rule, compile_rule(rule), handler) for method, rule, handler in routes
+        ]
+
+    async def __call__(self, scope: dict, receive, send) -> None:
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        request = Request(scope, receive)
+        started = time.perf_counter()
+        status = 500
+        try:
+            try:
+                response = await self.dispatch(request)
+            except Exception:
+                response = json_response(INTERNAL_ERROR, 500)
+            # Streamed bodies count towards the latency, as in the Flask app
+            await response(send)
+            status = response.status
+        finally:
+            self.finish_request_metrics(request, started, status)
+
+    # ========== REQUEST METRICS ==========
+    def start_request_metrics(self, request: Request) -> None:
+        """Count the request in flight and, if asked to, start sampling the event loop"""
+        if not self.metrics_enabled or not request.rule.startswith(API_PREFIX):
+            return
+        request.metrics_started = True
+        HTTP_IN_FLIGHT.inc(request.method, request.rule)
+        if wants_profile(self.settings, request.headers.get('x-profile'), request.args.get('profile')):
+            # Samples the loop's thread, so requests interleaved with this one show up too
+            interval = self.settings.get('PROFILE_SAMPLE_INTERVAL_MS', 1) / 1000
+            request.profiler = SamplingProfiler(threading.get_ident(), interval).start()
+
+    def finish_request_metrics(self, request: Request, started: float, status: int) -> None:
+        """Record latency and status once the response, streamed or not, is done"""
+        if not request.metrics_started:
+            return
+        elapsed = time.perf_counter() - started
+        observe_request((request.method, request.rule), elapsed, status)
+
+        if request.profiler is not None:
+            path = request.path + (f'?{request.query_string}' if request.query_string else '')
+            self.profile_log.add(profile_entry(request.method, path, status, elapsed,
+                                               request.profiler.stop()))
+
+    async def lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                jobs = start_jobs(self.repository, self.response_cache, self.rules, self.settings)
+                self.compactor = jobs['compactor']
+                self.precompute = jobs['precompute']
+                self.dashboard_stream = jobs['dashboard_stream']
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.compactor is not None:
+                    self.compactor.stop()
+                if self.precompute is not None:
+                    self.precompute.stop()
+                if self.dashboard_stream is not None:
+                    self.dashboard_stream.stop()
+                self.async_repository.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def dispatch(self, request: Request) -> Response:
+        path_matched = False
+        for method, rule, pattern, handler in self.routes:
+            match = pattern.fullmatch(request.path)
+            if match is None:
+                continue
+            path_matched = True
+            if method == request.method:
+                params = {name: int(value) for name, value in match.groupdict().items()}
+                request.rule = rule
+                self.start_request_metrics(request)
+                return await handler(request, **params)
+
+        if path_matched:
+            return error_response("Method not allowed", 405)
+        return json_response(NOT_FOUND, 404)
+
+    # ========== HELPER FUNCTIONS ==========
+    def record_writes(self, activities: List[Any]) -> List[Any]:
+        """Queue the written goals for background precompute and stream pushes, when running"""
+        return notify_writes(activities, self.precompute, self.dashboard_stream)
+
+    async def cached_goal_response(self, request: Request, kind: str, goal_id: int) -> Response:
+        """Serve a goal payload from the versioned cache, honouring If-None-Match"""
+        version = await self.async_repository.get_goal_version(goal_id)
+        if self.precompute is not None:
+            self.precompute.touch(goal_id, version)
+        key, etag = goal_cache_key(kind, goal_id, version, self.rules)
+        headers = {'etag': f'"{etag}"'}
+
+        if request.if_none_match(etag):
+            return Response(status=304, content_type=None, headers=headers)
+
+        body = self.response_cache.get(key)
+        if body is None:
+            build = self.dashboard_service.build_dashboard if kind == 'dashboard' \
+                else self.dashboard_service.build_insights
+            body = dumps(await build(goal_id))
+            self.response_cache.put(key, body)
+        return Response(body, headers=headers)
+
+    async def iter_batch_records(self, request: Request) -> AsyncIterator[Any]:
+        """Yield raw records from the request body, one per activity"""
+        if request.mimetype in NDJSON_MIMETYPES:
+            async for line in request.iter_lines():
+                for record in iter_ndjson_records([line]):
+                    yield record
+            return
+
+        for record in batch_array_records(await request.get_data()):
+            yield record
+
+    # ========== API ENDPOINTS ==========
+    async def root(self, request: Request) -> Response:
+        return json_response(SERVICE_INFO)
+
+    async def create_activity(self, request: Request) -> Response:
+        """Log a new activity"""
+        try:
+            data = load_json(await request.get_data())
+            activity = await self.activity_service.create_activity(validate_activity_data(data))
+            self.record_writes([activity])
+            return json_response(created_payload(activity), 201)
+        except Exception as e:
+            return error_response(str(e), 400)
+
+    async def create_activities_batch(self, request: Request) -> Response:
+        """Log many activities from a JSON array or a streamed NDJSON body
+
+        Invalid records are reported by index and the rest are stored; only a
+        body that is not an array or NDJSON fails the request as a whole.
+        """
+        batch = BatchIngest(self.settings.get('BATCH_CHUNK_SIZE', 5000))
+        try:
+            async for record in self.iter_batch_records(request):
+                chunk = batch.add(record)
+                if chunk:
+                    batch.stored(self.record_writes(await self.activity_service.create_activities(chunk)))
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        chunk = batch.flush()
+        if chunk:
+            batch.stored(self.record_writes(await self.activity_service.create_activities(chunk)))
+
+        payload, status = batch.result()
+        return json_response(payload, status)
+
+    async def get_dashboard(self, request: Request, goal_id: int) -> Response:
+        """Get dashboard for a specific goal"""
+        try:
+            return await self.cached_goal_response(request, 'dashboard', goal_id)
+        except Exception as e:
+            return error_response(str(e), 500)
+
+    async def list_goal_activities(self, request: Request, goal_id: int) -> Response:
+        """List a goal's activities by timestamp, one cursor page at a time"""
+        try:
+            limit, query = parse_page_request(request.args, self.settings)
+            rows = await self.async_repository.get_goal_page(goal_id, limit + 1, **query)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        return Response(page_body(goal_id, rows, limit))
+
+    async def stream_goal_dashboard(self, request: Request, goal_id: int) -> Response:
+        """Server-Sent Events: the goal's dashboard as a snapshot, then merge-patch deltas"""
+        if self.dashboard_stream is None:
+            return error_response("Dashboard streams are not running", 503)
+        try:
+            subscriber = self.dashboard_stream.subscribe(AsyncStreamSubscriber(goal_id))
+        except StreamLimitError as e:
+            return error_response(str(e), 503)
+        keepalive = self.settings.get('STREAM_KEEPALIVE_S', 15)
+        dashboard_stream = self.dashboard_stream
+
+        async def watch_disconnect():
+            # Servers may drop writes to a closed connection silently
+            await request.wait_for_disconnect()
+            subscriber.close()
+
+        async def generate():
+            watcher = asyncio.ensure_future(watch_disconnect())
+            try:
+                yield SSE_PREAMBLE
+                while not subscriber.closed:
+                    yield sse_chunk(await subscriber.get_async(keepalive))
+            finally:
+                watcher.cancel()
+                dashboard_stream.unsubscribe(subscriber)
+
+        return Response(generate(), content_type='text/event-stream', headers=SSE_HEADERS)
+
+    async def get_optimization_insights(self, request: Request) -> Response:
+        """Get optimization insights"""
+        try:
+            goal_id = parse_insights_goal_id(request.args)
+        except ValueError as e:
+            return error_response(str(e), 400)
+        try:
+            return await self.cached_goal_response(request, 'insights', goal_id)
+        except Exception as e:
+            return error_response(str(e), 500)
+
+    async def get_bulk_insights(self, request: Request) -> Response:
+        """Insights for many goals from one grouped pass, streamed as they are built"""
+        try:
+            goal_ids, goal_filter = parse_bulk_insights_request(load_json(await request.get_data()))
+            insights = await self.dashboard_service.iter_bulk_insights(goal_ids, **goal_filter)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        ndjson = wants_ndjson(request.headers.get('accept'))
+        return Response(iter_bulk_body(insights, ndjson),
+                        content_type='application/x-ndjson' if ndjson else 'application/json')
+
+    async def get_insight_rules(self, request: Request) -> Response:
+        """The insight rules in effect and whether the rules file last loaded cleanly"""
+        return json_response(rules_payload(self.rules))
+
+    async def get_leaderboard(self, request: Request) -> Response:
+        """Top k goals by consistency_score, total_value, weekly_total, total.<type> or weekly.<type>"""
+        try:
+            metric, k = parse_leaderboard_request(request.args, self.settings)
+            leaderboard = await self.dashboard_service.insight_service.get_leaderboard(metric, k)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        return json_response(success_payload(leaderboard))
+
+    async def get_goal_stats(self, request: Request, goal_id: int) -> Response:
+        """Approximate value quantiles and exact distinct active days of a goal, per type"""
+        try:
+            quantiles, first_day, last_day = parse_stats_request(request.args)
+            stats = await self.dashboard_service.insight_service.get_value_stats(
+                goal_id, quantiles, first_day, last_day
+            )
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        return json_response(success_payload(stats))
+
+    async def get_cache_stats(self, request: Request) -> Response:
+        """Response cache counters for tuning RESPONSE_CACHE_SIZE"""
+        return json_response(cache_stats_payload(self.response_cache, self.precompute, self.dashboard_stream))
+
+    async def get_metrics(self, request: Request) -> Response:
+        """Request, service and repository metrics in Prometheus text format"""
+        return Response(REGISTRY.render().encode(), content_type='text/plain; version=0.0.4')
+
+    async def get_profiles(self, request: Request) -> Response:
+        """Recent sampled request profiles as collapsed stacks"""
+        return json_response(profiles_payload(self.settings, self.profile_log))
+
+    async def health_check(self, request: Request) -> Response:
+        """Health check endpoint"""
+        return json_response(health_payload())
+
+def create_asgi_app(config_name: str = 'default') -> AsgiApplication:
+    """ASGI application factory, the async counterpart of create_app"""
+    return AsgiApplication(load_settings(config_name))
@@ -3,7 +3,86 @@ import os
 class Config:
     """Application configuration"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-please-change'
-    DEBUG = True
+    DEBUG = False
+    
+    # Storage backend: 'concurrent', 'memory', 'durable', 'columnar', 'sqlite' or 'sharded'
+    ACTIVITY_REPOSITORY = os.environ.get('ACTIVITY_REPOSITORY', 'concurrent')
+    LOCK_STRIPES = int(os.environ.get('LOCK_STRIPES', 64))
+    SHARD_COUNT = int(os.environ.get('SHARD_COUNT', 0))  # 0 = one shard process per CPU
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', 'life_design.db')
+    
+    # Write-ahead log and snapshots for the 'durable' backend
+    DATA_DIR = os.environ.get('DATA_DIR', 'data')
+    WAL_FSYNC_POLICY = os.environ.get('WAL_FSYNC_POLICY', 'interval')  # always | interval | snapshot
+    WAL_FSYNC_INTERVAL_MS = int(os.environ.get('WAL_FSYNC_INTERVAL_MS', 100))
+    SNAPSHOT_EVERY = int(os.environ.get('SNAPSHOT_EVERY', 100000))
+    
+    # Raw activities older than RAW_RETENTION_DAYS are folded into daily and
+    # weekly rollups every COMPACTION_INTERVAL_S (in-memory backends; 0 = keep all)
+    RAW_RETENTION_DAYS = int(os.environ.get('RAW_RETENTION_DAYS', 0))
+    COMPACTION_INTERVAL_S = float(os.environ.get('COMPACTION_INTERVAL_S', 3600))
+    
+    # JSON file of insight rules overriding the built-in ones; re-read when it changes
+    INSIGHT_RULES_PATH = os.environ.get('INSIGHT_RULES_PATH', '')
+    
+    # Response JSON encoder: 'auto' (orjson when installed), 'orjson' or 'json'
+    JSON_ENCODER = os.environ.get('JSON_ENCODER', 'auto')
+    
+    # Records validated per repository add_many() call in batch ingest
+    BATCH_CHUNK_SIZE = int(os.environ.get('BATCH_CHUNK_SIZE', 5000))
+    
+    # Page sizes for GET /api/goals/<goal_id>/activities
+    PAGE_SIZE_DEFAULT = int(os.environ.get('PAGE_SIZE_DEFAULT', 100))
+    PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX', 1000))
+    
+    # Goals returned by GET /api/leaderboard
+    LEADERBOARD_DEFAULT_K = int(os.environ.get('LEADERBOARD_DEFAULT_K', 10))
+    LEADERBOARD_MAX_K = int(os.environ.get('LEADERBOARD_MAX_K', 100))
+    
+    # Dashboard/insight payloads cached per (goal, version)
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 4096))
+    
+    # Dashboard and insight payloads of written goals are rebuilt into the
+    # response cache by PRECOMPUTE_WORKERS threads (0 = compute on request only),
+    # once a goal has been quiet for PRECOMPUTE_COALESCE_MS. Goals used within
+    # PRECOMPUTE_ACTIVE_DAYS are also rebuilt when the day rolls over.
+    PRECOMPUTE_WORKERS = int(os.environ.get('PRECOMPUTE_WORKERS', 2))
+    PRECOMPUTE_COALESCE_MS = float(os.environ.get('PRECOMPUTE_COALESCE_MS', 100))
+    PRECOMPUTE_ACTIVE_DAYS = int(os.environ.get('PRECOMPUTE_ACTIVE_DAYS', 7))
+    
+    # GET /api/goals/<goal_id>/stream pushes dashboard changes as Server-Sent
+    # Events: recomputed STREAM_COALESCE_MS after a goal's first write in a
+    # burst, re-checked every STREAM_POLL_S (writes by other processes, rule
+    # edits, midnight), with a comment every STREAM_KEEPALIVE_S on idle streams
+    STREAM_COALESCE_MS = float(os.environ.get('STREAM_COALESCE_MS', 250))
+    STREAM_POLL_S = float(os.environ.get('STREAM_POLL_S', 5))
+    STREAM_KEEPALIVE_S = float(os.environ.get('STREAM_KEEPALIVE_S', 15))
+    STREAM_MAX_SUBSCRIBERS = int(os.environ.get('STREAM_MAX_SUBSCRIBERS', 1000))
+    
+    # Latency histograms at GET /api/metrics; per-request stack sampling with
+    # ?profile=1 or X-Profile: 1 when PROFILING_ENABLED
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 1))
+    
+    # Threads that run blocking repository calls in the ASGI serving mode
+    ASYNC_REPOSITORY_WORKERS = int(os.environ.get('ASYNC_REPOSITORY_WORKERS', 32))
+    
+    # Pre-fork serving mode (python run.py --prefork): PREFORK_WORKERS processes
+    # (0 = one per CPU) forked from a master that has built the app and read
+    # the rows of up to PREFORK_WARM_GOALS goals. A worker is replaced after
+    # PREFORK_MAX_REQUESTS requests (plus up to PREFORK_MAX_REQUESTS_JITTER, so
+    # workers do not restart together) or once its private memory passes
+    # PREFORK_MAX_WORKER_PRIVATE_MB; 0 disables either limit. Stopping workers
+    # get PREFORK_GRACEFUL_TIMEOUT_S to finish in-flight requests.
+    PREFORK_WORKERS = int(os.environ.get('PREFORK_WORKERS', 0))
+    PREFORK_WARM_GOALS = int(os.environ.get('PREFORK_WARM_GOALS', RESPONSE_CACHE_SIZE // 2))
+    PREFORK_MAX_REQUESTS = int(os.environ.get('PREFORK_MAX_REQUESTS', 0))
+    PREFORK_MAX_REQUESTS_JITTER = int(os.environ.get('PREFORK_MAX_REQUESTS_JITTER', 0))
+    PREFORK_MAX_WORKER_PRIVATE_MB = int(os.environ.get('PREFORK_MAX_WORKER_PRIVATE_MB', 0))
+    PREFORK_GRACEFUL_TIMEOUT_S = float(os.environ.get('PREFORK_GRACEFUL_TIMEOUT_S', 30))
+    PREFORK_KEEPALIVE_S = float(os.environ.get('PREFORK_KEEPALIVE_S', 5))
+    PREFORK_MEMORY_CHECK_S = float(os.environ.get('PREFORK_MEMORY_CHECK_S', 30))
     
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -17,4 +96,9 @@ config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
     'default': DevelopmentConfig
-}
\ No newline at end of file
+}
+
+def load_settings(config_name: str = 'default') -> dict:
+    """Upper-case settings of a named configuration as a plain dict"""
+    config_class = config[config_name]
+    return {key: getattr(config_class, key) for key in dir(config_class) if key.isupper()}
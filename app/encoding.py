@@ -0,0 +1,62 @@
+import json
+from typing import Any, Iterable
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is the fallback
+    orjson = None
+
+class JsonEncoder:
+    """Compact UTF-8 JSON from the standard library"""
+    name = 'json'
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode()
+
+    def loads(self, data: Any) -> Any:
+        return json.loads(data)
+
+class OrjsonEncoder(JsonEncoder):
+    """orjson: the same output, several times faster and straight to bytes"""
+    name = 'orjson'
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: Any) -> Any:
+        return orjson.loads(data)
+
+ENCODERS = {'json': JsonEncoder, 'orjson': OrjsonEncoder}
+
+def get_encoder(name: str = 'auto') -> JsonEncoder:
+    """Build an encoder by name; 'auto' prefers orjson when it is installed"""
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown JSON_ENCODER: {name}")
+    if name == 'orjson' and orjson is None:
+        raise ValueError("JSON_ENCODER=orjson needs the orjson package")
+    return ENCODERS[name]()
+
+# Process-wide, so cached activity fragments and responses agree
+_encoder = get_encoder()
+
+def set_encoder(name: str) -> JsonEncoder:
+    """Switch the process-wide encoder (JSON_ENCODER)"""
+    global _encoder
+    _encoder = get_encoder(name)
+    return _encoder
+
+def current_encoder() -> JsonEncoder:
+    return _encoder
+
+def dumps(obj: Any) -> bytes:
+    """Encode a value as JSON bytes with the current encoder"""
+    return _encoder.dumps(obj)
+
+def loads(data: Any) -> Any:
+    return _encoder.loads(data)
+
+def join_array(fragments: Iterable[bytes]) -> bytes:
+    """A JSON array from already-encoded elements, in one allocation"""
+    return b'[' + b','.join(fragments) + b']'
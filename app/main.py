@@ -1,45 +1,136 @@
+import logging
+from typing import Any, Dict, Mapping
 from flask import Flask, jsonify
+from flask.json.provider import JSONProvider
 from app.config import config
+from app import encoding
+from app.api.endpoints import API_PREFIX, GOAL_ACTIVITIES_URL, INTERNAL_ERROR, NOT_FOUND, error_payload
 from app.api.routes import api_bp
+from app.api.cache import ResponseCache
+from app.api.precompute import start_precompute
+from app.api.stream import start_dashboard_stream
+from app.metrics import ProfileLog, instrument_repository
+from app.repository import BaseRepository
+from app.repository.activity_repository import get_activity_repository
+from app.repository.compactor import start_compactor
+from app.services.rules import RuleBook
 
-def create_app(config_name='default'):
-    """Application factory"""
+logger = logging.getLogger('life_design.app')
+
+BACKGROUND_JOBS = ('compactor', 'precompute', 'dashboard_stream')
+
+SERVICE_INFO = {
+    "service": "Life Design Backend Service",
+    "version": "1.0.0",
+    "endpoints": {
+        "POST /api/activities": "Log a new activity",
+        "POST /api/activities/batch": "Log many activities (JSON array or NDJSON)",
+        "GET /api/dashboard/{goal_id}": "Get dashboard for a goal",
+        "GET /api/goals/{goal_id}/activities?limit=&cursor=&from=&to=&activity_type=": "Page through a goal's activities",
+        "GET /api/insights/optimization?goal_id={id}": "Get optimization insights",
+        "POST /api/insights/bulk": "Insights for many goals (goal_ids or a filter), streamed",
+        "GET /api/insights/rules": "Insight rules in effect (INSIGHT_RULES_PATH)",
+        "GET /api/leaderboard?metric=&k=": "Top k goals by consistency, total or weekly volume",
+        "GET /api/goals/<goal_id>/stream": "Server-Sent Events: dashboard snapshot, then deltas on change",
+        "GET /api/goals/<goal_id>/stats?quantiles=&from=&to=": "Value percentiles and distinct active days per type",
+        "GET /api/cache/stats": "Response cache hit ratio, evictions, precompute and stream queues",
+        "GET /api/metrics": "Prometheus metrics: route, service and repository latency",
+        "GET /api/metrics/profiles": "Recent sampled request profiles (PROFILING_ENABLED)",
+        "GET /api/health": "Health check"
+    },
+    "documentation": "See README.md for detailed API usage"
+}
+
+class EncoderJSONProvider(JSONProvider):
+    """Flask JSON provider backed by app.encoding, so jsonify() uses the fast encoder too"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return encoding.dumps(obj).decode()
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return encoding.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(encoding.dumps(obj), mimetype='application/json')
+
+def start_jobs(repository: BaseRepository, cache: ResponseCache, rules: RuleBook,
+               settings: Mapping[str, Any]) -> Dict[str, Any]:
+    """Start the retention compactor, precompute and dashboard stream threads
+
+    All three read the repository while request threads write to it, so on
+    a backend that is not thread-safe none of them start: a warning is
+    logged and each job's entry is None.
+    """
+    if not repository.thread_safe:
+        logger.warning("Background jobs disabled: %s is not thread-safe; use ACTIVITY_REPOSITORY=concurrent, "
+                       "sqlite or sharded", type(repository).__name__)
+        return dict.fromkeys(BACKGROUND_JOBS)
+    return {
+        'compactor': start_compactor(repository, settings),
+        'precompute': start_precompute(repository, cache, rules, GOAL_ACTIVITIES_URL, settings),
+        'dashboard_stream': start_dashboard_stream(repository, cache, rules, GOAL_ACTIVITIES_URL, settings)
+    }
+
+def start_background_jobs(app: Flask) -> None:
+    """Start the background threads for the app's repository"""
+    app.extensions.update(start_jobs(app.extensions['activity_repository'], app.extensions['response_cache'],
+                                     app.extensions['insight_rules'], app.config))
+
+def stop_background_jobs(app: Flask) -> None:
+    """Stop the background threads, e.g. before the process forks"""
+    for name in BACKGROUND_JOBS:
+        job = app.extensions.get(name)
+        if job is not None:
+            job.stop()
+        app.extensions[name] = None
+
+def create_app(config_name='default', background_jobs=True):
+    """Application factory
+    
+    With background_jobs=False the compactor, precompute and stream threads are
+    left for the caller to start (the pre-fork server starts them per worker).
+    """
     app = Flask(__name__)
     
     # Load configuration
     app.config.from_object(config[config_name])
+    encoding.set_encoder(app.config['JSON_ENCODER'])
+    app.json = EncoderJSONProvider(app)
+    
+    # Shared activity store for all requests
+    repository = get_activity_repository(app.config)
+    if app.config['METRICS_ENABLED']:
+        instrument_repository(repository)
+    app.extensions['activity_repository'] = repository
+    app.extensions['insight_rules'] = RuleBook(app.config['INSIGHT_RULES_PATH'])
+    app.extensions['response_cache'] = ResponseCache(app.config['RESPONSE_CACHE_SIZE'])
+    app.extensions['profile_log'] = ProfileLog()
+    app.extensions['compactor'] = None
+    app.extensions['precompute'] = None
+    app.extensions['dashboard_stream'] = None
+    if background_jobs:
+        start_background_jobs(app)
     
     # Register blueprints
-    app.register_blueprint(api_bp, url_prefix='/api')
+    app.register_blueprint(api_bp, url_prefix=API_PREFIX)
     
     # Root endpoint
     @app.route('/')
     def root():
-        return jsonify({
-            "service": "Life Design Backend Service",
-            "version": "1.0.0",
-            "endpoints": {
-                "POST /api/activities": "Log a new activity",
-                "GET /api/dashboard/{goal_id}": "Get dashboard for a goal",
-                "GET /api/insights/optimization?goal_id={id}": "Get optimization insights",
-                "GET /api/health": "Health check"
-            },
-            "documentation": "See README.md for detailed API usage"
-        })
+        return jsonify(SERVICE_INFO)
     
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
-        return jsonify({
-            "error": "Endpoint not found",
-            "message": "Check the API documentation at /"
-        }), 404
+        return jsonify(NOT_FOUND), 404
+    
+    @app.errorhandler(405)
+    def method_not_allowed(error):
+        return jsonify(error_payload("Method not allowed")), 405
     
     @app.errorhandler(500)
     def internal_error(error):
-        return jsonify({
-            "error": "Internal server error",
-            "message": "Something went wrong on our end"
-        }), 500
+        return jsonify(INTERNAL_ERROR), 500
     
     return app
\ No newline at end of file
@@ -0,0 +1,300 @@
+import bisect
+import collections
+import functools
+import inspect
+import itertools
+import sys
+import threading
+import time
+from typing import Any, Callable, Counter as CounterType, Dict, List, Sequence, Tuple
+
+# Latency buckets in seconds, from 100 microseconds to 10 seconds
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _ThreadCells:
+    """Per-thread value cells for one metric
+
+    Each thread writes only to its own dict of cells, so the hot path takes
+    no lock. A scrape sums every thread's cells; cells of threads that have
+    exited are folded into a shared total so short-lived request threads
+    do not accumulate.
+    """
+
+    def __init__(self, width: int):
+        self._width = width
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._live: List[Tuple[threading.Thread, Dict[tuple, List[float]]]] = []
+        self._retired: Dict[tuple, List[float]] = {}
+        self._registrations = itertools.count(1)
+
+    def cell(self, labels: tuple) -> List[float]:
+        """This thread's cell for a label set"""
+        try:
+            cells = self._local.cells
+        except AttributeError:
+            cells = self._local.cells = {}
+            with self._lock:
+                self._live.append((threading.current_thread(), cells))
+                if next(self._registrations) % 64 == 0:
+                    self._retire_dead_threads()
+        cell = cells.get(labels)
+        if cell is None:
+            cell = cells[labels] = [0] * self._width
+        return cell
+
+    def _retire_dead_threads(self) -> None:
+        live = []
+        for thread, cells in self._live:
+            if thread.is_alive():
+                live.append((thread, cells))
+            else:
+                self._merge(self._retired, cells)
+        self._live = live
+
+    @staticmethod
+    def _merge(into: Dict[tuple, List[float]], cells: Dict[tuple, List[float]]) -> None:
+        for labels, cell in list(cells.items()):
+            total = into.get(labels)
+            if total is None:
+                into[labels] = list(cell)
+            else:
+                for index, value in enumerate(cell):
+                    total[index] += value
+
+    def totals(self) -> Dict[tuple, List[float]]:
+        """Sum of every thread's cells, by label set"""
+        with self._lock:
+            self._retire_dead_threads()
+            totals = {labels: list(cell) for labels, cell in self._retired.items()}
+            for _, cells in self._live:
+                self._merge(totals, cells)
+        return totals
+
+class _Metric:
+    kind = ''
+    width = 1
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._cells = _ThreadCells(self.width)
+
+    def _label_text(self, labels: tuple, extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, labels)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for labels, cell in sorted(self._cells.totals().items()):
+            lines.extend(self._render_cell(labels, cell))
+        return lines
+
+    def _render_cell(self, labels: tuple, cell: List[float]) -> List[str]:
+        return [f'{self.name}{self._label_text(labels)} {_format_value(cell[0])}']
+
+class Counter(_Metric):
+    """Monotonic count"""
+    kind = 'counter'
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._cells.cell(labels)[0] += amount
+
+class Gauge(_Metric):
+    """Value that goes up and down, such as requests in flight"""
+    kind = 'gauge'
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._cells.cell(labels)[0] += amount
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self._cells.cell(labels)[0] -= amount
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; each cell holds the bucket counts, then sum and count"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.width = len(self.buckets) + 3
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, *labels) -> None:
+        cell = self._cells.cell(labels)
+        # Values above the last bucket land in the +Inf slot
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def _render_cell(self, labels: tuple, cell: List[float]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), cell):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else _format_value(bound)
+            lines.append(f'{self.name}_bucket{self._label_text(labels, [("le", le)])} {cumulative}')
+        lines.append(f'{self.name}_sum{self._label_text(labels)} {_format_value(cell[-2])}')
+        lines.append(f'{self.name}_count{self._label_text(labels)} {cell[-1]}')
+        return lines
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'life_design_http_requests_total', 'HTTP requests handled, by route and status code',
+    ('method', 'route', 'status')))
+HTTP_ERRORS = REGISTRY.register(Counter(
+    'life_design_http_request_errors_total', 'HTTP requests that ended in a 5xx status or an exception',
+    ('method', 'route')))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    'life_design_http_requests_in_flight', 'HTTP requests currently being handled',
+    ('method', 'route')))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    'life_design_http_request_duration_seconds', 'HTTP request latency, including streamed bodies',
+    ('method', 'route')))
+SERVICE_LATENCY = REGISTRY.register(Histogram(
+    'life_design_service_call_duration_seconds', 'Service method latency',
+    ('function',)))
+REPOSITORY_LATENCY = REGISTRY.register(Histogram(
+    'life_design_repository_call_duration_seconds', 'Repository method latency',
+    ('backend', 'method')))
+COMPACTED_ROWS = REGISTRY.register(Counter(
+    'life_design_compacted_rows_total', 'Raw activities folded into daily/weekly rollups'))
+PRECOMPUTED_PAYLOADS = REGISTRY.register(Counter(
+    'life_design_precomputed_payloads_total', 'Goal payloads cached by the background precompute',
+    ('kind',)))
+
+STREAM_SUBSCRIBERS = REGISTRY.register(Gauge(
+    'life_design_stream_subscribers', 'Open dashboard event streams'))
+STREAM_EVENTS = REGISTRY.register(Counter(
+    'life_design_stream_events_total', 'Dashboard stream events built, each shared by all of a goal\'s subscribers',
+    ('event',)))
+
+def timed(name: str, histogram: Histogram = SERVICE_LATENCY) -> Callable:
+    """Decorator recording a function's (or coroutine's) latency under the given label"""
+    def decorator(function: Callable) -> Callable:
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started, name)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, name)
+        return wrapper
+    return decorator
+
+# Repository methods worth timing; the rest are plumbing
+REPOSITORY_METHODS = (
+    'add', 'add_many', 'get_by_id', 'get_by_goal', 'get_all', 'get_by_type',
+    'get_goal_aggregate', 'get_goal_version', 'sum_by_type', 'get_by_goal_range', 'get_goal_page',
+    'get_active_dates', 'get_day_totals', 'get_streak_stats', 'get_goal_stats', 'get_goal_sketches',
+    'top_goals', 'compact'
+)
+
+def instrument_repository(repository):
+    """Time a repository instance's public methods in place
+
+    The wrappers are set on the instance, so the repository keeps its type
+    and nested calls (a default method calling get_by_goal) are timed too.
+    """
+    backend = type(repository).__name__
+    for method_name in REPOSITORY_METHODS:
+        method = getattr(repository, method_name, None)
+        if method is not None:
+            histogram_label = (backend, method_name)
+            setattr(repository, method_name, _timed_method(method, histogram_label))
+    return repository
+
+def _timed_method(method: Callable, labels: tuple) -> Callable:
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            REPOSITORY_LATENCY.observe(time.perf_counter() - started, *labels)
+    return wrapper
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval while a request runs
+
+    The result is a count per collapsed stack ("outer;inner;leaf"), the
+    input format of flame graph tools.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.001, max_depth: int = 64):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: CounterType[str] = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> CounterType[str]:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{frame.f_lineno})')
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+class ProfileLog:
+    """The most recent request profiles"""
+
+    def __init__(self, max_entries: int = 50):
+        self._entries: "collections.deque[Dict[str, Any]]" = collections.deque(maxlen=max_entries)
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        self._entries.append(entry)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        return list(self._entries)
@@ -1,22 +1,107 @@
-from dataclasses import dataclass, asdict
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Optional, Union
+from app.encoding import dumps
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+DAY_US = 86_400_000_000
+# The durable WAL records the UTF-8 length of activity_type in 16 bits
+MAX_ACTIVITY_TYPE_BYTES = 0xFFFF
+
+def to_epoch_us(moment: datetime) -> int:
+    """Convert a datetime to wall-clock microseconds since the epoch"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return (moment - _EPOCH) // _MICROSECOND
+
+def parse_timestamp(timestamp: Union[str, datetime, int]) -> int:
+    """Parse an ISO string or datetime into wall-clock epoch microseconds
+
+    An int is taken to be epoch microseconds already (replayed logs, shard
+    transfers); request payloads are checked to be strings before this.
+    """
+    if isinstance(timestamp, int):
+        return timestamp
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return to_epoch_us(timestamp)
+
+def epoch_us_to_iso(epoch_us: int) -> str:
+    """Convert wall-clock microseconds since the epoch back to ISO format"""
+    return (_EPOCH + timedelta(microseconds=int(epoch_us))).isoformat()
+
+def epoch_day_to_date(epoch_day: int):
+    """Convert days since the epoch to a date"""
+    return _EPOCH.date() + timedelta(days=int(epoch_day))
+
+def epoch_day_to_datetime(epoch_day: int) -> datetime:
+    """Midnight (wall clock) at the start of an epoch day"""
+    return _EPOCH + timedelta(days=int(epoch_day))
+
+def today_epoch_day() -> int:
+    """Today's day number since the epoch, by local wall clock"""
+    return to_epoch_us(datetime.now()) // DAY_US
 
-@dataclass
 class Activity:
-    """Activity data model"""
-    id: int
-    goal_id: int
-    activity_type: str
-    value: float
-    timestamp: str
-    notes: Optional[str] = None
-    
+    """Activity data model
+
+    The timestamp is parsed once, at construction, into wall-clock epoch
+    microseconds (`ts`) and a day number (`day`, days since the epoch).
+    The ISO string is only rebuilt when the activity is serialized, and the
+    encoded JSON is cached so list responses only concatenate fragments.
+    """
+    __slots__ = ('id', 'goal_id', 'activity_type', 'value', 'ts', 'day', 'notes', '_json')
+
+    def __init__(self, id: int, goal_id: int, activity_type: str, value: float,
+                 timestamp: Union[str, datetime, int], notes: Optional[str] = None):
+        self.id = id
+        self.goal_id = goal_id
+        self.activity_type = activity_type
+        self.value = value
+        self.ts = parse_timestamp(timestamp)
+        self.day = self.ts // DAY_US
+        self.notes = notes
+        self._json: Optional[bytes] = None
+
+    @property
+    def timestamp(self) -> str:
+        """ISO timestamp, rebuilt from the epoch"""
+        return epoch_us_to_iso(self.ts)
+
+    def __eq__(self, other):
+        if not isinstance(other, Activity):
+            return NotImplemented
+        return (self.id, self.goal_id, self.activity_type, self.value, self.ts, self.notes) == \
+            (other.id, other.goal_id, other.activity_type, other.value, other.ts, other.notes)
+
+    def __reduce__(self):
+        # Pickle the parsed epoch rather than the slots, so activities cross
+        # process boundaries without re-parsing or per-slot state dicts
+        return (Activity, (self.id, self.goal_id, self.activity_type, self.value, self.ts, self.notes))
+
+    def __repr__(self):
+        return (f"Activity(id={self.id!r}, goal_id={self.goal_id!r}, "
+                f"activity_type={self.activity_type!r}, value={self.value!r}, "
+                f"timestamp={self.timestamp!r}, notes={self.notes!r})")
+
     def to_dict(self):
         """Convert to dictionary"""
-        return asdict(self)
-    
+        return {
+            "id": self.id,
+            "goal_id": self.goal_id,
+            "activity_type": self.activity_type,
+            "value": self.value,
+            "timestamp": self.timestamp,
+            "notes": self.notes
+        }
+
+    def to_json(self) -> bytes:
+        """Encoded to_dict(), built once; activities never change after creation"""
+        if self._json is None:
+            self._json = dumps(self.to_dict())
+        return self._json
+
     @classmethod
     def from_dict(cls, data: dict):
         """Create from dictionary"""
-        return cls(**data)
\ No newline at end of file
+        return cls(**data)
@@ -0,0 +1,411 @@
+import bisect
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from app.models.activity import epoch_us_to_iso
+
+@dataclass
+class TypeAggregate:
+    """Running count and total for one activity type"""
+    count: int = 0
+    total_value: float = 0
+
+@dataclass
+class GoalAggregate:
+    """Running aggregate of every activity logged against a goal"""
+    goal_id: int
+    count: int = 0
+    total_value: float = 0
+    by_type: Dict[str, TypeAggregate] = field(default_factory=dict)
+    last_ts: Optional[int] = None
+
+    @property
+    def last_timestamp(self) -> Optional[str]:
+        """ISO timestamp of the latest activity"""
+        return epoch_us_to_iso(self.last_ts) if self.last_ts is not None else None
+
+    def copy(self) -> "GoalAggregate":
+        """Independent copy, safe to read while the original keeps changing"""
+        return GoalAggregate(
+            goal_id=self.goal_id,
+            count=self.count,
+            total_value=self.total_value,
+            by_type={activity_type: TypeAggregate(t.count, t.total_value)
+                     for activity_type, t in self.by_type.items()},
+            last_ts=self.last_ts
+        )
+
+    def update(self, activity) -> None:
+        """Fold one activity into the aggregate"""
+        self.count += 1
+        self.total_value += activity.value
+
+        type_aggregate = self.by_type.get(activity.activity_type)
+        if type_aggregate is None:
+            type_aggregate = self.by_type[activity.activity_type] = TypeAggregate()
+        type_aggregate.count += 1
+        type_aggregate.total_value += activity.value
+
+        if self.last_ts is None or activity.ts > self.last_ts:
+            self.last_ts = activity.ts
+
+    def type_count(self, activity_type: str) -> int:
+        """Number of activities of a type"""
+        type_aggregate = self.by_type.get(activity_type)
+        return type_aggregate.count if type_aggregate else 0
+
+    def type_total(self, activity_type: str) -> float:
+        """Total value of activities of a type"""
+        type_aggregate = self.by_type.get(activity_type)
+        return type_aggregate.total_value if type_aggregate else 0
+
+    def type_totals(self) -> Dict[str, float]:
+        """Total value per activity type"""
+        return {activity_type: type_aggregate.total_value
+                for activity_type, type_aggregate in self.by_type.items()}
+
+    def to_summary(self) -> Dict[str, Any]:
+        """Convert to the dashboard summary shape"""
+        if not self.count:
+            return {
+                "total_activities": 0,
+                "total_value": 0,
+                "average_value": 0,
+                "activity_by_type": {}
+            }
+
+        return {
+            "total_activities": self.count,
+            "total_value": self.total_value,
+            "average_value": self.total_value / self.count,
+            "activity_by_type": {
+                activity_type: {
+                    "count": type_aggregate.count,
+                    "total_value": type_aggregate.total_value
+                }
+                for activity_type, type_aggregate in self.by_type.items()
+            },
+            "last_activity": self.last_timestamp
+        }
+
+@dataclass
+class GoalStats:
+    """Everything the insight payloads need about one goal"""
+    aggregate: GoalAggregate
+    distinct_days: int = 0
+    longest_streak: int = 0
+    # Per-type totals over the requested day window
+    window_totals: Dict[str, float] = field(default_factory=dict)
+
+def longest_run(sorted_days: Iterable[int]) -> int:
+    """Longest run of consecutive numbers in a sorted sequence of distinct days"""
+    longest = current = 0
+    previous = None
+    for day in sorted_days:
+        current = current + 1 if previous is not None and day == previous + 1 else 1
+        longest = max(longest, current)
+        previous = day
+    return longest
+
+def week_of(day: int) -> int:
+    """Monday-based week number of an epoch day (1970-01-01 was a Thursday)"""
+    return (day + 3) // 7
+
+def consistency_score(distinct_days: int, longest_streak: int) -> float:
+    """Longest run of consecutive active days relative to all active days"""
+    if not distinct_days:
+        return 0.0
+    
+    if distinct_days < 2:
+        return 0.5
+    
+    # A lone day is not a streak
+    max_streak = longest_streak if longest_streak >= 2 else 0
+    
+    score = max_streak / distinct_days
+    return round(min(score, 1.0), 2)
+
+# Leaderboard metrics: plain names, or a prefix plus an activity type
+# ('total.Health' ranks by lifetime Health total, 'weekly.Health' by this week's)
+LEADERBOARD_METRICS = ('consistency_score', 'total_value', 'weekly_total')
+LEADERBOARD_TYPE_PREFIXES = ('total', 'weekly')
+
+def parse_leaderboard_metric(metric: str) -> Tuple[str, Optional[str]]:
+    """(metric kind, activity type or None); raises ValueError for unknown metrics"""
+    if metric in LEADERBOARD_METRICS:
+        return metric, None
+    prefix, _, activity_type = metric.partition('.')
+    if prefix in LEADERBOARD_TYPE_PREFIXES and activity_type:
+        return prefix, activity_type
+    raise ValueError(f"Unknown leaderboard metric {metric!r}: use one of "
+                     f"{', '.join(LEADERBOARD_METRICS)}, total.<type> or weekly.<type>")
+
+def is_windowed_metric(metric: str) -> bool:
+    """True when the metric reads the weekly window totals"""
+    return parse_leaderboard_metric(metric)[0] in ('weekly_total', 'weekly')
+
+def goal_metric(metric: str, stats: "GoalStats") -> float:
+    """A goal's score on a leaderboard metric"""
+    kind, activity_type = parse_leaderboard_metric(metric)
+    if kind == 'consistency_score':
+        return consistency_score(stats.distinct_days, stats.longest_streak)
+    if kind == 'total_value':
+        return stats.aggregate.total_value
+    if kind == 'weekly_total':
+        return sum(stats.window_totals.values())
+    if kind == 'total':
+        return stats.aggregate.type_total(activity_type)
+    return stats.window_totals.get(activity_type, 0)
+
+class RankIndex:
+    """Goals ordered by descending score, updated one goal at a time
+
+    Keys are (-score, sequence) kept in sorted buckets of at most
+    2 * BUCKET_SIZE, with each bucket's last key in a separate list: the
+    two levels of a skiplist. A goal moves with two binary searches and an
+    O(BUCKET_SIZE) list edit, and top(k) reads the first buckets. The
+    sequence number (first insertion order) breaks ties without comparing
+    goal ids, which need not be orderable. Goals scoring zero are left out.
+    """
+    __slots__ = ('_buckets', '_maxes', '_key_by_goal', '_goal_by_sequence', '_sequence')
+
+    BUCKET_SIZE = 512
+
+    def __init__(self):
+        self._buckets: List[List[Tuple[float, int]]] = []
+        self._maxes: List[Tuple[float, int]] = []
+        self._key_by_goal: Dict[Any, Tuple[float, int]] = {}
+        self._goal_by_sequence: Dict[int, Any] = {}
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self._key_by_goal)
+
+    def set(self, goal_id: Any, score: float) -> None:
+        """Place a goal at its new score (zero removes it)"""
+        key = self._key_by_goal.get(goal_id)
+        if key is not None:
+            if key[0] == -score:
+                return
+            self._remove(key)
+        if not score:
+            if key is not None:
+                del self._key_by_goal[goal_id]
+                del self._goal_by_sequence[key[1]]
+            return
+
+        if key is None:
+            self._sequence += 1
+            key = (-score, self._sequence)
+            self._goal_by_sequence[self._sequence] = goal_id
+        else:
+            key = (-score, key[1])
+        self._insert(key)
+        self._key_by_goal[goal_id] = key
+
+    def discard(self, goal_id: Any) -> None:
+        """Drop a goal if it is ranked"""
+        key = self._key_by_goal.pop(goal_id, None)
+        if key is not None:
+            self._remove(key)
+            del self._goal_by_sequence[key[1]]
+
+    def _insert(self, key: Tuple[float, int]) -> None:
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            return
+        index = min(bisect.bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[index]
+        bisect.insort(bucket, key)
+        self._maxes[index] = bucket[-1]
+        if len(bucket) > 2 * self.BUCKET_SIZE:
+            self._buckets.insert(index + 1, bucket[self.BUCKET_SIZE:])
+            del bucket[self.BUCKET_SIZE:]
+            self._maxes.insert(index, bucket[-1])
+
+    def _remove(self, key: Tuple[float, int]) -> None:
+        index = bisect.bisect_left(self._maxes, key)
+        bucket = self._buckets[index]
+        del bucket[bisect.bisect_left(bucket, key)]
+        if bucket:
+            self._maxes[index] = bucket[-1]
+        else:
+            del self._buckets[index]
+            del self._maxes[index]
+
+    def top(self, k: int) -> List[Tuple[Any, float]]:
+        """The k highest-scoring (goal_id, score) pairs, best first"""
+        leaders: List[Tuple[Any, float]] = []
+        for bucket in self._buckets:
+            for score, sequence in bucket[:k - len(leaders)]:
+                leaders.append((self._goal_by_sequence[sequence], -score))
+            if len(leaders) >= k:
+                break
+        return leaders
+
+def _add_rollup(totals: Dict[str, TypeAggregate], bucket: Dict[str, TypeAggregate]) -> None:
+    for activity_type, rollup in bucket.items():
+        total = totals.get(activity_type)
+        if total is None:
+            total = totals[activity_type] = TypeAggregate()
+        total.count += rollup.count
+        total.total_value += rollup.total_value
+
+class GoalDayIndex:
+    """Per-goal daily and weekly rollups (per-type count and total) with incremental streaks
+
+    Days are numbered since the epoch; weeks start on Monday (see week_of).
+    Both rollups are updated on ingest and outlive the raw activities, so
+    they are what remains of a goal's history once old rows are compacted.
+    Runs of consecutive active days are kept as two maps (start -> end,
+    end -> start) so that a new day, even one inserted out of order,
+    merges with its neighbours in O(1).
+    """
+    __slots__ = ('buckets', 'weeks', 'longest_streak', '_run_end_by_start', '_run_start_by_end')
+
+    def __init__(self):
+        self.buckets: Dict[int, Dict[str, TypeAggregate]] = {}
+        self.weeks: Dict[int, Dict[str, TypeAggregate]] = {}
+        self.longest_streak = 0
+        self._run_end_by_start: Dict[int, int] = {}
+        self._run_start_by_end: Dict[int, int] = {}
+
+    @property
+    def distinct_days(self) -> int:
+        """Number of days with at least one activity"""
+        return len(self.buckets)
+
+    def update(self, activity) -> None:
+        """Fold one activity into its day and week rollups"""
+        bucket = self.buckets.get(activity.day)
+        if bucket is None:
+            bucket = self.buckets[activity.day] = {}
+            self._add_day(activity.day)
+        week = self.weeks.get(week_of(activity.day))
+        if week is None:
+            week = self.weeks[week_of(activity.day)] = {}
+
+        for rollups in (bucket, week):
+            rollup = rollups.get(activity.activity_type)
+            if rollup is None:
+                rollup = rollups[activity.activity_type] = TypeAggregate()
+            rollup.count += 1
+            rollup.total_value += activity.value
+
+    def _add_day(self, day: int) -> None:
+        """Merge a newly active day with the runs on either side of it"""
+        start = end = day
+        if day - 1 in self._run_start_by_end:
+            start = self._run_start_by_end.pop(day - 1)
+        if day + 1 in self._run_end_by_start:
+            end = self._run_end_by_start.pop(day + 1)
+
+        self._run_end_by_start[start] = end
+        self._run_start_by_end[end] = start
+        self.longest_streak = max(self.longest_streak, end - start + 1)
+
+    def window_rollup(self, first_day: int, last_day: int) -> Dict[str, TypeAggregate]:
+        """Per-type count and total for days first_day..last_day inclusive
+
+        Whole weeks inside the window are read from the weekly rollups and
+        only the partial weeks at either end from the daily ones, so long
+        windows cost O(weeks) rather than O(days).
+        """
+        totals: Dict[str, TypeAggregate] = {}
+        first_week = week_of(first_day + 6)       # first week starting on or after first_day
+        last_week = week_of(last_day + 1) - 1     # last week ending on or before last_day
+        if first_week > last_week:
+            self._add_range(totals, self.buckets, first_day, last_day)
+            return totals
+
+        self._add_range(totals, self.buckets, first_day, 7 * first_week - 4)
+        self._add_range(totals, self.weeks, first_week, last_week)
+        self._add_range(totals, self.buckets, 7 * last_week + 4, last_day)
+        return totals
+
+    @staticmethod
+    def _add_range(totals: Dict[str, TypeAggregate], rollups: Dict[int, Dict[str, TypeAggregate]],
+                   first: int, last: int) -> None:
+        if last < first:
+            return
+        if last - first + 1 > len(rollups):
+            keys = (key for key in rollups if first <= key <= last)
+        else:
+            keys = range(first, last + 1)
+
+        for key in keys:
+            bucket = rollups.get(key)
+            if bucket:
+                _add_rollup(totals, bucket)
+
+    def window_totals(self, first_day: int, last_day: int) -> Dict[str, float]:
+        """Per-type totals for days first_day..last_day inclusive"""
+        return {activity_type: rollup.total_value
+                for activity_type, rollup in self.window_rollup(first_day, last_day).items()}
+
+class GoalTimeline:
+    """A goal's activity ids sorted by (timestamp, id)
+
+    Timestamps and ids live in two parallel int64 arrays (16 bytes per
+    activity), so a time window is found with two binary searches and read
+    as one contiguous slice. Appends in time order are the common case and
+    cost O(1); late (out-of-order) activities are inserted in place.
+    """
+    __slots__ = ('timestamps', 'ids')
+
+    # Out-of-order batches larger than this are merged by re-sorting
+    _RESORT_THRESHOLD = 64
+
+    def __init__(self):
+        self.timestamps = array('q')
+        self.ids = array('q')
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def insert_many(self, activities: Iterable) -> None:
+        """Add activities, keeping (timestamp, id) order"""
+        keys = sorted((activity.ts, activity.id) for activity in activities)
+        if not keys:
+            return
+
+        if not self.ids or keys[0] >= (self.timestamps[-1], self.ids[-1]):
+            self.timestamps.extend(ts for ts, _ in keys)
+            self.ids.extend(activity_id for _, activity_id in keys)
+        elif len(keys) > self._RESORT_THRESHOLD:
+            merged = sorted(list(zip(self.timestamps, self.ids)) + keys)
+            self.timestamps = array('q', (ts for ts, _ in merged))
+            self.ids = array('q', (activity_id for _, activity_id in merged))
+        else:
+            for ts, activity_id in keys:
+                # Among equal timestamps, ids are in order too
+                low = bisect.bisect_left(self.timestamps, ts)
+                high = bisect.bisect_right(self.timestamps, ts, low)
+                position = bisect.bisect_right(self.ids, activity_id, low, high)
+                self.timestamps.insert(position, ts)
+                self.ids.insert(position, activity_id)
+
+    def position(self, ts: Optional[int], activity_id: Optional[int] = None) -> int:
+        """Index of the first entry at or after a timestamp, or strictly after a (ts, id) key"""
+        if ts is None:
+            return 0
+        low = bisect.bisect_left(self.timestamps, ts)
+        if activity_id is None:
+            return low
+        high = bisect.bisect_right(self.timestamps, ts, low)
+        return bisect.bisect_right(self.ids, activity_id, low, high)
+
+    def window(self, start_us: Optional[int] = None, end_us: Optional[int] = None) -> Tuple[int, int]:
+        """Index range [first, last) of entries with start_us <= ts < end_us"""
+        first = self.position(start_us)
+        last = len(self.ids) if end_us is None else bisect.bisect_left(self.timestamps, end_us, first)
+        return first, max(first, last)
+
+    def drop_before(self, end_us: int) -> "array":
+        """Remove the entries with ts < end_us, returning their ids"""
+        _, last = self.window(None, end_us)
+        dropped = self.ids[:last]
+        del self.timestamps[:last]
+        del self.ids[:last]
+        return dropped
@@ -0,0 +1,223 @@
+import math
+import random
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# About 2.8 KB per sketch for a 2% rank error bound (see kll_rank_error)
+DEFAULT_K = 128
+# Compactor capacities shrink by this factor per level below the top
+_DECAY = 2 / 3
+_MIN_WIDTH = 8
+# Days per DayBitmap chunk, about 2.8 years in 128 bytes
+_CHUNK_DAYS = 1024
+
+def kll_rank_error(k: int) -> float:
+    """Normalized rank error of a single quantile at 99% confidence
+
+    The empirical fit published with Apache DataSketches' KLL sketch, whose
+    compactor schedule (decay 2/3, minimum width 8) this one follows.
+    """
+    return 2.296 / k ** 0.9723
+
+class KllSketch:
+    """Mergeable quantile sketch of a stream of floats (Karnin, Lang and Liberty)
+
+    Values live in levels of compactors; a value at level h stands for 2**h
+    inputs. When the sketch is full, the lowest over-capacity level is
+    sorted and every other value (from a random offset) is promoted, which
+    keeps about 3k values whatever the stream length. Quantiles are exact
+    while count < k; beyond that a returned value's rank is within
+    kll_rank_error(k) of the requested one with 99% confidence. Min and
+    max are always exact.
+    """
+    __slots__ = ('k', 'count', 'min', 'max', '_levels', '_size', '_max_size')
+
+    def __init__(self, k: int = DEFAULT_K):
+        self.k = k
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._levels: List[array] = [array('d')]
+        self._size = 0
+        self._max_size = self._capacity(0)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self._levels) - level - 1
+        return max(_MIN_WIDTH, int(math.ceil(self.k * _DECAY ** depth)))
+
+    def update(self, value: float) -> None:
+        """Add one value"""
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self._levels[0].append(value)
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other: "KllSketch") -> None:
+        """Fold another sketch in; the result sketches both streams"""
+        if not other.count:
+            return
+        while len(self._levels) < len(other._levels):
+            self._grow()
+        for level, values in enumerate(other._levels):
+            self._levels[level].extend(values)
+        self._size = sum(len(values) for values in self._levels)
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        while self._size >= self._max_size:
+            self._compress()
+
+    def _grow(self) -> None:
+        self._levels.append(array('d'))
+        self._max_size = sum(self._capacity(level) for level in range(len(self._levels)))
+
+    def _compress(self) -> None:
+        """Halve the lowest level that is over capacity into the one above"""
+        for level in range(len(self._levels)):
+            if len(self._levels[level]) < self._capacity(level):
+                continue
+            if level + 1 == len(self._levels):
+                self._grow()
+            values = sorted(self._levels[level])
+            # An odd value out stays behind at its current weight
+            kept = values[:len(values) % 2]
+            paired = values[len(kept):]
+            self._levels[level] = array('d', kept)
+            self._levels[level + 1].extend(paired[random.getrandbits(1)::2])
+            self._size -= len(paired) // 2
+            return
+
+    def _weighted(self) -> List[Tuple[float, int]]:
+        return sorted((value, 1 << level)
+                      for level, values in enumerate(self._levels) for value in values)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at rank q (0..1) of the stream, None when it is empty"""
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        """Values at several ranks from one pass over the sketch"""
+        qs = list(qs)
+        if not self.count:
+            return [None] * len(qs)
+        weighted = self._weighted()
+        total = sum(weight for _, weight in weighted)
+        results = []
+        for q in qs:
+            if q <= 0:
+                results.append(self.min)
+                continue
+            if q >= 1:
+                results.append(self.max)
+                continue
+            target = q * total
+            cumulative = 0
+            for value, weight in weighted:
+                cumulative += weight
+                if cumulative >= target:
+                    results.append(value)
+                    break
+        return results
+
+    def rank_error(self) -> float:
+        """Rank error bound of the current answers (0 while exact)"""
+        return 0.0 if self.count < self.k else kll_rank_error(self.k)
+
+    def copy(self) -> "KllSketch":
+        sketch = KllSketch(self.k)
+        sketch.count, sketch.min, sketch.max = self.count, self.min, self.max
+        sketch._levels = [array('d', values) for values in self._levels]
+        sketch._size, sketch._max_size = self._size, self._max_size
+        return sketch
+
+class DayBitmap:
+    """Exact set of epoch days, as one bitmap per chunk of _CHUNK_DAYS days
+
+    A year of history fits in one or two 128-byte chunks, and an outlying
+    timestamp decades away only adds one more chunk rather than a bit for
+    every day in between. Unlike a hashed distinct counter it
+    answers any day window exactly, and two bitmaps merge with an OR per
+    chunk.
+    """
+    __slots__ = ('chunks',)
+
+    def __init__(self):
+        self.chunks: Dict[int, int] = {}
+
+    def add(self, day: int) -> None:
+        chunk, bit = divmod(day, _CHUNK_DAYS)
+        self.chunks[chunk] = self.chunks.get(chunk, 0) | (1 << bit)
+
+    def merge(self, other: "DayBitmap") -> None:
+        for chunk, bits in other.chunks.items():
+            self.chunks[chunk] = self.chunks.get(chunk, 0) | bits
+
+    def count(self, first_day: Optional[int] = None, last_day: Optional[int] = None) -> int:
+        """Days set within first_day..last_day inclusive (None = unbounded)"""
+        total = 0
+        for chunk, bits in self.chunks.items():
+            start = chunk * _CHUNK_DAYS
+            low = 0 if first_day is None else max(0, first_day - start)
+            high = _CHUNK_DAYS - 1 if last_day is None else min(_CHUNK_DAYS - 1, last_day - start)
+            if low <= high:
+                total += bin((bits >> low) & ((1 << (high - low + 1)) - 1)).count('1')
+        return total
+
+    def copy(self) -> "DayBitmap":
+        bitmap = DayBitmap()
+        bitmap.chunks = dict(self.chunks)
+        return bitmap
+
+class TypeSketch:
+    """Value quantiles and active days of one activity type of a goal"""
+    __slots__ = ('values', 'days')
+
+    def __init__(self, k: int):
+        self.values = KllSketch(k)
+        self.days = DayBitmap()
+
+    def merge(self, other: "TypeSketch") -> None:
+        self.values.merge(other.values)
+        self.days.merge(other.days)
+
+    def copy(self) -> "TypeSketch":
+        sketch = TypeSketch(self.values.k)
+        sketch.values, sketch.days = self.values.copy(), self.days.copy()
+        return sketch
+
+class GoalSketches:
+    """Per-type sketches of a goal, maintained on ingest like its rollups
+
+    They keep a few KB per type however long the history, and outlive
+    compacted raw rows.
+    """
+    __slots__ = ('k', 'by_type')
+
+    def __init__(self, k: int = DEFAULT_K):
+        self.k = k
+        self.by_type: Dict[str, TypeSketch] = {}
+
+    def update(self, activity) -> None:
+        """Fold one activity into its type's sketches"""
+        sketch = self.by_type.get(activity.activity_type)
+        if sketch is None:
+            sketch = self.by_type[activity.activity_type] = TypeSketch(self.k)
+        sketch.values.update(activity.value)
+        sketch.days.add(activity.day)
+
+    def combined(self) -> TypeSketch:
+        """Every type merged into one sketch"""
+        combined = TypeSketch(self.k)
+        for sketch in self.by_type.values():
+            combined.merge(sketch)
+        return combined
+
+    def copy(self) -> "GoalSketches":
+        sketches = GoalSketches(self.k)
+        sketches.by_type = {activity_type: sketch.copy() for activity_type, sketch in self.by_type.items()}
+        return sketches
@@ -1,16 +1,44 @@
  # Repository pattern interface
 
+import heapq
 from abc import ABC, abstractmethod
-from typing import List, Optional
-from app.models.activity import Activity
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from app.models.activity import Activity, epoch_day_to_date, epoch_day_to_datetime, to_epoch_us
+from app.models.goal_aggregate import GoalAggregate, GoalStats, goal_metric, longest_run
+from app.models.sketches import GoalSketches
 
 class BaseRepository(ABC):
     """Base repository interface"""
     
+    # True when calls wait on I/O, so async callers should run them off the event loop
+    blocking_io = False
+    # True when separate processes opening the same store see each other's
+    # writes, so a pre-forked server can share it between workers
+    process_safe = False
+    # True when reads may run on one thread while another writes or compacts,
+    # which background jobs (compactor, precompute, streams) rely on
+    thread_safe = False
+    
     @abstractmethod
     def add(self, activity_data: dict) -> Activity:
         pass
     
+    def add_many(self, activities_data: Iterable[dict]) -> List[Activity]:
+        """Add several activities (override to batch index maintenance)"""
+        return [self.add(activity_data) for activity_data in activities_data]
+    
+    def bulk_load(self, chunks: Iterable[List[dict]]) -> int:
+        """Load an offline import chunk by chunk, returning the number of activities
+        
+        Defaults to one add_many() per chunk; backends override it to defer
+        index maintenance until the whole import is in.
+        """
+        return sum(len(self.add_many(chunk)) for chunk in chunks)
+    
+    def after_fork(self) -> None:
+        """Drop per-process resources (connections, locks) inherited from a parent process"""
+    
     @abstractmethod
     def get_by_id(self, activity_id: int) -> Optional[Activity]:
         pass
@@ -23,5 +51,151 @@ class BaseRepository(ABC):
     def get_all(self) -> List[Activity]:
         pass
 
+    def goal_ids(self) -> List[Any]:
+        """Every goal with activity (scans; override with an index)"""
+        return list(dict.fromkeys(activity.goal_id for activity in self.get_all()))
+
+    def get_goal_aggregate(self, goal_id: int) -> GoalAggregate:
+        """Aggregate a goal's activities (scans; override to maintain incrementally)"""
+        aggregate = GoalAggregate(goal_id=goal_id)
+        for activity in self.get_by_goal(goal_id):
+            aggregate.update(activity)
+        return aggregate
+
+    def get_goal_version(self, goal_id: int) -> int:
+        """Counter that changes whenever the goal's activities change"""
+        return self.get_goal_aggregate(goal_id).count
+    
+    def get_by_goal_range(self, goal_id: int, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None,
+                          activity_type: Optional[str] = None) -> List[Activity]:
+        """A goal's activities with start <= timestamp < end, ordered by (timestamp, id)
+        
+        Scans the goal's history; override with a time-ordered index.
+        """
+        start_us = to_epoch_us(start) if start is not None else None
+        end_us = to_epoch_us(end) if end is not None else None
+        
+        matching = [activity for activity in self.get_by_goal(goal_id)
+                    if (start_us is None or activity.ts >= start_us)
+                    and (end_us is None or activity.ts < end_us)
+                    and (activity_type is None or activity.activity_type == activity_type)]
+        matching.sort(key=lambda activity: (activity.ts, activity.id))
+        return matching
+    
+    def sum_by_type(self, goal_id: int, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None) -> Dict[str, float]:
+        """Total value per activity type within [start, end)"""
+        totals: Dict[str, float] = {}
+        for activity in self.get_by_goal_range(goal_id, start, end):
+            totals[activity.activity_type] = totals.get(activity.activity_type, 0) + activity.value
+        return totals
+
+    def get_goal_page(self, goal_id: int, limit: int, after: Optional[Tuple[int, int]] = None,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      activity_type: Optional[str] = None) -> List[Activity]:
+        """Up to `limit` activities ordered by (timestamp, id), after a keyset cursor
+        
+        `after` is the (epoch microseconds, id) key of the last activity of
+        the previous page; `start`/`end` bound the timestamps to [start, end).
+        """
+        page = []
+        for activity in self.get_by_goal_range(goal_id, start, end, activity_type):
+            if after is not None and (activity.ts, activity.id) <= after:
+                continue
+            page.append(activity)
+            if len(page) == limit:
+                break
+        return page
+    
+    def get_active_dates(self, goal_id: int) -> List[date]:
+        """Sorted distinct dates on which the goal has activity"""
+        days = sorted(set(a.day for a in self.get_by_goal(goal_id)))
+        return [epoch_day_to_date(day) for day in days]
+    
+    def get_day_totals(self, goal_id: int, first_day: int, last_day: int) -> Dict[str, float]:
+        """Total value per type over epoch days first_day..last_day inclusive"""
+        return self.sum_by_type(goal_id,
+                                start=epoch_day_to_datetime(first_day),
+                                end=epoch_day_to_datetime(last_day + 1))
+    
+    def get_streak_stats(self, goal_id: int) -> Tuple[int, int]:
+        """(distinct active days, longest run of consecutive days)"""
+        dates = self.get_active_dates(goal_id)
+        
+        longest = current = 1 if dates else 0
+        for previous, following in zip(dates, dates[1:]):
+            current = current + 1 if (following - previous).days == 1 else 1
+            longest = max(longest, current)
+        return len(dates), longest
+
+    def get_goal_stats(self, goal_ids: Optional[Iterable[int]], first_day: int,
+                       last_day: int) -> Dict[int, GoalStats]:
+        """Aggregates, streak stats and day-window totals for many goals at once
+        
+        `goal_ids=None` means every goal with activity; requested goals
+        without activity get empty stats. This default makes a single pass
+        over get_all() however many goals are asked for.
+        """
+        wanted = set(goal_ids) if goal_ids is not None else None
+        aggregates: Dict[int, GoalAggregate] = {}
+        days: Dict[int, Set[int]] = {}
+        window_totals: Dict[int, Dict[str, float]] = {}
+        
+        for activity in self.get_all():
+            goal_id = activity.goal_id
+            if wanted is not None and goal_id not in wanted:
+                continue
+            aggregate = aggregates.get(goal_id)
+            if aggregate is None:
+                aggregate = aggregates[goal_id] = GoalAggregate(goal_id=goal_id)
+                days[goal_id] = set()
+                window_totals[goal_id] = {}
+            aggregate.update(activity)
+            days[goal_id].add(activity.day)
+            if first_day <= activity.day <= last_day:
+                totals = window_totals[goal_id]
+                totals[activity.activity_type] = totals.get(activity.activity_type, 0) + activity.value
+        
+        stats = {goal_id: GoalStats(aggregate, len(days[goal_id]),
+                                    longest_run(sorted(days[goal_id])), window_totals[goal_id])
+                 for goal_id, aggregate in aggregates.items()}
+        for goal_id in (wanted or ()):
+            if goal_id not in stats:
+                stats[goal_id] = GoalStats(GoalAggregate(goal_id=goal_id))
+        return stats
+
+    def get_goal_sketches(self, goal_id: int) -> GoalSketches:
+        """Per-type value quantile sketches and active-day bitmaps of a goal
+        
+        Built from the goal's raw rows per call; override to maintain them
+        on ingest.
+        """
+        sketches = GoalSketches()
+        for activity in self.get_by_goal(goal_id):
+            sketches.update(activity)
+        return sketches
+
+    def top_goals(self, metric: str, k: int, first_day: int,
+                  last_day: int) -> List[Tuple[Any, float]]:
+        """The k goals scoring highest on a leaderboard metric, as (goal_id, score)
+        
+        Windowed metrics (weekly_total, weekly.<type>) read days
+        first_day..last_day. Goals scoring zero are left out; ties keep
+        get_goal_stats() order. This default scores every goal per call;
+        override with incrementally maintained rankings.
+        """
+        scored = ((goal_id, goal_metric(metric, stats))
+                  for goal_id, stats in self.get_goal_stats(None, first_day, last_day).items())
+        return heapq.nlargest(k, (item for item in scored if item[1]), key=lambda item: item[1])
+
+    def compact(self, before_day: int) -> int:
+        """Fold raw activities from epoch days before `before_day` into rollups
+        
+        Returns the number of raw rows dropped. Backends without rollups
+        keep every row and return 0.
+        """
+        return 0
+
 # Export BaseRepository from the package
 __all__ = ['BaseRepository']
\ No newline at end of file
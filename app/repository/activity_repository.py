@@ -1,14 +1,54 @@
-from typing import List, Optional, Dict
+from collections import OrderedDict
+from datetime import date, datetime
+from numbers import Real
+from typing import Any, Iterable, List, Mapping, Optional, Dict, Tuple
+from app.config import load_settings
 from app.repository import BaseRepository  # Import from package
-from app.models.activity import Activity
+from app.models.activity import (Activity, DAY_US, epoch_day_to_date, epoch_day_to_datetime,
+                                 to_epoch_us)
+from app.models.goal_aggregate import (GoalAggregate, GoalDayIndex, GoalStats, GoalTimeline,
+                                       RankIndex, goal_metric, is_windowed_metric)
+from app.models.sketches import GoalSketches
+
+def check_indexable(activities: Iterable[Activity]) -> None:
+    """Raise TypeError for an activity the goal and type indexes cannot hold
+    
+    Called before anything is stored, so a rejected batch leaves no rows,
+    ids or index entries behind.
+    """
+    for activity in activities:
+        try:
+            hash(activity.goal_id)
+            hash(activity.activity_type)
+        except TypeError:
+            raise TypeError(f"Unhashable goal_id or activity_type in activity {activity.id}")
+        if not isinstance(activity.value, Real):
+            raise TypeError(f"Activity {activity.id} has a non-numeric value: {activity.value!r}")
+
+# (metric, day window or None) of a leaderboard ranking
+RankingKey = Tuple[str, Optional[Tuple[int, int]]]
 
 class InMemoryActivityRepository(BaseRepository):
     """In-memory implementation of activity repository"""
     
+    # Leaderboard rankings kept up to date on write; the least recently
+    # queried one is dropped beyond this
+    MAX_RANKINGS = 16
+    
     def __init__(self):
         self._storage: Dict[int, Activity] = {}
         self._next_id = 1
         self._goal_index: Dict[int, List[int]] = {}
+        # Per-type value quantiles and active days, a few KB per type
+        self._goal_sketches: Dict[int, GoalSketches] = {}
+        self._goal_aggregates: Dict[int, GoalAggregate] = {}
+        self._day_indexes: Dict[int, GoalDayIndex] = {}
+        self._timelines: Dict[int, GoalTimeline] = {}
+        self._goal_versions: Dict[int, int] = {}
+        # Built on a metric's first top_goals() query, then reranked per written goal
+        self._rankings: 'OrderedDict[RankingKey, RankIndex]' = OrderedDict()
+        # Raw rows before this epoch day have been folded into the day rollups
+        self._compacted_before_day: Optional[int] = None
     
     def add(self, activity_data: dict) -> Activity:
         """Add a new activity"""
@@ -16,16 +56,191 @@ class InMemoryActivityRepository(BaseRepository):
             id=self._next_id,
             **activity_data
         )
+        self._insert(activity)
+        return activity
+    
+    def add_many(self, activities_data: Iterable[dict]) -> List[Activity]:
+        """Add a batch of activities, touching each goal's index once"""
+        activities = [Activity(id=self._next_id + offset, **activity_data)
+                      for offset, activity_data in enumerate(activities_data)]
+        self._insert_many(activities)
+        return activities
+    
+    def _insert(self, activity: Activity) -> None:
+        """Store an activity that already has its id and update every index"""
+        self._insert_many([activity])
+    
+    def _insert_many(self, activities: List[Activity]) -> None:
+        """Store activities that already have ids and update every index"""
+        if not activities:
+            return
+        
+        # Everything that can reject a record runs before the first write
+        check_indexable(activities)
+        by_goal: Dict[int, List[Activity]] = {}
+        for activity in activities:
+            by_goal.setdefault(activity.goal_id, []).append(activity)
         
-        self._storage[self._next_id] = activity
-        self._next_id += 1
+        for activity in activities:
+            self._storage[activity.id] = activity
+        self._next_id = max(self._next_id, max(a.id for a in activities) + 1)
         
+        for goal_id, goal_activities in by_goal.items():
+            self._index_raw(goal_id, goal_activities)
+            
+            # Keep per-goal aggregates current so summaries never rescan
+            if goal_id not in self._goal_aggregates:
+                self._goal_aggregates[goal_id] = GoalAggregate(goal_id=goal_id)
+            aggregate = self._goal_aggregates[goal_id]
+            
+            # Day and week rollups answer consistency and weekly windows without scans
+            if goal_id not in self._day_indexes:
+                self._day_indexes[goal_id] = GoalDayIndex()
+            day_index = self._day_indexes[goal_id]
+            
+            if goal_id not in self._goal_sketches:
+                self._goal_sketches[goal_id] = GoalSketches()
+            sketches = self._goal_sketches[goal_id]
+            
+            for activity in goal_activities:
+                aggregate.update(activity)
+                day_index.update(activity)
+                sketches.update(activity)
+            
+            # One version bump per goal per write
+            self._goal_versions[goal_id] = self._goal_versions.get(goal_id, 0) + 1
+        
+        if self._rankings:
+            self._rerank(by_goal)
+    
+    def _index_raw(self, goal_id: int, activities: List[Activity]) -> None:
+        """Add stored activities to the goal's raw-row indexes"""
         # Index by goal_id for fast queries
-        if activity.goal_id not in self._goal_index:
-            self._goal_index[activity.goal_id] = []
-        self._goal_index[activity.goal_id].append(activity.id)
+        if goal_id not in self._goal_index:
+            self._goal_index[goal_id] = []
+        self._goal_index[goal_id].extend(a.id for a in activities)
         
-        return activity
+        # Timestamp-ordered ids answer time windows by binary search
+        if goal_id not in self._timelines:
+            self._timelines[goal_id] = GoalTimeline()
+        self._timelines[goal_id].insert_many(activities)
+    
+    def _remove_goal(self, goal_id: int) -> Tuple[List[Activity], int, Optional[GoalAggregate],
+                                                  Optional[GoalDayIndex], Optional[GoalSketches]]:
+        """Detach a goal, returning its raw activities, version, aggregate, rollups and sketches"""
+        activities = [self._storage.pop(activity_id)
+                      for activity_id in self._goal_index.pop(goal_id, [])]
+        self._timelines.pop(goal_id, None)
+        for ranking in self._rankings.values():
+            ranking.discard(goal_id)
+        return (activities, self._goal_versions.pop(goal_id, 0),
+                self._goal_aggregates.pop(goal_id, None), self._day_indexes.pop(goal_id, None),
+                self._goal_sketches.pop(goal_id, None))
+    
+    def _restore_goal(self, goal_id: int, activities: List[Activity],
+                      aggregate: Optional[GoalAggregate], day_index: Optional[GoalDayIndex],
+                      sketches: Optional[GoalSketches]) -> None:
+        """Adopt a goal detached by _remove_goal, keeping the rollups and sketches of compacted rows"""
+        for activity in activities:
+            self._storage[activity.id] = activity
+        self._index_raw(goal_id, activities)
+        if aggregate is not None:
+            self._goal_aggregates[goal_id] = aggregate
+            self._day_indexes[goal_id] = day_index
+            self._goal_sketches[goal_id] = sketches
+        self._rerank([goal_id])
+    
+    # ========== LEADERBOARDS ==========
+    def top_goals(self, metric: str, k: int, first_day: int,
+                  last_day: int) -> List[Tuple[Any, float]]:
+        """The k best goals on a metric, read off its maintained ranking
+        
+        The first query of a metric (and of a weekly metric on a new day)
+        scores every goal once; later writes move only the goals they touch.
+        """
+        window = (first_day, last_day) if is_windowed_metric(metric) else None
+        return self._top(self._ranking((metric, window)), k)
+    
+    def _ranking(self, key: RankingKey) -> RankIndex:
+        """The maintained ranking for a key, built on first use"""
+        ranking = self._lookup_ranking(key)
+        if ranking is None:
+            ranking = self._register_ranking(key)
+            for goal_id in list(self._day_indexes):
+                self._rank_goal(ranking, key, goal_id)
+        return ranking
+    
+    def _lookup_ranking(self, key: RankingKey) -> Optional[RankIndex]:
+        ranking = self._rankings.get(key)
+        if ranking is not None:
+            self._rankings.move_to_end(key)
+        return ranking
+    
+    def _register_ranking(self, key: RankingKey) -> RankIndex:
+        """Start maintaining an (empty) ranking, dropping superseded ones"""
+        metric = key[0]
+        # Yesterday's window of a weekly metric will not be asked for again
+        for stale in [other for other in self._rankings if other[0] == metric]:
+            del self._rankings[stale]
+        while len(self._rankings) >= self.MAX_RANKINGS:
+            self._rankings.popitem(last=False)
+        ranking = self._rankings[key] = RankIndex()
+        return ranking
+    
+    def _rank_goal(self, ranking: RankIndex, key: RankingKey, goal_id: Any) -> None:
+        """Move a goal to its current score in one ranking"""
+        day_index = self._day_indexes.get(goal_id)
+        if day_index is None:
+            ranking.discard(goal_id)
+            return
+        metric, window = key
+        stats = GoalStats(
+            self._goal_aggregates[goal_id],
+            day_index.distinct_days,
+            day_index.longest_streak,
+            day_index.window_totals(*window) if window else {}
+        )
+        ranking.set(goal_id, goal_metric(metric, stats))
+    
+    def _rerank(self, goal_ids: Iterable[Any]) -> None:
+        """Move written goals in every maintained ranking"""
+        for key, ranking in self._rankings.items():
+            for goal_id in goal_ids:
+                self._rank_goal(ranking, key, goal_id)
+    
+    def _top(self, ranking: RankIndex, k: int) -> List[Tuple[Any, float]]:
+        return ranking.top(k)
+    
+    # ========== COMPACTION ==========
+    def compact(self, before_day: int) -> int:
+        """Fold raw activities from epoch days before `before_day` into the rollups
+        
+        Aggregates, day and week rollups and streaks already cover every
+        activity, so compaction only drops raw rows: summaries, insights and
+        day totals are unchanged, while raw reads (get_by_goal, range queries,
+        pages) return the retained rows. Returns the number of rows dropped.
+        """
+        # Move the boundary first: sum_by_type reads rollups below it, so no
+        # row is counted twice or missed while goals are being compacted
+        if self._compacted_before_day is None or before_day > self._compacted_before_day:
+            self._compacted_before_day = before_day
+        
+        before_us = before_day * DAY_US
+        return sum(self._compact_goal(goal_id, before_us) for goal_id in list(self._timelines))
+    
+    def _compact_goal(self, goal_id: int, before_us: int) -> int:
+        """Drop a goal's raw rows with ts < before_us"""
+        dropped = self._timelines[goal_id].drop_before(before_us)
+        if not dropped:
+            return 0
+        
+        for activity_id in dropped:
+            del self._storage[activity_id]
+        dropped_ids = set(dropped)
+        self._goal_index[goal_id] = [activity_id for activity_id in self._goal_index[goal_id]
+                                     if activity_id not in dropped_ids]
+        self._goal_versions[goal_id] = self._goal_versions.get(goal_id, 0) + 1
+        return len(dropped)
     
     def get_by_id(self, activity_id: int) -> Optional[Activity]:
         """Get activity by ID"""
@@ -40,6 +255,132 @@ class InMemoryActivityRepository(BaseRepository):
                 for activity_id in self._goal_index[goal_id]
                 if activity_id in self._storage]
     
+    def get_by_goal_range(self, goal_id: int, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None,
+                          activity_type: Optional[str] = None) -> List[Activity]:
+        """Activities in [start, end) by (timestamp, id), in O(log n + k)"""
+        timeline = self._timelines.get(goal_id)
+        if timeline is None:
+            return []
+        
+        first, last = timeline.window(to_epoch_us(start) if start is not None else None,
+                                      to_epoch_us(end) if end is not None else None)
+        activities = [self._storage[activity_id] for activity_id in timeline.ids[first:last]]
+        if activity_type is not None:
+            activities = [a for a in activities if a.activity_type == activity_type]
+        return activities
+    
+    def get_goal_page(self, goal_id: int, limit: int, after: Optional[Tuple[int, int]] = None,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      activity_type: Optional[str] = None) -> List[Activity]:
+        """Keyset page read straight from the goal's timeline"""
+        timeline = self._timelines.get(goal_id)
+        if timeline is None:
+            return []
+        
+        first, last = timeline.window(to_epoch_us(start) if start is not None else None,
+                                      to_epoch_us(end) if end is not None else None)
+        if after is not None:
+            first = max(first, timeline.position(*after))
+        
+        page = []
+        for index in range(first, last):
+            activity = self._storage[timeline.ids[index]]
+            if activity_type is not None and activity.activity_type != activity_type:
+                continue
+            page.append(activity)
+            if len(page) == limit:
+                break
+        return page
+    
+    def sum_by_type(self, goal_id: int, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None) -> Dict[str, float]:
+        """Total value per activity type within [start, end)
+        
+        Compacted history is summed from the day rollups at day granularity:
+        a compacted day counts when its midnight falls inside the range.
+        """
+        boundary = self._compacted_before_day
+        start_us = to_epoch_us(start) if start is not None else None
+        if boundary is None or (start_us is not None and start_us >= boundary * DAY_US):
+            return super().sum_by_type(goal_id, start, end)
+        
+        day_index = self._day_indexes.get(goal_id)
+        if day_index is None:
+            return {}
+        
+        # Days whose midnight lies in [start, min(end, boundary))
+        end_us = to_epoch_us(end) if end is not None else None
+        first_day = -(-start_us // DAY_US) if start_us is not None else min(day_index.buckets)
+        last_day = boundary - 1 if end_us is None else min(boundary - 1, -(-end_us // DAY_US) - 1)
+        totals = day_index.window_totals(first_day, last_day) if first_day <= last_day else {}
+        
+        # Raw rows from the boundary on; late rows older than it are in the rollups
+        if end_us is None or end_us > boundary * DAY_US:
+            for activity in self.get_by_goal_range(goal_id, epoch_day_to_datetime(boundary), end):
+                totals[activity.activity_type] = totals.get(activity.activity_type, 0) + activity.value
+        return totals
+    
+    def get_goal_aggregate(self, goal_id: int) -> GoalAggregate:
+        """Get the running aggregate for a goal (O(1), treat as read-only)"""
+        aggregate = self._goal_aggregates.get(goal_id)
+        if aggregate is None:
+            return GoalAggregate(goal_id=goal_id)
+        return aggregate
+    
+    def get_goal_sketches(self, goal_id: int) -> GoalSketches:
+        """The goal's sketches, maintained on insert and kept through compaction"""
+        return self._goal_sketches.get(goal_id) or GoalSketches()
+    
+    def get_goal_version(self, goal_id: int) -> int:
+        """Write counter for the goal"""
+        return self._goal_versions.get(goal_id, 0)
+    
+    def get_active_dates(self, goal_id: int) -> List[date]:
+        """Sorted distinct dates on which the goal has activity"""
+        day_index = self._day_indexes.get(goal_id)
+        if day_index is None:
+            return []
+        return [epoch_day_to_date(day) for day in sorted(day_index.buckets)]
+    
+    def get_day_totals(self, goal_id: int, first_day: int, last_day: int) -> Dict[str, float]:
+        """Total value per type over a day window, summed from day and week rollups"""
+        day_index = self._day_indexes.get(goal_id)
+        if day_index is None:
+            return {}
+        return day_index.window_totals(first_day, last_day)
+    
+    def get_streak_stats(self, goal_id: int) -> Tuple[int, int]:
+        """(distinct active days, longest streak), maintained on insert"""
+        day_index = self._day_indexes.get(goal_id)
+        if day_index is None:
+            return 0, 0
+        return day_index.distinct_days, day_index.longest_streak
+    
+    def get_goal_stats(self, goal_ids: Optional[Iterable[int]], first_day: int,
+                       last_day: int) -> Dict[int, GoalStats]:
+        """Stats for many goals straight from their aggregates and rollups"""
+        if goal_ids is None:
+            goal_ids = list(self._goal_index)
+        
+        stats = {}
+        for goal_id in goal_ids:
+            day_index = self._day_indexes.get(goal_id)
+            if day_index is None:
+                stats[goal_id] = GoalStats(GoalAggregate(goal_id=goal_id))
+                continue
+            stats[goal_id] = GoalStats(
+                self._goal_aggregates[goal_id],
+                day_index.distinct_days,
+                day_index.longest_streak,
+                day_index.window_totals(first_day, last_day)
+            )
+        return stats
+    
+    def goal_ids(self) -> List[Any]:
+        """Every goal with activity, in first-write order"""
+        return list(self._goal_index)
+    
     def get_all(self) -> List[Activity]:
         """Get all activities"""
         return list(self._storage.values())
@@ -50,5 +391,35 @@ class InMemoryActivityRepository(BaseRepository):
                 if activity.activity_type == activity_type]
 
 # Factory function for dependency injection
-def get_activity_repository():
-    return InMemoryActivityRepository()
\ No newline at end of file
+def get_activity_repository(settings: Optional[Mapping[str, Any]] = None) -> BaseRepository:
+    """Build the repository selected by ACTIVITY_REPOSITORY in the config"""
+    if settings is None:
+        settings = load_settings()
+
+    backend = settings.get('ACTIVITY_REPOSITORY', 'concurrent')
+
+    if backend == 'memory':
+        return InMemoryActivityRepository()
+    if backend == 'concurrent':
+        from app.repository.concurrent_repository import ConcurrentInMemoryActivityRepository
+        return ConcurrentInMemoryActivityRepository(settings.get('LOCK_STRIPES', 64))
+    if backend == 'durable':
+        from app.repository.durable_repository import DurableInMemoryActivityRepository
+        return DurableInMemoryActivityRepository(
+            settings.get('DATA_DIR', 'data'),
+            fsync_policy=settings.get('WAL_FSYNC_POLICY', 'interval'),
+            fsync_interval_ms=settings.get('WAL_FSYNC_INTERVAL_MS', 100),
+            snapshot_every=settings.get('SNAPSHOT_EVERY', 100000)
+        )
+    if backend == 'columnar':
+        from app.repository.columnar_repository import ColumnarActivityRepository
+        return ColumnarActivityRepository()
+    if backend == 'sqlite':
+        from app.repository.sqlite_repository import SQLiteActivityRepository
+        return SQLiteActivityRepository(settings.get('SQLITE_PATH', 'life_design.db'))
+
+    if backend == 'sharded':
+        from app.repository.sharded_repository import ShardedActivityRepository
+        return ShardedActivityRepository(settings.get('SHARD_COUNT') or None)
+    
+    raise ValueError(f"Unknown ACTIVITY_REPOSITORY backend: {backend}")
\ No newline at end of file
@@ -0,0 +1,143 @@
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.repository import BaseRepository
+from app.models.activity import Activity
+from app.models.goal_aggregate import GoalAggregate, GoalStats
+from app.models.sketches import GoalSketches
+
+class AsyncBaseRepository(ABC):
+    """Async counterpart of BaseRepository for the ASGI serving mode"""
+
+    @abstractmethod
+    async def add(self, activity_data: dict) -> Activity:
+        pass
+
+    @abstractmethod
+    async def add_many(self, activities_data: Iterable[dict]) -> List[Activity]:
+        pass
+
+    @abstractmethod
+    async def get_by_id(self, activity_id: int) -> Optional[Activity]:
+        pass
+
+    @abstractmethod
+    async def get_by_goal(self, goal_id: int) -> List[Activity]:
+        pass
+
+    @abstractmethod
+    async def get_goal_aggregate(self, goal_id: int) -> GoalAggregate:
+        pass
+
+    @abstractmethod
+    async def get_goal_version(self, goal_id: int) -> int:
+        pass
+
+    @abstractmethod
+    async def get_day_totals(self, goal_id: int, first_day: int, last_day: int) -> Dict[str, float]:
+        pass
+
+    @abstractmethod
+    async def get_streak_stats(self, goal_id: int) -> Tuple[int, int]:
+        pass
+
+    @abstractmethod
+    async def get_by_goal_range(self, goal_id: int, start: Optional[datetime] = None,
+                                end: Optional[datetime] = None,
+                                activity_type: Optional[str] = None) -> List[Activity]:
+        pass
+
+    @abstractmethod
+    async def get_goal_page(self, goal_id: int, limit: int, after: Optional[Tuple[int, int]] = None,
+                            start: Optional[datetime] = None, end: Optional[datetime] = None,
+                            activity_type: Optional[str] = None) -> List[Activity]:
+        pass
+
+    @abstractmethod
+    async def get_goal_stats(self, goal_ids: Optional[Iterable[int]], first_day: int,
+                             last_day: int) -> Dict[int, GoalStats]:
+        pass
+
+    @abstractmethod
+    async def get_goal_sketches(self, goal_id: int) -> GoalSketches:
+        pass
+
+    @abstractmethod
+    async def top_goals(self, metric: str, k: int, first_day: int,
+                        last_day: int) -> List[Tuple[Any, float]]:
+        pass
+
+class AsyncRepositoryAdapter(AsyncBaseRepository):
+    """Expose a synchronous repository through the async interface
+
+    Repositories that block on I/O (``blocking_io``) run on a thread pool so
+    the event loop keeps serving other requests while they wait. Pure
+    in-memory repositories are called inline: their calls are short, and
+    most of them are not safe to call from several threads at once.
+    """
+
+    def __init__(self, repository: BaseRepository, max_workers: int = 32):
+        self.repository = repository
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='repository') \
+            if repository.blocking_io else None
+
+    async def _call(self, method, *args, **kwargs):
+        if self._executor is None:
+            return method(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(method, *args, **kwargs))
+
+    async def add(self, activity_data: dict) -> Activity:
+        return await self._call(self.repository.add, activity_data)
+
+    async def add_many(self, activities_data: Iterable[dict]) -> List[Activity]:
+        return await self._call(self.repository.add_many, list(activities_data))
+
+    async def get_by_id(self, activity_id: int) -> Optional[Activity]:
+        return await self._call(self.repository.get_by_id, activity_id)
+
+    async def get_by_goal(self, goal_id: int) -> List[Activity]:
+        return await self._call(self.repository.get_by_goal, goal_id)
+
+    async def get_goal_aggregate(self, goal_id: int) -> GoalAggregate:
+        return await self._call(self.repository.get_goal_aggregate, goal_id)
+
+    async def get_goal_version(self, goal_id: int) -> int:
+        return await self._call(self.repository.get_goal_version, goal_id)
+
+    async def get_day_totals(self, goal_id: int, first_day: int, last_day: int) -> Dict[str, float]:
+        return await self._call(self.repository.get_day_totals, goal_id, first_day, last_day)
+
+    async def get_streak_stats(self, goal_id: int) -> Tuple[int, int]:
+        return await self._call(self.repository.get_streak_stats, goal_id)
+
+    async def get_by_goal_range(self, goal_id: int, start: Optional[datetime] = None,
+                                end: Optional[datetime] = None,
+                                activity_type: Optional[str] = None) -> List[Activity]:
+        return await self._call(self.repository.get_by_goal_range, goal_id, start, end, activity_type)
+
+    async def get_goal_page(self, goal_id: int, limit: int, after: Optional[Tuple[int, int]] = None,
+                            start: Optional[datetime] = None, end: Optional[datetime] = None,
+                            activity_type: Optional[str] = None) -> List[Activity]:
+        return await self._call(self.repository.get_goal_page, goal_id, limit,
+                                after=after, start=start, end=end, activity_type=activity_type)
+
+    async def get_goal_stats(self, goal_ids: Optional[Iterable[int]], first_day: int,
+                             last_day: int) -> Dict[int, GoalStats]:
+        return await self._call(self.repository.get_goal_stats, goal_ids, first_day, last_day)
+
+    async def get_goal_sketches(self, goal_id: int) -> GoalSketches:
+        return await self._call(self.repository.get_goal_sketches, goal_id)
+
+    async def top_goals(self, metric: str, k: int, first_day: int,
+                        last_day: int) -> List[Tuple[Any, float]]:
+        return await self._call(self.repository.top_goals, metric, k, first_day, last_day)
+
+    def close(self) -> None:
+        """Shut down the worker threads"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,277 @@
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; only this backend needs it
+    np = None
+
+from app.repository import BaseRepository
+from app.models.activity import Activity, DAY_US, to_epoch_us, parse_timestamp, epoch_day_to_date
+from app.models.goal_aggregate import GoalAggregate, GoalStats, TypeAggregate
+
+class ColumnarActivityRepository(BaseRepository):
+    """Column-oriented activity store backed by growable NumPy arrays
+
+    Each activity costs 28 bytes across the goal_id, type code, value and
+    timestamp columns; aggregates are computed with vectorized masks and
+    bincounts instead of Python loops over Activity objects.
+    """
+
+    _COLUMNS = ('_goal_ids', '_type_codes', '_values', '_timestamps')
+
+    def __init__(self, initial_capacity: int = 1024):
+        if np is None:
+            raise ImportError("ColumnarActivityRepository requires numpy (pip install numpy)")
+
+        self._size = 0
+        self._goal_ids = np.empty(initial_capacity, dtype=np.int64)
+        self._type_codes = np.empty(initial_capacity, dtype=np.int32)
+        self._values = np.empty(initial_capacity, dtype=np.float64)
+        self._timestamps = np.empty(initial_capacity, dtype=np.int64)
+
+        # Activity types are dictionary-encoded into small integer codes
+        self._type_names: List[str] = []
+        self._type_codes_by_name: Dict[str, int] = {}
+
+        # Notes are rare, so keep them sparse rather than as a column
+        self._notes: Dict[int, str] = {}
+        self._goal_versions: Dict[int, int] = {}
+
+    # ========== STORAGE ==========
+    def _ensure_capacity(self, extra: int) -> None:
+        """Grow every column geometrically to fit `extra` more rows"""
+        capacity = len(self._values)
+        required = self._size + extra
+        if required <= capacity:
+            return
+
+        new_capacity = max(capacity * 2, required)
+        for name in self._COLUMNS:
+            old = getattr(self, name)
+            new = np.empty(new_capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _type_code(self, activity_type: str) -> int:
+        """Get (or assign) the integer code for an activity type"""
+        code = self._type_codes_by_name.get(activity_type)
+        if code is None:
+            code = len(self._type_names)
+            self._type_names.append(activity_type)
+            self._type_codes_by_name[activity_type] = code
+        return code
+
+    def _row_to_activity(self, row: int) -> Activity:
+        """Materialize one row as an Activity"""
+        return Activity(
+            id=row + 1,
+            goal_id=int(self._goal_ids[row]),
+            activity_type=self._type_names[self._type_codes[row]],
+            value=float(self._values[row]),
+            timestamp=int(self._timestamps[row]),
+            notes=self._notes.get(row)
+        )
+
+    def add(self, activity_data: dict) -> Activity:
+        """Add a new activity"""
+        goal_id = int(activity_data['goal_id'])
+        activity_type = activity_data['activity_type']
+        value = float(activity_data['value'])
+
+        self._ensure_capacity(1)
+        row = self._size
+        self._goal_ids[row] = goal_id
+        self._type_codes[row] = self._type_code(activity_type)
+        self._values[row] = value
+        self._timestamps[row] = parse_timestamp(activity_data['timestamp'])
+        if activity_data.get('notes') is not None:
+            self._notes[row] = activity_data['notes']
+        self._size += 1
+        self._goal_versions[goal_id] = self._goal_versions.get(goal_id, 0) + 1
+
+        return self._row_to_activity(row)
+
+    def add_many(self, activities_data: Iterable[dict]) -> List[Activity]:
+        """Append a batch of activities with one slice assignment per column"""
+        activities_data = list(activities_data)
+        count = len(activities_data)
+        goal_ids = np.fromiter((int(d['goal_id']) for d in activities_data), dtype=np.int64, count=count)
+        type_codes = np.fromiter((self._type_code(d['activity_type']) for d in activities_data),
+                                 dtype=np.int32, count=count)
+        values = np.fromiter((float(d['value']) for d in activities_data), dtype=np.float64, count=count)
+        timestamps = np.fromiter((parse_timestamp(d['timestamp']) for d in activities_data),
+                                 dtype=np.int64, count=count)
+
+        self._ensure_capacity(count)
+        first = self._size
+        last = first + count
+        self._goal_ids[first:last] = goal_ids
+        self._type_codes[first:last] = type_codes
+        self._values[first:last] = values
+        self._timestamps[first:last] = timestamps
+        for offset, activity_data in enumerate(activities_data):
+            if activity_data.get('notes') is not None:
+                self._notes[first + offset] = activity_data['notes']
+        self._size = last
+        for goal_id in set(goal_ids.tolist()):
+            self._goal_versions[goal_id] = self._goal_versions.get(goal_id, 0) + 1
+
+        return [self._row_to_activity(row) for row in range(first, last)]
+
+    def get_by_id(self, activity_id: int) -> Optional[Activity]:
+        """Get activity by ID"""
+        if not 1 <= activity_id <= self._size:
+            return None
+        return self._row_to_activity(activity_id - 1)
+
+    def get_by_goal(self, goal_id: int) -> List[Activity]:
+        """Get all activities for a goal"""
+        return [self._row_to_activity(int(row)) for row in self.filter_rows(goal_id=goal_id)]
+
+    def get_all(self) -> List[Activity]:
+        """Get all activities"""
+        return [self._row_to_activity(row) for row in range(self._size)]
+
+    def get_by_type(self, activity_type: str) -> List[Activity]:
+        """Get activities by type"""
+        return [self._row_to_activity(int(row))
+                for row in self.filter_rows(activity_type=activity_type)]
+
+    # ========== VECTORIZED PRIMITIVES ==========
+    def filter_rows(self, goal_id: Optional[int] = None, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None,
+                    activity_type: Optional[str] = None) -> "np.ndarray":
+        """Row numbers matching every given filter, in insertion order"""
+        n = self._size
+        mask = np.ones(n, dtype=bool)
+
+        if goal_id is not None:
+            mask &= self._goal_ids[:n] == goal_id
+        if activity_type is not None:
+            code = self._type_codes_by_name.get(activity_type)
+            if code is None:
+                return np.empty(0, dtype=np.intp)
+            mask &= self._type_codes[:n] == code
+        if start is not None:
+            mask &= self._timestamps[:n] >= to_epoch_us(start)
+        if end is not None:
+            mask &= self._timestamps[:n] < to_epoch_us(end)
+
+        return np.flatnonzero(mask)
+
+    def group_by_type(self, rows: "np.ndarray") -> Dict[str, Tuple[int, float]]:
+        """(count, total value) per activity type for the given rows"""
+        codes = self._type_codes[rows]
+        type_count = len(self._type_names)
+        counts = np.bincount(codes, minlength=type_count)
+        totals = np.bincount(codes, weights=self._values[rows], minlength=type_count)
+
+        return {self._type_names[code]: (int(counts[code]), float(totals[code]))
+                for code in np.flatnonzero(counts)}
+
+    def group_by_goal(self, rows: Optional["np.ndarray"] = None) -> Dict[int, Tuple[int, float]]:
+        """(count, total value) per goal for the given rows (default: all)"""
+        if rows is None:
+            rows = np.arange(self._size)
+        goal_ids, inverse = np.unique(self._goal_ids[rows], return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(goal_ids))
+        totals = np.bincount(inverse, weights=self._values[rows], minlength=len(goal_ids))
+
+        return {int(goal_id): (int(counts[i]), float(totals[i]))
+                for i, goal_id in enumerate(goal_ids)}
+
+    # ========== AGGREGATES ==========
+    def get_goal_version(self, goal_id: int) -> int:
+        """Write counter for the goal"""
+        return self._goal_versions.get(goal_id, 0)
+
+    def get_goal_aggregate(self, goal_id: int) -> GoalAggregate:
+        """Aggregate a goal's activities with vectorized reductions"""
+        return self._aggregate_rows(goal_id, self.filter_rows(goal_id=goal_id))
+
+    def _aggregate_rows(self, goal_id: int, rows: "np.ndarray") -> GoalAggregate:
+        """GoalAggregate over the given rows of one goal"""
+        if not len(rows):
+            return GoalAggregate(goal_id=goal_id)
+
+        # argmax returns the first maximum, matching max() over insertion order
+        last_row = rows[np.argmax(self._timestamps[rows])]
+
+        return GoalAggregate(
+            goal_id=goal_id,
+            count=len(rows),
+            total_value=float(self._values[rows].sum()),
+            by_type={activity_type: TypeAggregate(count=count, total_value=total)
+                     for activity_type, (count, total) in self.group_by_type(rows).items()},
+            last_ts=int(self._timestamps[last_row])
+        )
+
+    def get_goal_stats(self, goal_ids: Optional[Iterable[int]], first_day: int,
+                       last_day: int) -> Dict[int, GoalStats]:
+        """Stats for many goals from one stable sort of their rows by goal"""
+        n = self._size
+        if goal_ids is None:
+            rows = np.arange(n)
+        else:
+            goal_ids = list(goal_ids)
+            rows = np.flatnonzero(np.isin(self._goal_ids[:n], np.asarray(goal_ids, dtype=np.int64)))
+        rows = rows[np.argsort(self._goal_ids[rows], kind='stable')]
+        goals, starts = np.unique(self._goal_ids[rows], return_index=True)
+        window_start, window_end = first_day * DAY_US, (last_day + 1) * DAY_US
+
+        stats = {goal_id: GoalStats(GoalAggregate(goal_id=goal_id)) for goal_id in (goal_ids or ())}
+        for goal_id, segment in zip(goals.tolist(), np.split(rows, starts[1:])):
+            timestamps = self._timestamps[segment]
+            days = np.unique(timestamps // DAY_US)
+            # Lengths of runs of consecutive days, split where the gap is not 1
+            run_edges = np.concatenate(([0], np.flatnonzero(np.diff(days) != 1) + 1, [len(days)]))
+            in_window = segment[(timestamps >= window_start) & (timestamps < window_end)]
+
+            stats[goal_id] = GoalStats(
+                self._aggregate_rows(goal_id, segment),
+                len(days),
+                int(np.diff(run_edges).max()),
+                {activity_type: total
+                 for activity_type, (_, total) in self.group_by_type(in_window).items()}
+            )
+        return stats
+
+    def sum_by_type(self, goal_id: int, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None) -> Dict[str, float]:
+        """Total value per activity type within [start, end)"""
+        rows = self.filter_rows(goal_id=goal_id, start=start, end=end)
+        return {activity_type: total
+                for activity_type, (_, total) in self.group_by_type(rows).items()}
+
+    def get_by_goal_range(self, goal_id: int, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None,
+                          activity_type: Optional[str] = None) -> List[Activity]:
+        """A goal's activities in [start, end) ordered by (timestamp, id)"""
+        rows = self.filter_rows(goal_id=goal_id, activity_type=activity_type, start=start, end=end)
+        # Rows are already in id order, so a stable sort on timestamp is enough
+        rows = rows[np.argsort(self._timestamps[rows], kind='stable')]
+        return [self._row_to_activity(int(row)) for row in rows]
+
+    def get_goal_page(self, goal_id: int, limit: int, after: Optional[Tuple[int, int]] = None,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      activity_type: Optional[str] = None) -> List[Activity]:
+        """Keyset page ordered by (timestamp, id) using a vectorized sort"""
+        rows = self.filter_rows(goal_id=goal_id, activity_type=activity_type, start=start, end=end)
+        timestamps = self._timestamps[rows]
+        if after is not None:
+            after_ts, after_id = after
+            ids = rows + 1
+            keep = (timestamps > after_ts) | ((timestamps == after_ts) & (ids > after_id))
+            rows = rows[keep]
+            timestamps = timestamps[keep]
+
+        # Rows are already in id order, so a stable sort on timestamp is enough
+        page = rows[np.argsort(timestamps, kind='stable')[:limit]]
+        return [self._row_to_activity(int(row)) for row in page]
+
+    def get_active_dates(self, goal_id: int) -> List[date]:
+        """Sorted distinct dates on which the goal has activity"""
+        rows = self.filter_rows(goal_id=goal_id)
+        days = np.unique(self._timestamps[rows] // DAY_US)
+        return [epoch_day_to_date(day) for day in days]
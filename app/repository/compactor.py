@@ -0,0 +1,59 @@
+import threading
+import time
+from typing import Any, Mapping, Optional
+
+from app.metrics import COMPACTED_ROWS
+from app.models.activity import today_epoch_day
+from app.repository import BaseRepository
+
+class RetentionCompactor:
+    """Background thread folding raw activities older than a retention window into rollups
+
+    With ``retention_days`` = N, raw rows from the last N days (today
+    included) are kept and older ones are dropped by repository.compact();
+    their counts and totals live on in the daily and weekly rollups.
+    """
+
+    def __init__(self, repository: BaseRepository, retention_days: int,
+                 interval_seconds: float = 3600):
+        if retention_days < 1:
+            raise ValueError("retention_days must be at least 1")
+        self.repository = repository
+        self.retention_days = retention_days
+        self.interval_seconds = interval_seconds
+        self.last_run: Optional[float] = None
+        self.rows_compacted = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='activity-compactor', daemon=True)
+
+    def start(self) -> "RetentionCompactor":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def run_once(self) -> int:
+        """Compact everything older than the retention window now"""
+        dropped = self.repository.compact(today_epoch_day() - self.retention_days + 1)
+        self.rows_compacted += dropped
+        self.last_run = time.time()
+        COMPACTED_ROWS.inc(amount=dropped)
+        return dropped
+
+    def _run(self) -> None:
+        while True:
+            self.run_once()
+            if self._stop.wait(self.interval_seconds):
+                return
+
+def start_compactor(repository: BaseRepository,
+                    settings: Mapping[str, Any]) -> Optional[RetentionCompactor]:
+    """Start a compactor when RAW_RETENTION_DAYS is set (0 keeps raw rows forever)"""
+    retention_days = settings.get('RAW_RETENTION_DAYS', 0)
+    if not retention_days:
+        return None
+    return RetentionCompactor(repository, retention_days,
+                              settings.get('COMPACTION_INTERVAL_S', 3600)).start()
@@ -0,0 +1,177 @@
+import itertools
+import threading
+from contextlib import ExitStack
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.repository.activity_repository import InMemoryActivityRepository, RankingKey, check_indexable
+from app.models.activity import Activity
+from app.models.goal_aggregate import GoalAggregate, GoalStats, RankIndex
+from app.models.sketches import GoalSketches
+
+class ConcurrentInMemoryActivityRepository(InMemoryActivityRepository):
+    """In-memory repository that is safe under multi-threaded servers
+
+    Ids come from an itertools.count, whose next() is atomic in CPython.
+    Every per-goal structure is guarded by one of ``stripes`` locks chosen
+    by goal_id, so writes to different goals proceed in parallel while
+    reads of a goal see a consistent snapshot of it. Leaderboard rankings
+    are shared by all goals and guarded by one more lock, always taken
+    after a goal's stripe.
+    """
+
+    thread_safe = True
+
+    def __init__(self, stripes: int = 64):
+        super().__init__()
+        self._ids = itertools.count(1)
+        self._stripes = [threading.RLock() for _ in range(stripes)]
+        self._rankings_lock = threading.RLock()
+        # One thread builds a missing ranking while other queries wait for it
+        self._ranking_build_lock = threading.Lock()
+
+    def _stripe(self, goal_id) -> threading.RLock:
+        """Lock guarding a goal's index, aggregates and day buckets"""
+        return self._stripes[hash(goal_id) % len(self._stripes)]
+
+    # ========== WRITES ==========
+    def add(self, activity_data: dict) -> Activity:
+        """Add a new activity"""
+        activity = Activity(id=next(self._ids), **activity_data)
+        with self._stripe(activity.goal_id):
+            self._insert_many([activity])
+        return activity
+
+    def add_many(self, activities_data: Iterable[dict]) -> List[Activity]:
+        """Add a batch, locking each goal's stripe once"""
+        activities = [Activity(id=next(self._ids), **activity_data)
+                      for activity_data in activities_data]
+        # Reject the batch before any goal's share of it is stored
+        check_indexable(activities)
+
+        by_goal: Dict[int, List[Activity]] = {}
+        for activity in activities:
+            by_goal.setdefault(activity.goal_id, []).append(activity)
+
+        for goal_id, goal_activities in by_goal.items():
+            with self._stripe(goal_id):
+                self._insert_many(goal_activities)
+        return activities
+
+    def _compact_goal(self, goal_id: int, before_us: int) -> int:
+        """Drop a goal's old raw rows under its stripe"""
+        with self._stripe(goal_id):
+            return super()._compact_goal(goal_id, before_us)
+
+    # ========== LEADERBOARDS ==========
+    def _ranking(self, key: RankingKey) -> RankIndex:
+        """The maintained ranking for a key, built by one thread at a time"""
+        with self._ranking_build_lock:
+            return super()._ranking(key)
+
+    def _lookup_ranking(self, key: RankingKey) -> Optional[RankIndex]:
+        with self._rankings_lock:
+            return super()._lookup_ranking(key)
+
+    def _register_ranking(self, key: RankingKey) -> RankIndex:
+        """Register before scoring, so writes racing the build rerank into it"""
+        with self._rankings_lock:
+            return super()._register_ranking(key)
+
+    def _rank_goal(self, ranking: RankIndex, key: RankingKey, goal_id: Any) -> None:
+        """Score a goal under its stripe and place it under the rankings lock"""
+        with self._stripe(goal_id), self._rankings_lock:
+            super()._rank_goal(ranking, key, goal_id)
+
+    def _rerank(self, goal_ids: Iterable[Any]) -> None:
+        """Move written goals (whose stripes the writer holds) in every ranking"""
+        with self._rankings_lock:
+            super()._rerank(goal_ids)
+
+    def _top(self, ranking: RankIndex, k: int) -> List[Tuple[Any, float]]:
+        with self._rankings_lock:
+            return ranking.top(k)
+
+    # ========== READS ==========
+    def get_by_goal(self, goal_id: int) -> List[Activity]:
+        """Get all activities for a goal"""
+        with self._stripe(goal_id):
+            return super().get_by_goal(goal_id)
+
+    def get_all(self) -> List[Activity]:
+        """Get all activities, holding every stripe for a global snapshot"""
+        with ExitStack() as stack:
+            for stripe in self._stripes:
+                stack.enter_context(stripe)
+            return super().get_all()
+
+    def get_by_type(self, activity_type: str) -> List[Activity]:
+        """Get activities by type"""
+        # list() copies the dict view in one step, so concurrent inserts
+        # cannot change it mid-iteration
+        return [activity for activity in list(self._storage.values())
+                if activity.activity_type == activity_type]
+
+    def sum_by_type(self, goal_id: int, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None) -> Dict[str, float]:
+        """Total value per type within [start, end)"""
+        with self._stripe(goal_id):
+            return super().sum_by_type(goal_id, start, end)
+
+    def get_goal_aggregate(self, goal_id: int) -> GoalAggregate:
+        """Snapshot of the goal's running aggregate"""
+        with self._stripe(goal_id):
+            return super().get_goal_aggregate(goal_id).copy()
+
+    def get_goal_sketches(self, goal_id: int) -> GoalSketches:
+        """Snapshot of the goal's sketches"""
+        with self._stripe(goal_id):
+            return super().get_goal_sketches(goal_id).copy()
+
+    def get_goal_version(self, goal_id: int) -> int:
+        """Write counter for the goal"""
+        with self._stripe(goal_id):
+            return super().get_goal_version(goal_id)
+
+    def get_active_dates(self, goal_id: int) -> List[date]:
+        """Sorted distinct dates on which the goal has activity"""
+        with self._stripe(goal_id):
+            return super().get_active_dates(goal_id)
+
+    def get_day_totals(self, goal_id: int, first_day: int, last_day: int) -> Dict[str, float]:
+        """Total value per type over a day window"""
+        with self._stripe(goal_id):
+            return super().get_day_totals(goal_id, first_day, last_day)
+
+    def get_streak_stats(self, goal_id: int) -> Tuple[int, int]:
+        """(distinct active days, longest streak)"""
+        with self._stripe(goal_id):
+            return super().get_streak_stats(goal_id)
+
+    def get_goal_stats(self, goal_ids: Optional[Iterable[int]], first_day: int,
+                       last_day: int) -> Dict[int, GoalStats]:
+        """Per-goal stats, each read under its goal's stripe"""
+        if goal_ids is None:
+            goal_ids = list(self._goal_index)
+
+        stats = {}
+        for goal_id in goal_ids:
+            with self._stripe(goal_id):
+                goal_stats = super().get_goal_stats([goal_id], first_day, last_day)[goal_id]
+                goal_stats.aggregate = goal_stats.aggregate.copy()
+            stats[goal_id] = goal_stats
+        return stats
+
+    def get_by_goal_range(self, goal_id: int, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None,
+                          activity_type: Optional[str] = None) -> List[Activity]:
+        """Activities in [start, end) from the goal's timeline"""
+        with self._stripe(goal_id):
+            return super().get_by_goal_range(goal_id, start, end, activity_type)
+
+    def get_goal_page(self, goal_id: int, limit: int, after: Optional[Tuple[int, int]] = None,
+                      start=None, end=None, activity_type: Optional[str] = None) -> List[Activity]:
+        """Keyset page over a snapshot of the goal's activities"""
+        with self._stripe(goal_id):
+            return super().get_goal_page(goal_id, limit, after=after, start=start, end=end,
+                                         activity_type=activity_type)
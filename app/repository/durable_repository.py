@@ -0,0 +1,333 @@
+import atexit
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from app.repository.activity_repository import InMemoryActivityRepository, check_indexable
+from app.models.activity import MAX_ACTIVITY_TYPE_BYTES, Activity
+
+FSYNC_POLICIES = ('always', 'interval', 'snapshot')
+
+# Every record is framed as (payload length, crc32) so a torn tail from a
+# crash can be detected and cut off during recovery.
+_FRAME = struct.Struct('<II')
+# id, goal_id, value, epoch microseconds, then byte lengths of activity_type, notes
+_RECORD = struct.Struct('<qqdqHI')
+_NO_NOTES = 0xFFFFFFFF
+
+_SNAPSHOT_MAGIC = b'LDSNAP01'
+# last activity id covered by the snapshot, record count
+_SNAPSHOT_HEADER = struct.Struct('<QQ')
+_RECOVERY_CHUNK = 10_000
+
+def encode_activity(activity: Activity) -> bytes:
+    """Encode one activity as a framed binary record"""
+    activity_type = activity.activity_type.encode('utf-8')
+    notes = activity.notes.encode('utf-8') if activity.notes is not None else b''
+    notes_length = len(notes) if activity.notes is not None else _NO_NOTES
+
+    payload = b''.join((
+        _RECORD.pack(activity.id, activity.goal_id, activity.value, activity.ts,
+                     len(activity_type), notes_length),
+        activity_type,
+        notes
+    ))
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+def decode_activities(buffer, offset: int = 0) -> Iterator[Tuple[Activity, int]]:
+    """Yield (activity, end offset) for each intact record in the buffer
+
+    Stops silently at the first truncated or corrupt record, which is what
+    a crash in the middle of an append leaves behind.
+    """
+    end = len(buffer)
+    while offset + _FRAME.size <= end:
+        length, checksum = _FRAME.unpack_from(buffer, offset)
+        start = offset + _FRAME.size
+        if start + length > end or length < _RECORD.size:
+            return
+        payload = buffer[start:start + length]
+        if zlib.crc32(payload) != checksum:
+            return
+
+        activity_id, goal_id, value, epoch_us, type_length, notes_length = \
+            _RECORD.unpack_from(payload)
+        position = _RECORD.size
+        activity_type = payload[position:position + type_length].decode('utf-8')
+        position += type_length
+        notes = None
+        if notes_length != _NO_NOTES:
+            notes = payload[position:position + notes_length].decode('utf-8')
+
+        offset = start + length
+        yield Activity(
+            id=activity_id,
+            goal_id=goal_id,
+            activity_type=activity_type,
+            value=value,
+            timestamp=epoch_us,
+            notes=notes
+        ), offset
+
+def _fsync_directory(path: str) -> None:
+    """Persist a rename by syncing the containing directory"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    descriptor = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+class WriteAheadLog:
+    """Append-only binary log with a configurable fsync policy
+
+    - ``always``: fsync after every append (safest, slowest)
+    - ``interval``: a background thread fsyncs every ``fsync_interval_ms``
+    - ``snapshot``: never fsync the log; durability comes from snapshots
+    """
+
+    def __init__(self, path: str, fsync_policy: str = 'interval', fsync_interval_ms: int = 100):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+
+        self.path = path
+        self.fsync_policy = fsync_policy
+        self._file = open(path, 'ab')
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._closed = threading.Event()
+
+        if fsync_policy == 'interval':
+            interval = fsync_interval_ms / 1000
+            thread = threading.Thread(target=self._sync_periodically, args=(interval,),
+                                      name='wal-fsync', daemon=True)
+            thread.start()
+
+    def append(self, records: Iterable[bytes]) -> None:
+        """Append encoded records and apply the fsync policy"""
+        with self._lock:
+            self._file.write(b''.join(records))
+            self._file.flush()
+            if self.fsync_policy == 'always':
+                os.fsync(self._file.fileno())
+            else:
+                self._dirty = True
+
+    def sync(self) -> None:
+        """Force buffered records to disk"""
+        with self._lock:
+            if self._dirty and not self._file.closed:
+                os.fsync(self._file.fileno())
+                self._dirty = False
+
+    def rotate(self, archive_path: str) -> None:
+        """Move the current log aside and start a fresh one"""
+        with self._lock:
+            self._file.close()
+            if os.path.exists(archive_path):
+                # An earlier snapshot never finished; keep its log as well
+                with open(self.path, 'rb') as source, open(archive_path, 'ab') as target:
+                    shutil.copyfileobj(source, target)
+                os.remove(self.path)
+            else:
+                os.replace(self.path, archive_path)
+            self._file = open(self.path, 'ab')
+            self._dirty = False
+
+    def close(self) -> None:
+        """Sync and close the log"""
+        self.sync()
+        self._closed.set()
+        with self._lock:
+            self._file.close()
+
+    def _sync_periodically(self, interval: float) -> None:
+        while not self._closed.wait(interval):
+            self.sync()
+
+class DurableInMemoryActivityRepository(InMemoryActivityRepository):
+    """In-memory repository made durable by a write-ahead log and snapshots
+
+    Every add() is appended to the WAL before it becomes visible. After
+    ``snapshot_every`` writes a compacted snapshot is written in the
+    background and the log it covers is discarded. On start-up the snapshot
+    is read through mmap and only the WAL tail is replayed.
+    """
+
+    def __init__(self, data_dir: str, fsync_policy: str = 'interval',
+                 fsync_interval_ms: int = 100, snapshot_every: int = 100_000):
+        super().__init__()
+        os.makedirs(data_dir, exist_ok=True)
+
+        self._data_dir = data_dir
+        self._snapshot_path = os.path.join(data_dir, 'activities.snapshot')
+        self._wal_path = os.path.join(data_dir, 'activities.wal')
+        self._archived_wal_path = self._wal_path + '.1'
+
+        self._lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_every = snapshot_every
+        self._writes_since_snapshot = 0
+
+        self.recovery_stats = self._recover()
+        self._wal = WriteAheadLog(self._wal_path, fsync_policy, fsync_interval_ms)
+        atexit.register(self.close)
+
+    # ========== RECOVERY ==========
+    def _recover(self) -> Dict[str, Any]:
+        """Load the snapshot, then replay any WAL records newer than it"""
+        started = time.perf_counter()
+        snapshot_records, last_snapshot_id = self._load_snapshot()
+
+        wal_records = 0
+        for path in (self._archived_wal_path, self._wal_path):
+            wal_records += self._replay_wal(path, last_snapshot_id)
+
+        return {
+            "snapshot_records": snapshot_records,
+            "wal_records": wal_records,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+
+    def _load_snapshot(self) -> Tuple[int, int]:
+        """Load activities from the snapshot file via mmap"""
+        if not os.path.exists(self._snapshot_path) or not os.path.getsize(self._snapshot_path):
+            return 0, 0
+
+        with open(self._snapshot_path, 'rb') as snapshot_file, \
+                mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            if view[:len(_SNAPSHOT_MAGIC)] != _SNAPSHOT_MAGIC:
+                raise ValueError(f"Not an activity snapshot: {self._snapshot_path}")
+            last_id, count = _SNAPSHOT_HEADER.unpack_from(view, len(_SNAPSHOT_MAGIC))
+
+            loaded = 0
+            chunk: List[Activity] = []
+            offset = len(_SNAPSHOT_MAGIC) + _SNAPSHOT_HEADER.size
+            for activity, offset in decode_activities(view, offset):
+                chunk.append(activity)
+                if len(chunk) >= _RECOVERY_CHUNK:
+                    self._insert_many(chunk)
+                    loaded += len(chunk)
+                    chunk = []
+            self._insert_many(chunk)
+            loaded += len(chunk)
+
+        if loaded != count:
+            raise ValueError(f"Snapshot is truncated: expected {count} records, found {loaded}")
+        self._next_id = max(self._next_id, last_id + 1)
+        return loaded, last_id
+
+    def _replay_wal(self, path: str, after_id: int) -> int:
+        """Replay a WAL file, cutting off any torn tail left by a crash"""
+        if not os.path.exists(path) or not os.path.getsize(path):
+            return 0
+
+        valid_end = 0
+        tail: List[Activity] = []
+        with open(path, 'rb') as wal_file, \
+                mmap.mmap(wal_file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            for activity, valid_end in decode_activities(view):
+                if activity.id > after_id:
+                    tail.append(activity)
+            size = len(view)
+        self._insert_many(tail)
+
+        if valid_end < size:
+            os.truncate(path, valid_end)
+        return len(tail)
+
+    # ========== WRITES ==========
+    def add(self, activity_data: dict) -> Activity:
+        """Log the activity to the WAL, then add it in memory"""
+        return self.add_many([activity_data])[0]
+
+    def add_many(self, activities_data: Iterable[dict]) -> List[Activity]:
+        """Log a batch to the WAL in one write, then add it in memory"""
+        activities_data = [dict(activity_data, goal_id=int(activity_data['goal_id']))
+                           for activity_data in activities_data]
+
+        with self._lock:
+            activities = [Activity(id=self._next_id + offset, **activity_data)
+                          for offset, activity_data in enumerate(activities_data)]
+            # A record the indexes or the log format would reject must not reach the log
+            check_indexable(activities)
+            for activity in activities:
+                if len(activity.activity_type.encode('utf-8')) > MAX_ACTIVITY_TYPE_BYTES:
+                    raise ValueError(f"activity_type of activity {activity.id} is longer than "
+                                     f"{MAX_ACTIVITY_TYPE_BYTES} bytes")
+            self._wal.append(encode_activity(activity) for activity in activities)
+            self._insert_many(activities)
+            self._writes_since_snapshot += len(activities)
+            snapshot_due = self._snapshot_every and self._writes_since_snapshot >= self._snapshot_every
+
+        if snapshot_due:
+            self._snapshot_in_background()
+        return activities
+
+    def bulk_load(self, chunks: Iterable[List[dict]]) -> int:
+        """Load an offline import in memory, then persist it with one snapshot
+
+        Skips the WAL: the snapshot written at the end covers every row, and
+        an import that dies part-way leaves the previous state on disk.
+        """
+        loaded = 0
+        for chunk in chunks:
+            with self._lock:
+                activities = [Activity(id=self._next_id + offset,
+                                       **dict(activity_data, goal_id=int(activity_data['goal_id'])))
+                              for offset, activity_data in enumerate(chunk)]
+                self._insert_many(activities)
+            loaded += len(activities)
+        if loaded:
+            self.snapshot()
+        return loaded
+
+    def top_goals(self, metric: str, k: int, first_day: int,
+                  last_day: int) -> List[Tuple[Any, float]]:
+        """Leaders on a metric; rankings are built and moved under the write lock"""
+        with self._lock:
+            return super().top_goals(metric, k, first_day, last_day)
+
+    def compact(self, before_day: int) -> int:
+        """Keep every raw row: snapshots are rebuilt from them, not from rollups"""
+        return 0
+
+    # ========== SNAPSHOTS ==========
+    def _snapshot_in_background(self) -> None:
+        if self._snapshot_lock.locked():
+            return
+        threading.Thread(target=self.snapshot, name='activity-snapshot', daemon=True).start()
+
+    def snapshot(self) -> int:
+        """Write a compacted snapshot and drop the WAL it supersedes"""
+        with self._snapshot_lock:
+            # Only the copy and the log rotation block writers
+            with self._lock:
+                activities: List[Activity] = list(self._storage.values())
+                last_id = self._next_id - 1
+                self._wal.rotate(self._archived_wal_path)
+                self._writes_since_snapshot = 0
+
+            temporary_path = self._snapshot_path + '.tmp'
+            with open(temporary_path, 'wb') as snapshot_file:
+                snapshot_file.write(_SNAPSHOT_MAGIC)
+                snapshot_file.write(_SNAPSHOT_HEADER.pack(last_id, len(activities)))
+                for activity in activities:
+                    snapshot_file.write(encode_activity(activity))
+                snapshot_file.flush()
+                os.fsync(snapshot_file.fileno())
+
+            os.replace(temporary_path, self._snapshot_path)
+            _fsync_directory(self._data_dir)
+            os.remove(self._archived_wal_path)
+            return len(activities)
+
+    def close(self) -> None:
+        """Flush the WAL to disk and close it"""
+        self._wal.close()
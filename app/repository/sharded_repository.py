@@ -0,0 +1,405 @@
+import atexit
+import bisect
+import hashlib
+import heapq
+import itertools
+import multiprocessing
+import os
+import threading
+from contextlib import ExitStack
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.repository import BaseRepository
+from app.repository.activity_repository import InMemoryActivityRepository
+from app.models.activity import Activity
+from app.models.goal_aggregate import GoalAggregate, GoalStats
+from app.models.sketches import GoalSketches
+
+def _hash(key: str) -> int:
+    """Stable 64-bit hash (the built-in hash() is salted per process)"""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class ConsistentHashRing:
+    """Maps goal ids onto shard numbers
+
+    Each shard owns ``replicas`` points on a 64-bit ring and a goal belongs
+    to the first point clockwise from its hash. Adding a shard only takes
+    over the arcs just before its own points, so roughly 1/N of the goals
+    move and the rest keep their owner.
+    """
+
+    def __init__(self, nodes: Iterable[int] = (), replicas: int = 128):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: List[int] = []
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[int]:
+        return sorted(set(self._owners))
+
+    def add(self, node: int) -> None:
+        """Place a node's points on the ring"""
+        for replica in range(self.replicas):
+            point = _hash(f"shard-{node}#{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def copy(self) -> "ConsistentHashRing":
+        ring = ConsistentHashRing(replicas=self.replicas)
+        ring._points = list(self._points)
+        ring._owners = list(self._owners)
+        return ring
+
+    def node_for(self, goal_id) -> int:
+        """Shard that owns a goal"""
+        return self._owners[bisect.bisect(self._points, _hash(str(goal_id))) % len(self._points)]
+
+class _ShardStore(InMemoryActivityRepository):
+    """The in-memory repository a shard process serves, plus the shard protocol"""
+
+    def insert(self, records: List[Tuple[int, dict]]) -> List[Activity]:
+        """Store activities whose ids were allocated by the router"""
+        activities = [Activity(id=activity_id, **activity_data)
+                      for activity_id, activity_data in records]
+        self._insert_many(activities)
+        return activities
+
+    def export_goals(self, goal_ids: Iterable[Any]) -> Dict[Any, tuple]:
+        """Remove goals from this shard, returning their raw rows, versions, rollups and sketches"""
+        return {goal_id: self._remove_goal(goal_id) for goal_id in goal_ids}
+
+    def import_goals(self, goals: Dict[Any, tuple]) -> None:
+        """Adopt goals exported by another shard"""
+        for goal_id, (activities, version, aggregate, day_index, sketches) in goals.items():
+            # Rollups and sketches travel with the goal, so compacted history survives the move
+            self._restore_goal(goal_id, activities, aggregate, day_index, sketches)
+            # Keep versions moving forward so cached responses stay valid
+            self._goal_versions[goal_id] = version + 1
+
+def _serve_shard(connection) -> None:
+    """Shard process main loop: (method, args, kwargs) in, (ok, result) out"""
+    store = _ShardStore()
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            return
+        if request is None:
+            connection.close()
+            return
+
+        method, args, kwargs = request
+        try:
+            result = getattr(store, method)(*args, **kwargs)
+        except Exception as e:
+            connection.send((False, e))
+        else:
+            connection.send((True, result))
+
+class _Shard:
+    """Router-side handle on one shard process"""
+
+    def __init__(self, context):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_serve_shard, args=(child_connection,),
+                                       name='activity-shard', daemon=True)
+        self.process.start()
+        child_connection.close()
+        # One request in flight per pipe
+        self.lock = threading.Lock()
+
+    def send(self, method: str, *args, **kwargs) -> None:
+        self.connection.send((method, args, kwargs))
+
+    def receive(self) -> Any:
+        ok, result = self.connection.recv()
+        if not ok:
+            raise result
+        return result
+
+    def call(self, method: str, *args, **kwargs) -> Any:
+        self.send(method, *args, **kwargs)
+        return self.receive()
+
+    def close(self) -> None:
+        try:
+            self.connection.send(None)
+        except (OSError, EOFError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+
+class ShardedActivityRepository(BaseRepository):
+    """Router over goal-sharded in-memory repositories in worker processes
+
+    Every goal lives on exactly one shard, chosen by consistent hashing, so
+    per-goal reads and aggregates are answered entirely by its owner. Ids
+    are allocated here, batches are split by shard and sent to all of them
+    before any reply is awaited, and waiting on a pipe releases the GIL, so
+    ingest and analytics run on as many cores as there are shards.
+
+    Shards are started with fork where available: create the repository
+    before starting server threads.
+    """
+
+    # Every call waits on another process
+    blocking_io = True
+    # Each shard serves one request at a time and the router's state is locked
+    thread_safe = True
+
+    def __init__(self, shards: Optional[int] = None, replicas: int = 128):
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        self._context = multiprocessing.get_context(method)
+        self._ids = itertools.count(1)
+        self._shards: List[_Shard] = []
+        self._rebalance_lock = threading.Lock()
+        self._compacted_before_day: Optional[int] = None
+
+        shards = shards or os.cpu_count() or 1
+        for _ in range(shards):
+            self._shards.append(_Shard(self._context))
+        self._ring = ConsistentHashRing(range(shards), replicas)
+        atexit.register(self.close)
+
+    @property
+    def shard_count(self) -> int:
+        return len(self._shards)
+
+    # ========== ROUTING ==========
+    def _call_owner(self, goal_id, method: str, *args, **kwargs) -> Any:
+        """Run a method on the shard that owns a goal"""
+        while True:
+            ring = self._ring
+            shard = self._shards[ring.node_for(goal_id)]
+            with shard.lock:
+                # A rebalance may have moved the goal while we waited
+                if ring is self._ring:
+                    return shard.call(method, *args, **kwargs)
+
+    def _fan_out(self, requests: Dict[int, Tuple[str, tuple]]) -> Dict[int, Any]:
+        """Send one request to each listed shard, then collect every reply
+
+        Callers hold the shards' locks. All replies are read even when one
+        fails, so no pipe is left with an unread message.
+        """
+        sent = []
+        results: Dict[int, Any] = {}
+        error = None
+        try:
+            for node, (method, args) in requests.items():
+                self._shards[node].send(method, *args)
+                sent.append(node)
+        finally:
+            for node in sent:
+                try:
+                    results[node] = self._shards[node].receive()
+                except Exception as e:
+                    error = error or e
+        if error is not None:
+            raise error
+        return results
+
+    def _call_owners(self, goal_ids: Iterable[Any], method: str, *args) -> Dict[int, Any]:
+        """Run method(goal_ids owned by the shard, *args) on every shard owning one of the goals"""
+        goal_ids = list(goal_ids)
+        while True:
+            ring = self._ring
+            groups: Dict[int, List[Any]] = {}
+            for goal_id in goal_ids:
+                groups.setdefault(ring.node_for(goal_id), []).append(goal_id)
+
+            with ExitStack() as stack:
+                for node in sorted(groups):
+                    stack.enter_context(self._shards[node].lock)
+                if ring is self._ring:
+                    return self._fan_out({node: (method, (group,) + args) for node, group in groups.items()})
+
+    def _broadcast(self, method: str, *args) -> List[Any]:
+        """Run a method on every shard in parallel"""
+        while True:
+            shards = list(self._shards)
+            with ExitStack() as stack:
+                for shard in shards:
+                    stack.enter_context(shard.lock)
+                # add_shard appends while holding every existing lock: retry
+                # with the new shard so goals it just took over are included
+                if len(shards) == len(self._shards):
+                    results = self._fan_out({node: (method, args) for node in range(len(shards))})
+                    return [results[node] for node in sorted(results)]
+
+    # ========== WRITES ==========
+    def add(self, activity_data: dict) -> Activity:
+        """Add a new activity on its goal's shard"""
+        return self._call_owner(activity_data['goal_id'], 'insert',
+                                [(next(self._ids), activity_data)])[0]
+
+    def add_many(self, activities_data: Iterable[dict]) -> List[Activity]:
+        """Split a batch by shard and insert on all shards concurrently"""
+        records = [(next(self._ids), activity_data) for activity_data in activities_data]
+        if not records:
+            return []
+
+        while True:
+            ring = self._ring
+            groups: Dict[int, List[Tuple[int, dict]]] = {}
+            for record in records:
+                groups.setdefault(ring.node_for(record[1]['goal_id']), []).append(record)
+
+            with ExitStack() as stack:
+                for node in sorted(groups):
+                    stack.enter_context(self._shards[node].lock)
+                if ring is not self._ring:
+                    continue
+                results = self._fan_out({node: ('insert', (group,)) for node, group in groups.items()})
+
+            activities = [activity for group in results.values() for activity in group]
+            activities.sort(key=lambda activity: activity.id)
+            return activities
+
+    # ========== REBALANCING ==========
+    def add_shard(self) -> int:
+        """Start another shard and move over the goals it now owns
+
+        Only goals whose owner changes are copied, and only their shards
+        are paused while that happens. Returns the number of goals moved.
+        """
+        with self._rebalance_lock:
+            shard = _Shard(self._context)
+            node = len(self._shards)
+            ring = self._ring.copy()
+            ring.add(node)
+
+            moved = 0
+            with ExitStack() as stack:
+                for existing in self._shards:
+                    stack.enter_context(existing.lock)
+                # Not routable until the new ring is published below
+                self._shards.append(shard)
+
+                goal_ids = self._fan_out({index: ('goal_ids', ()) for index in range(node)})
+                exports = {}
+                for index, ids in goal_ids.items():
+                    moving = [goal_id for goal_id in ids if ring.node_for(goal_id) == node]
+                    if moving:
+                        exports[index] = ('export_goals', (moving,))
+
+                for goals in self._fan_out(exports).values():
+                    shard.call('import_goals', goals)
+                    moved += len(goals)
+                if self._compacted_before_day is not None:
+                    # Adopted goals may have compacted history; move the boundary too
+                    shard.call('compact', self._compacted_before_day)
+                self._ring = ring
+            return moved
+
+    # ========== READS ==========
+    def get_by_id(self, activity_id: int) -> Optional[Activity]:
+        """Get activity by ID (ids are not goal-keyed, so every shard is asked)"""
+        for activity in self._broadcast('get_by_id', activity_id):
+            if activity is not None:
+                return activity
+        return None
+
+    def get_all(self) -> List[Activity]:
+        """Get all activities, in id order"""
+        activities = [activity for shard_activities in self._broadcast('get_all')
+                      for activity in shard_activities]
+        activities.sort(key=lambda activity: activity.id)
+        return activities
+
+    def goal_ids(self) -> List[Any]:
+        """Every goal with activity, shard by shard"""
+        return [goal_id for shard_goal_ids in self._broadcast('goal_ids') for goal_id in shard_goal_ids]
+
+    def get_by_type(self, activity_type: str) -> List[Activity]:
+        """Get activities by type"""
+        activities = [activity for shard_activities in self._broadcast('get_by_type', activity_type)
+                      for activity in shard_activities]
+        activities.sort(key=lambda activity: activity.id)
+        return activities
+
+    def get_by_goal(self, goal_id: int) -> List[Activity]:
+        """Get all activities for a goal"""
+        return self._call_owner(goal_id, 'get_by_goal', goal_id)
+
+    def get_goal_aggregate(self, goal_id: int) -> GoalAggregate:
+        """Running aggregate for a goal, from its shard"""
+        return self._call_owner(goal_id, 'get_goal_aggregate', goal_id)
+
+    def get_goal_version(self, goal_id: int) -> int:
+        """Write counter for the goal"""
+        return self._call_owner(goal_id, 'get_goal_version', goal_id)
+
+    def get_goal_sketches(self, goal_id: int) -> GoalSketches:
+        """The goal's sketches from the shard that owns it"""
+        return self._call_owner(goal_id, 'get_goal_sketches', goal_id)
+
+    def sum_by_type(self, goal_id: int, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None) -> Dict[str, float]:
+        """Total value per activity type within [start, end)"""
+        return self._call_owner(goal_id, 'sum_by_type', goal_id, start, end)
+
+    def get_by_goal_range(self, goal_id: int, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None,
+                          activity_type: Optional[str] = None) -> List[Activity]:
+        """A goal's activities in [start, end), from its shard's timeline"""
+        return self._call_owner(goal_id, 'get_by_goal_range', goal_id, start, end, activity_type)
+
+    def get_goal_page(self, goal_id: int, limit: int, after: Optional[Tuple[int, int]] = None,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      activity_type: Optional[str] = None) -> List[Activity]:
+        """Keyset page of a goal's activities"""
+        return self._call_owner(goal_id, 'get_goal_page', goal_id, limit,
+                                after=after, start=start, end=end, activity_type=activity_type)
+
+    def get_active_dates(self, goal_id: int) -> List[date]:
+        """Sorted distinct dates on which the goal has activity"""
+        return self._call_owner(goal_id, 'get_active_dates', goal_id)
+
+    def get_day_totals(self, goal_id: int, first_day: int, last_day: int) -> Dict[str, float]:
+        """Total value per type over a day window"""
+        return self._call_owner(goal_id, 'get_day_totals', goal_id, first_day, last_day)
+
+    def get_streak_stats(self, goal_id: int) -> Tuple[int, int]:
+        """(distinct active days, longest streak)"""
+        return self._call_owner(goal_id, 'get_streak_stats', goal_id)
+
+    def get_goal_stats(self, goal_ids: Optional[Iterable[int]], first_day: int,
+                       last_day: int) -> Dict[int, GoalStats]:
+        """Stats for many goals, each shard computing its own goals in parallel"""
+        if goal_ids is None:
+            results = self._broadcast('get_goal_stats', None, first_day, last_day)
+        else:
+            results = self._call_owners(goal_ids, 'get_goal_stats', first_day, last_day).values()
+
+        stats: Dict[int, GoalStats] = {}
+        for shard_stats in results:
+            stats.update(shard_stats)
+        return stats
+
+    def top_goals(self, metric: str, k: int, first_day: int,
+                  last_day: int) -> List[Tuple[Any, float]]:
+        """Merge every shard's own top k, each read off the shard's rankings"""
+        results = self._broadcast('top_goals', metric, k, first_day, last_day)
+        return heapq.nlargest(k, (leader for shard_leaders in results for leader in shard_leaders),
+                              key=lambda leader: leader[1])
+
+    def compact(self, before_day: int) -> int:
+        """Compact every shard in parallel"""
+        with self._rebalance_lock:
+            if self._compacted_before_day is None or before_day > self._compacted_before_day:
+                self._compacted_before_day = before_day
+            return sum(self._broadcast('compact', before_day))
+
+    def close(self) -> None:
+        """Stop the shard processes"""
+        shards, self._shards = self._shards, []
+        for shard in shards:
+            with shard.lock:
+                shard.close()
@@ -0,0 +1,394 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.repository import BaseRepository
+from app.models.activity import Activity, DAY_US, to_epoch_us, epoch_day_to_date, parse_timestamp
+from app.models.goal_aggregate import GoalAggregate, GoalStats, TypeAggregate, longest_run
+
+# `ts` is the wall-clock epoch in microseconds; ISO strings are only
+# rebuilt when an Activity is serialized.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS activities (
+    id INTEGER PRIMARY KEY,
+    goal_id INTEGER NOT NULL,
+    activity_type TEXT NOT NULL,
+    value REAL NOT NULL,
+    ts INTEGER NOT NULL,
+    notes TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_activities_goal_ts
+    ON activities (goal_id, ts, activity_type, value);
+CREATE INDEX IF NOT EXISTS idx_activities_goal_type
+    ON activities (goal_id, activity_type, value, ts);
+CREATE TABLE IF NOT EXISTS goal_versions (
+    goal_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+# Bulk loads insert into the bare table and re-run _SCHEMA to rebuild these
+# with one sort each, instead of updating both b-trees row by row
+_DROP_INDEXES = """
+DROP INDEX IF EXISTS idx_activities_goal_ts;
+DROP INDEX IF EXISTS idx_activities_goal_type;
+"""
+
+# Statements are kept as constants so sqlite3's statement cache reuses
+# the prepared form on every call.
+_INSERT = """
+INSERT INTO activities (id, goal_id, activity_type, value, ts, notes)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+_SELECT_COLUMNS = "SELECT id, goal_id, activity_type, value, ts, notes FROM activities"
+_SELECT_BY_ID = _SELECT_COLUMNS + " WHERE id = ?"
+_SELECT_BY_GOAL = _SELECT_COLUMNS + " WHERE goal_id = ? ORDER BY id"
+_SELECT_BY_TYPE = _SELECT_COLUMNS + " WHERE activity_type = ? ORDER BY id"
+_SELECT_ALL = _SELECT_COLUMNS + " ORDER BY id"
+_MAX_ID = "SELECT COALESCE(MAX(id), 0) FROM activities"
+# Bumped once per written goal in the inserting transaction, so a cached
+# read checks its version with one primary-key lookup
+_BUMP_VERSION = """
+INSERT INTO goal_versions (goal_id, version) VALUES (?, 1)
+ON CONFLICT (goal_id) DO UPDATE SET version = version + 1
+"""
+_GOAL_VERSION = "SELECT version FROM goal_versions WHERE goal_id = ?"
+# Databases created before goal_versions existed start from their row counts
+_SEED_VERSIONS = """
+INSERT OR IGNORE INTO goal_versions (goal_id, version)
+SELECT goal_id, COUNT(*) FROM activities GROUP BY goal_id
+"""
+_HAS_VERSIONS = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'goal_versions'"
+_TYPE_TOTALS = """
+SELECT activity_type, COUNT(*), SUM(value) FROM activities
+WHERE goal_id = ? AND ts >= ? AND ts < ?
+GROUP BY activity_type
+"""
+_LAST_TIMESTAMP = """
+SELECT ts FROM activities WHERE goal_id = ?
+ORDER BY ts DESC, id ASC LIMIT 1
+"""
+# activity_type is the third column of idx_activities_goal_ts, so the
+# optional type filter is checked from the index without reading rows
+_GOAL_RANGE = _SELECT_COLUMNS + """
+WHERE goal_id = ? AND ts >= ? AND ts < ? AND (? IS NULL OR activity_type = ?)
+ORDER BY ts, id
+"""
+_GOAL_PAGE = _SELECT_COLUMNS + """
+WHERE goal_id = ? AND ts >= ? AND ts < ? AND (? IS NULL OR activity_type = ?)
+  AND (ts > ? OR (ts = ? AND id > ?))
+ORDER BY ts, id LIMIT ?
+"""
+_GOAL_IDS = "SELECT DISTINCT goal_id FROM activities ORDER BY goal_id"
+# Epoch day of ts: integer / and % truncate toward zero in SQLite, so the
+# remainder is made non-negative first to round pre-1970 times down
+_EPOCH_DAY = f"(ts - ((ts % {DAY_US}) + {DAY_US}) % {DAY_US}) / {DAY_US}"
+_ACTIVE_DAYS = f"SELECT DISTINCT {_EPOCH_DAY} FROM activities WHERE goal_id = ? ORDER BY 1"
+
+# Grouped over many goals at once; {goals} is empty (every goal) or a filter
+# on a JSON array of goal ids
+_GOALS_FILTER = "goal_id IN (SELECT value FROM json_each(?))"
+_GOALS_TYPE_TOTALS = """
+SELECT goal_id, activity_type, COUNT(*), SUM(value), MAX(ts) FROM activities
+{where} GROUP BY goal_id, activity_type
+"""
+_GOALS_ACTIVE_DAYS = f"SELECT DISTINCT goal_id, {_EPOCH_DAY} FROM activities {{where}} ORDER BY 1, 2"
+_GOALS_WINDOW_TOTALS = """
+SELECT goal_id, activity_type, SUM(value) FROM activities
+WHERE ts >= ? AND ts < ? {also} GROUP BY goal_id, activity_type
+"""
+
+_MIN_TS = -(2 ** 63)
+_MAX_TS = 2 ** 63 - 1
+
+class SQLiteActivityRepository(BaseRepository):
+    """Durable activity repository on SQLite, with aggregates pushed into SQL"""
+
+    blocking_io = True
+    thread_safe = True
+
+    def __init__(self, path: str = 'life_design.db'):
+        self._path = path
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        # Every process opens its own connections to the same file
+        self.process_safe = path != ':memory:'
+
+        # An in-memory database only exists on the connection that created it
+        self._shared = self._connect() if path == ':memory:' else None
+
+        with self._write_lock:
+            connection = self._connection()
+            seed_versions = connection.execute(_HAS_VERSIONS).fetchone() is None
+            connection.executescript(_SCHEMA)
+            if seed_versions:
+                connection.execute(_SEED_VERSIONS)
+
+    # ========== CONNECTIONS ==========
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection configured for WAL and fast reads"""
+        connection = sqlite3.connect(
+            self._path,
+            isolation_level=None,
+            check_same_thread=self._path != ':memory:',
+            cached_statements=256
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA temp_store=MEMORY")
+        return connection
+
+    def after_fork(self) -> None:
+        """Forget the parent's connections: a SQLite handle must not cross a fork"""
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread, so WAL readers never block each other"""
+        if self._shared is not None:
+            return self._shared
+
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    @contextmanager
+    def _reading(self):
+        """Yield a connection that is safe to read from on this thread"""
+        if self._shared is None:
+            yield self._connection()
+        else:
+            with self._write_lock:
+                yield self._shared
+
+    @staticmethod
+    def _row_to_activity(row) -> Activity:
+        """Convert a result row into an Activity"""
+        return Activity(
+            id=row[0],
+            goal_id=row[1],
+            activity_type=row[2],
+            value=row[3],
+            timestamp=row[4],
+            notes=row[5]
+        )
+
+    # ========== WRITES ==========
+    def add(self, activity_data: dict) -> Activity:
+        """Add a new activity"""
+        return self.add_many([activity_data])[0]
+
+    def add_many(self, activities_data: Iterable[dict]) -> List[Activity]:
+        """Insert many activities in a single transaction"""
+        with self._write_lock:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                next_id = connection.execute(_MAX_ID).fetchone()[0] + 1
+                activities = []
+                rows = []
+                for activity_data in activities_data:
+                    activity = Activity(id=next_id, **activity_data)
+                    activities.append(activity)
+                    rows.append((
+                        activity.id,
+                        activity.goal_id,
+                        activity.activity_type,
+                        activity.value,
+                        activity.ts,
+                        activity.notes
+                    ))
+                    next_id += 1
+
+                connection.executemany(_INSERT, rows)
+                connection.executemany(_BUMP_VERSION, ((goal_id,) for goal_id in
+                                                       {activity.goal_id for activity in activities}))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+        return activities
+
+    def bulk_load(self, chunks: Iterable[List[dict]]) -> int:
+        """Load an offline import, one transaction per chunk, indexing once at the end
+
+        The goal indexes are dropped for the duration, so run it while the
+        service is stopped; they are rebuilt even if the import fails.
+        """
+        loaded = 0
+        with self._write_lock:
+            connection = self._connection()
+            connection.executescript(_DROP_INDEXES)
+            try:
+                next_id = connection.execute(_MAX_ID).fetchone()[0] + 1
+                for chunk in chunks:
+                    connection.execute("BEGIN IMMEDIATE")
+                    try:
+                        connection.executemany(_INSERT, (
+                            (next_id + offset, activity_data['goal_id'], activity_data['activity_type'],
+                             activity_data['value'], parse_timestamp(activity_data['timestamp']),
+                             activity_data.get('notes'))
+                            for offset, activity_data in enumerate(chunk)))
+                        connection.executemany(_BUMP_VERSION, ((goal_id,) for goal_id in
+                                                               {activity_data['goal_id'] for activity_data in chunk}))
+                        connection.execute("COMMIT")
+                    except BaseException:
+                        connection.execute("ROLLBACK")
+                        raise
+                    next_id += len(chunk)
+                    loaded += len(chunk)
+            finally:
+                connection.executescript(_SCHEMA)
+        return loaded
+
+    # ========== READS ==========
+    def get_by_id(self, activity_id: int) -> Optional[Activity]:
+        """Get activity by ID"""
+        with self._reading() as connection:
+            row = connection.execute(_SELECT_BY_ID, (activity_id,)).fetchone()
+        return self._row_to_activity(row) if row else None
+
+    def get_by_goal(self, goal_id: int) -> List[Activity]:
+        """Get all activities for a goal"""
+        with self._reading() as connection:
+            rows = connection.execute(_SELECT_BY_GOAL, (goal_id,)).fetchall()
+        return [self._row_to_activity(row) for row in rows]
+
+    def get_all(self) -> List[Activity]:
+        """Get all activities"""
+        with self._reading() as connection:
+            rows = connection.execute(_SELECT_ALL).fetchall()
+        return [self._row_to_activity(row) for row in rows]
+
+    def goal_ids(self) -> List[Any]:
+        """Every goal with activity, in goal_id order"""
+        with self._reading() as connection:
+            return [row[0] for row in connection.execute(_GOAL_IDS)]
+
+    def get_by_type(self, activity_type: str) -> List[Activity]:
+        """Get activities by type"""
+        with self._reading() as connection:
+            rows = connection.execute(_SELECT_BY_TYPE, (activity_type,)).fetchall()
+        return [self._row_to_activity(row) for row in rows]
+
+    # ========== AGGREGATES ==========
+    def get_goal_aggregate(self, goal_id: int) -> GoalAggregate:
+        """Aggregate a goal's activities inside SQLite"""
+        with self._reading() as connection:
+            rows = connection.execute(_TYPE_TOTALS, (goal_id, _MIN_TS, _MAX_TS)).fetchall()
+            last = connection.execute(_LAST_TIMESTAMP, (goal_id,)).fetchone()
+
+        aggregate = GoalAggregate(goal_id=goal_id)
+        for activity_type, count, total in rows:
+            aggregate.by_type[activity_type] = TypeAggregate(count=count, total_value=total)
+            aggregate.count += count
+            aggregate.total_value += total
+        aggregate.last_ts = last[0] if last else None
+        return aggregate
+
+    def get_goal_version(self, goal_id: int) -> int:
+        """The goal's write counter, bumped in the same transaction as its rows"""
+        with self._reading() as connection:
+            row = connection.execute(_GOAL_VERSION, (goal_id,)).fetchone()
+        return row[0] if row else 0
+
+    def sum_by_type(self, goal_id: int, start: Optional[datetime] = None,
+                    end: Optional[datetime] = None) -> Dict[str, float]:
+        """Total value per activity type within [start, end)"""
+        start_ts = to_epoch_us(start) if start is not None else _MIN_TS
+        end_ts = to_epoch_us(end) if end is not None else _MAX_TS
+
+        with self._reading() as connection:
+            rows = connection.execute(_TYPE_TOTALS, (goal_id, start_ts, end_ts)).fetchall()
+        return {activity_type: total for activity_type, _, total in rows}
+
+    def get_by_goal_range(self, goal_id: int, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None,
+                          activity_type: Optional[str] = None) -> List[Activity]:
+        """Range scan of the (goal_id, ts) index"""
+        start_ts = to_epoch_us(start) if start is not None else _MIN_TS
+        end_ts = to_epoch_us(end) if end is not None else _MAX_TS
+
+        with self._reading() as connection:
+            rows = connection.execute(
+                _GOAL_RANGE, (goal_id, start_ts, end_ts, activity_type, activity_type)
+            ).fetchall()
+        return [self._row_to_activity(row) for row in rows]
+
+    def get_goal_page(self, goal_id: int, limit: int, after: Optional[Tuple[int, int]] = None,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      activity_type: Optional[str] = None) -> List[Activity]:
+        """Keyset page over the (goal_id, ts) index"""
+        start_ts = to_epoch_us(start) if start is not None else _MIN_TS
+        end_ts = to_epoch_us(end) if end is not None else _MAX_TS
+        after_ts, after_id = after if after is not None else (_MIN_TS, 0)
+
+        with self._reading() as connection:
+            rows = connection.execute(
+                _GOAL_PAGE, (goal_id, start_ts, end_ts, activity_type, activity_type,
+                             after_ts, after_ts, after_id, limit)
+            ).fetchall()
+        return [self._row_to_activity(row) for row in rows]
+
+    def get_active_dates(self, goal_id: int) -> List[date]:
+        """Sorted distinct dates on which the goal has activity"""
+        with self._reading() as connection:
+            rows = connection.execute(_ACTIVE_DAYS, (goal_id,)).fetchall()
+        return [epoch_day_to_date(row[0]) for row in rows]
+
+    def get_goal_stats(self, goal_ids: Optional[Iterable[int]], first_day: int,
+                       last_day: int) -> Dict[int, GoalStats]:
+        """Stats for many goals from three grouped queries instead of three per goal"""
+        if goal_ids is None:
+            where, also, parameters = '', '', ()
+        else:
+            goal_ids = list(goal_ids)
+            where, also = 'WHERE ' + _GOALS_FILTER, 'AND ' + _GOALS_FILTER
+            parameters = (json.dumps(goal_ids),)
+        window = (first_day * DAY_US, (last_day + 1) * DAY_US)
+
+        with self._reading() as connection:
+            # One read transaction, so all three queries see the same snapshot
+            connection.execute("BEGIN")
+            try:
+                type_rows = connection.execute(_GOALS_TYPE_TOTALS.format(where=where), parameters).fetchall()
+                day_rows = connection.execute(_GOALS_ACTIVE_DAYS.format(where=where), parameters).fetchall()
+                window_rows = connection.execute(_GOALS_WINDOW_TOTALS.format(also=also),
+                                                 window + parameters).fetchall()
+            finally:
+                connection.execute("COMMIT")
+
+        stats: Dict[int, GoalStats] = {goal_id: GoalStats(GoalAggregate(goal_id=goal_id))
+                                       for goal_id in (goal_ids or ())}
+        for goal_id, activity_type, count, total, last_ts in type_rows:
+            goal_stats = stats.get(goal_id)
+            if goal_stats is None:
+                goal_stats = stats[goal_id] = GoalStats(GoalAggregate(goal_id=goal_id))
+            aggregate = goal_stats.aggregate
+            aggregate.by_type[activity_type] = TypeAggregate(count=count, total_value=total)
+            aggregate.count += count
+            aggregate.total_value += total
+            if aggregate.last_ts is None or last_ts > aggregate.last_ts:
+                aggregate.last_ts = last_ts
+
+        days_by_goal: Dict[int, List[int]] = {}
+        for goal_id, day in day_rows:
+            days_by_goal.setdefault(goal_id, []).append(day)
+        for goal_id, days in days_by_goal.items():
+            stats[goal_id].distinct_days = len(days)
+            stats[goal_id].longest_streak = longest_run(days)
+
+        for goal_id, activity_type, total in window_rows:
+            stats[goal_id].window_totals[activity_type] = total
+        return stats
+
+    def close(self) -> None:
+        """Close this thread's connection"""
+        connection = self._shared or getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
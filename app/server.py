@@ -0,0 +1,363 @@
+import gc
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import Flask
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app.main import start_background_jobs, stop_background_jobs
+
+logger = logging.getLogger('life_design.server')
+
+_MB = 1024 * 1024
+
+def process_memory(pid: int) -> Optional[Dict[str, int]]:
+    """RSS, PSS and private/shared bytes of a process, from /proc (Linux)
+
+    PSS splits each shared page between the processes mapping it, so the
+    sum of every process's PSS is the real footprint of the whole server.
+    """
+    fields = {'Rss': 'rss', 'Pss': 'pss', 'Shared_Clean': 'shared', 'Shared_Dirty': 'shared',
+              'Private_Clean': 'private', 'Private_Dirty': 'private'}
+    memory = {'rss': 0, 'pss': 0, 'shared': 0, 'private': 0}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as smaps:
+            for line in smaps:
+                name, _, rest = line.partition(':')
+                if name in fields:
+                    memory[fields[name]] += int(rest.split()[0]) * 1024
+    except (OSError, ValueError):
+        return None
+    return memory
+
+def format_memory(memory: Optional[Dict[str, int]]) -> str:
+    if memory is None:
+        return "memory unavailable"
+    return (f"rss {memory['rss'] / _MB:.1f} MB, pss {memory['pss'] / _MB:.1f} MB, "
+            f"private {memory['private'] / _MB:.1f} MB, shared {memory['shared'] / _MB:.1f} MB")
+
+def warm_shared_state(app: Flask, goals: int) -> int:
+    """Compile the insight rules and read up to `goals` goals' rows into the OS page cache
+
+    Response payloads are not cached here: their keys carry today's day
+    number, so entries built by the master would all expire at midnight
+    while its workers live on. Each worker's precompute threads build them.
+    """
+    repository = app.extensions['activity_repository']
+    app.extensions['insight_rules'].plan()
+    goal_ids = repository.goal_ids()[:goals] if goals > 0 else []
+    for goal_id in goal_ids:
+        repository.get_goal_aggregate(goal_id)
+        repository.get_active_dates(goal_id)
+    return len(goal_ids)
+
+class _Worker:
+    def __init__(self, pid: int, generation: int):
+        self.pid = pid
+        self.generation = generation
+        self.started = time.monotonic()
+        self.stopping_since: Optional[float] = None
+
+class PreforkServer:
+    """Pre-fork WSGI server sharing the master's warm state copy-on-write
+
+    The master builds the app once, warms the rules and the database pages,
+    then gc.freeze()s its heap: frozen objects are never visited by the cyclic
+    collector, so children do not write to (and copy) the pages holding
+    them. Workers are forked from that state and serve one listening socket
+    with a threaded server each.
+
+    Signals to the master: TERM/INT stop gracefully, HUP re-warms and
+    replaces every worker without closing the socket, USR1 logs memory.
+    Workers are also replaced after `max_requests` requests (plus jitter)
+    or when their private memory passes `max_private_mb`.
+
+    Workers only share what the master had at fork time, so the repository
+    must keep its state where every process sees it (`process_safe`).
+    """
+
+    def __init__(self, app_factory: Callable[[], Flask], host: str = '0.0.0.0', port: int = 5000,
+                 workers: int = 0, warm_goals: int = 0, max_requests: int = 0,
+                 max_requests_jitter: int = 0, max_private_mb: int = 0,
+                 graceful_timeout: float = 30, keepalive: float = 5,
+                 memory_check_interval: float = 30):
+        self.app_factory = app_factory
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.warm_goals = warm_goals
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_private_mb = max_private_mb
+        self.graceful_timeout = graceful_timeout
+        self.keepalive = keepalive
+        self.memory_check_interval = memory_check_interval
+
+        self.app: Optional[Flask] = None
+        self.socket: Optional[socket.socket] = None
+        self.generation = 0
+        self._workers: Dict[int, _Worker] = {}
+        self._signals: List[int] = []
+        self._stopping = False
+        self._server = None
+        # Memory is logged once workers have booted, after start-up and reloads
+        self._report_due: Optional[float] = None
+
+    @classmethod
+    def from_settings(cls, app_factory: Callable[[], Flask], settings: Dict[str, Any],
+                      host: str = '0.0.0.0', port: int = 5000) -> "PreforkServer":
+        return cls(app_factory, host, port,
+                   workers=settings.get('PREFORK_WORKERS', 0),
+                   warm_goals=settings.get('PREFORK_WARM_GOALS', 0),
+                   max_requests=settings.get('PREFORK_MAX_REQUESTS', 0),
+                   max_requests_jitter=settings.get('PREFORK_MAX_REQUESTS_JITTER', 0),
+                   max_private_mb=settings.get('PREFORK_MAX_WORKER_PRIVATE_MB', 0),
+                   graceful_timeout=settings.get('PREFORK_GRACEFUL_TIMEOUT_S', 30),
+                   keepalive=settings.get('PREFORK_KEEPALIVE_S', 5),
+                   memory_check_interval=settings.get('PREFORK_MEMORY_CHECK_S', 30))
+
+    # ========== MASTER ==========
+    def run(self) -> None:
+        started = time.perf_counter()
+        self.app = self.app_factory()
+        repository = self.app.extensions['activity_repository']
+        if not repository.process_safe:
+            raise ValueError(f"Pre-fork mode supports only ACTIVITY_REPOSITORY=sqlite: "
+                             f"{type(repository).__name__} keeps activities in process memory, "
+                             "so workers would not see each other's writes")
+        # Background threads do not survive fork(); each worker starts its own
+        stop_background_jobs(self.app)
+        built = time.perf_counter()
+
+        self.socket = socket.create_server((self.host, self.port), backlog=2048)
+        warmed = self._prepare_fork()
+        ready = time.perf_counter()
+        logger.info("Master %d ready in %.2fs (app %.2fs, warm-up of %d goals %.2fs); %s",
+                    os.getpid(), ready - started, built - started, warmed, ready - built,
+                    format_memory(process_memory(os.getpid())))
+
+        wake_read, wake_write = os.pipe()
+        os.set_blocking(wake_read, False)
+        os.set_blocking(wake_write, False)
+        signal.set_wakeup_fd(wake_write)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGUSR1, signal.SIGCHLD):
+            signal.signal(signum, self._record_signal)
+
+        self.generation = 1
+        for _ in range(self.workers):
+            self._spawn()
+        logger.info("Serving on http://%s:%d with %d workers", self.host, self.port, self.workers)
+        self._report_due = time.monotonic() + 2
+
+        next_memory_check = time.monotonic() + self.memory_check_interval
+        try:
+            while self._workers or not self._stopping:
+                select.select([wake_read], [], [], 1.0)
+                try:
+                    while os.read(wake_read, 512):
+                        pass
+                except BlockingIOError:
+                    pass
+                self._handle_signals()
+                self._reap()
+                self._kill_overdue()
+                if not self._stopping and time.monotonic() >= next_memory_check:
+                    next_memory_check = time.monotonic() + self.memory_check_interval
+                    self._check_memory()
+                if self._report_due is not None and time.monotonic() >= self._report_due:
+                    self._report_due = None
+                    self.report_memory()
+        finally:
+            signal.set_wakeup_fd(-1)
+            self.socket.close()
+            close = getattr(repository, 'close', None)
+            if close is not None:
+                close()
+        logger.info("Master %d stopped", os.getpid())
+
+    def _prepare_fork(self) -> int:
+        """Warm shared state, then freeze the heap so workers share it untouched"""
+        warmed = warm_shared_state(self.app, self.warm_goals)
+        gc.collect()
+        gc.freeze()
+        return warmed
+
+    def _record_signal(self, signum, frame) -> None:
+        self._signals.append(signum)
+
+    def _handle_signals(self) -> None:
+        while self._signals:
+            signum = self._signals.pop(0)
+            if signum in (signal.SIGTERM, signal.SIGINT) and not self._stopping:
+                logger.info("Stopping %d workers", len(self._workers))
+                self._stopping = True
+                for pid in list(self._workers):
+                    self._retire(pid)
+            elif signum == signal.SIGHUP and not self._stopping:
+                self._reload()
+            elif signum == signal.SIGUSR1:
+                self.report_memory()
+
+    def _reload(self) -> None:
+        """Re-warm and fork a new generation, then drain the old one"""
+        started = time.perf_counter()
+        gc.unfreeze()
+        warmed = self._prepare_fork()
+        old = [pid for pid, worker in self._workers.items() if worker.stopping_since is None]
+        self.generation += 1
+        for _ in range(self.workers):
+            self._spawn()
+        for pid in old:
+            self._retire(pid)
+        self._report_due = time.monotonic() + 2
+        logger.info("Reloaded: generation %d warmed %d goals in %.2fs, draining %d old workers",
+                    self.generation, warmed, time.perf_counter() - started, len(old))
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = self._serve_worker()
+            except BaseException:
+                logger.exception("Worker %d failed", os.getpid())
+            finally:
+                os._exit(code)
+        self._workers[pid] = _Worker(pid, self.generation)
+
+    def _retire(self, pid: int) -> None:
+        worker = self._workers.get(pid)
+        if worker is None or worker.stopping_since is not None:
+            return
+        worker.stopping_since = time.monotonic()
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self) -> None:
+        while self._workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self._workers.pop(pid, None)
+            if worker is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            planned = worker.stopping_since is not None or code == 0
+            if not planned:
+                logger.warning("Worker %d exited with status %d", pid, code)
+            # Replace recycled and crashed workers of the current generation
+            if (not self._stopping and worker.generation == self.generation
+                    and worker.stopping_since is None):
+                if not planned and time.monotonic() - worker.started < 1:
+                    time.sleep(1)  # don't spin on a worker that fails at start-up
+                self._spawn()
+
+    def _kill_overdue(self) -> None:
+        now = time.monotonic()
+        for pid, worker in list(self._workers.items()):
+            if worker.stopping_since is not None and now - worker.stopping_since > self.graceful_timeout:
+                logger.warning("Worker %d did not stop within %.0fs; killing it", pid, self.graceful_timeout)
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                worker.stopping_since = float('inf')
+
+    def _check_memory(self) -> None:
+        for pid, worker in list(self._workers.items()):
+            if worker.stopping_since is not None or not self.max_private_mb:
+                continue
+            memory = process_memory(pid)
+            if memory is not None and memory['private'] > self.max_private_mb * _MB:
+                logger.info("Recycling worker %d: %s", pid, format_memory(memory))
+                self._retire(pid)
+                self._spawn()
+
+    def report_memory(self) -> Dict[int, Optional[Dict[str, int]]]:
+        """Log and return the memory of the master and every worker"""
+        report = {os.getpid(): process_memory(os.getpid())}
+        logger.info("Master %d: %s", os.getpid(), format_memory(report[os.getpid()]))
+        for pid, worker in sorted(self._workers.items()):
+            report[pid] = process_memory(pid)
+            logger.info("Worker %d (generation %d): %s", pid, worker.generation,
+                        format_memory(report[pid]))
+        known = [memory for memory in report.values() if memory is not None]
+        if known:
+            logger.info("Total pss %.1f MB across %d processes",
+                        sum(memory['pss'] for memory in known) / _MB, len(known))
+        return report
+
+    # ========== WORKER ==========
+    def _serve_worker(self) -> int:
+        started = time.perf_counter()
+        signal.set_wakeup_fd(-1)
+        for signum in (signal.SIGHUP, signal.SIGUSR1, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        # Ctrl-C reaches the whole process group; the master decides what stops
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        app = self.app
+        app.extensions['activity_repository'].after_fork()
+        start_background_jobs(app)
+
+        class Handler(WSGIRequestHandler):
+            # Idle keep-alive connections are dropped, so a stopping worker drains
+            timeout = self.keepalive
+
+        server = make_server(self.host, self.port, self._counted(app), threaded=True,
+                             request_handler=Handler, fd=self.socket.fileno())
+        # Track request threads so server_close() waits for in-flight requests
+        server.daemon_threads = False
+        self._server = server
+
+        def stop(signum, frame):
+            threading.Thread(target=self._shutdown_worker, daemon=True).start()
+        signal.signal(signal.SIGTERM, stop)
+
+        logger.info("Worker %d ready in %.0f ms", os.getpid(), (time.perf_counter() - started) * 1000)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            stop_background_jobs(app)
+        return 0
+
+    def _shutdown_worker(self) -> None:
+        """Stop accepting requests and let in-flight ones finish"""
+        # Event streams never end on their own: close them (clients reconnect
+        # to another worker) or the drain would wait the full graceful timeout
+        dashboard_stream = self.app.extensions.get('dashboard_stream')
+        if dashboard_stream is not None:
+            dashboard_stream.stop()
+        self._server.shutdown()
+
+    def _counted(self, app: Flask) -> Callable:
+        """Wrap the WSGI app to shut this worker down after its request budget"""
+        if not self.max_requests:
+            return app
+        budget = self.max_requests + random.randint(0, self.max_requests_jitter)
+        lock = threading.Lock()
+        served = 0
+
+        def application(environ, start_response):
+            nonlocal served
+            with lock:
+                served += 1
+                exhausted = served == budget
+            if exhausted:
+                logger.info("Worker %d served %d requests; recycling", os.getpid(), budget)
+                threading.Thread(target=self._shutdown_worker, daemon=True).start()
+            return app(environ, start_response)
+        return application
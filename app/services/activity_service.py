@@ -1,14 +1,66 @@
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
-from app.repository.activity_repository import InMemoryActivityRepository, get_activity_repository
-from app.models.activity import Activity
+from app.metrics import timed
+from app.repository import BaseRepository
+from app.repository.activity_repository import get_activity_repository
+from app.models.activity import MAX_ACTIVITY_TYPE_BYTES, Activity, parse_timestamp
+# consistency_score is computed by the repository's leaderboards too
+from app.models.goal_aggregate import consistency_score
+
+REQUIRED_FIELDS = ('goal_id', 'activity_type', 'value')
+
+def validate_activity_data(data: Any) -> dict:
+    """Validate a raw activity payload and normalize it for the repository"""
+    if not isinstance(data, dict):
+        raise ValueError("Activity must be a JSON object")
+    
+    # Validate required fields
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            raise ValueError(f"Missing required field: {field}")
+    
+    # Both key the repository's indexes, so they are checked here rather
+    # than failing part-way through a batch insert
+    goal_id = data['goal_id']
+    if not isinstance(goal_id, int) or isinstance(goal_id, bool):
+        raise ValueError("goal_id must be an integer")
+    activity_type = data['activity_type']
+    if not isinstance(activity_type, str) or not activity_type:
+        raise ValueError("activity_type must be a non-empty string")
+    if len(activity_type.encode('utf-8')) > MAX_ACTIVITY_TYPE_BYTES:
+        raise ValueError(f"activity_type must be at most {MAX_ACTIVITY_TYPE_BYTES} bytes in UTF-8")
+    value = data['value']
+    if isinstance(value, bool):
+        raise ValueError("value must be a number")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"value must be a number, got {value!r}")
+    
+    # Parse the timestamp once here; storage keeps only the epoch. Clients
+    # send ISO strings: the integer form is for internal callers only, and a
+    # JSON number would otherwise be read as microseconds since 1970
+    timestamp = data.get('timestamp')
+    if timestamp in (None, ''):
+        timestamp = datetime.now()
+    elif not isinstance(timestamp, str):
+        raise ValueError("timestamp must be an ISO 8601 string")
+    
+    return {
+        "goal_id": goal_id,
+        "activity_type": activity_type,
+        "value": value,
+        "timestamp": parse_timestamp(timestamp),
+        "notes": data.get('notes')
+    }
 
 class ActivityService:
     """Service layer for activity business logic"""
     
-    def __init__(self, repository: InMemoryActivityRepository = None):
+    def __init__(self, repository: BaseRepository = None):
         self.repository = repository or get_activity_repository()
     
+    @timed('ActivityService.create_activity')
     def create_activity(self, activity_data: dict) -> Activity:
         """Create a new activity"""
         # Ensure timestamp
@@ -17,70 +69,23 @@ class ActivityService:
         
         return self.repository.add(activity_data)
     
+    @timed('ActivityService.create_activities')
+    def create_activities(self, activities_data: List[dict]) -> List[Activity]:
+        """Create a batch of activities in one repository call"""
+        now = datetime.now().isoformat()
+        for activity_data in activities_data:
+            activity_data.setdefault('timestamp', now)
+        
+        return self.repository.add_many(activities_data)
+    
+    @timed('ActivityService.get_goal_summary')
     def get_goal_summary(self, goal_id: int) -> Dict[str, Any]:
         """Get summary for a specific goal"""
-        activities = self.repository.get_by_goal(goal_id)
-        
-        if not activities:
-            return {
-                "total_activities": 0,
-                "total_value": 0,
-                "average_value": 0,
-                "activity_by_type": {}
-            }
-        
-        # Calculate totals
-        total_value = sum(a.value for a in activities)
-        
-        # Group by type
-        activity_by_type = {}
-        for activity in activities:
-            activity_type = activity.activity_type
-            if activity_type not in activity_by_type:
-                activity_by_type[activity_type] = {
-                    "count": 0,
-                    "total_value": 0
-                }
-            activity_by_type[activity_type]["count"] += 1
-            activity_by_type[activity_type]["total_value"] += activity.value
-        
-        # Get last activity
-        last_activity = max(activities, 
-                           key=lambda a: a.timestamp)
-        
-        return {
-            "total_activities": len(activities),
-            "total_value": total_value,
-            "average_value": total_value / len(activities),
-            "activity_by_type": activity_by_type,
-            "last_activity": last_activity.timestamp
-        }
+        # Served from the repository's running aggregate, not a rescan
+        return self.repository.get_goal_aggregate(goal_id).to_summary()
     
+    @timed('ActivityService.calculate_consistency_score')
     def calculate_consistency_score(self, goal_id: int) -> float:
         """Calculate consistency score (0.0-1.0)"""
-        activities = self.repository.get_by_goal(goal_id)
-        
-        if not activities:
-            return 0.0
-        
-        # Get unique dates
-        dates = sorted(set(datetime.fromisoformat(a.timestamp).date() 
-                          for a in activities))
-        
-        if len(dates) < 2:
-            return 0.5
-        
-        # Calculate longest streak
-        max_streak = 0
-        current_streak = 1
-        
-        for i in range(1, len(dates)):
-            days_diff = (dates[i] - dates[i-1]).days
-            if days_diff == 1:
-                current_streak += 1
-                max_streak = max(max_streak, current_streak)
-            else:
-                current_streak = 1
-        
-        score = max_streak / len(dates)
-        return round(min(score, 1.0), 2)
\ No newline at end of file
+        distinct_days, longest_streak = self.repository.get_streak_stats(goal_id)
+        return consistency_score(distinct_days, longest_streak)
@@ -0,0 +1,123 @@
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from app.metrics import timed
+from app.models.activity import Activity
+from app.models.goal_aggregate import GoalStats, parse_leaderboard_metric
+from app.repository.async_repository import AsyncBaseRepository
+from app.services.activity_service import consistency_score
+from app.services.insight_service import (leaderboard_payload, value_stats_payload, weekly_window,
+                                          wellness_insights, productivity_recommendation)
+from app.services.dashboard_service import goal_dashboard, goal_insights, iter_bulk_insights
+from app.services.rules import DEFAULT_RULES, RuleBook, goal_features
+
+class AsyncActivityService:
+    """Async counterpart of ActivityService"""
+
+    def __init__(self, repository: AsyncBaseRepository):
+        self.repository = repository
+
+    @timed('ActivityService.create_activity')
+    async def create_activity(self, activity_data: dict) -> Activity:
+        """Create a new activity"""
+        activity_data.setdefault('timestamp', datetime.now().isoformat())
+        return await self.repository.add(activity_data)
+
+    @timed('ActivityService.create_activities')
+    async def create_activities(self, activities_data: List[dict]) -> List[Activity]:
+        """Create a batch of activities in one repository call"""
+        now = datetime.now().isoformat()
+        for activity_data in activities_data:
+            activity_data.setdefault('timestamp', now)
+        return await self.repository.add_many(activities_data)
+
+    @timed('ActivityService.get_goal_summary')
+    async def get_goal_summary(self, goal_id: int) -> Dict[str, Any]:
+        """Get summary for a specific goal"""
+        return (await self.repository.get_goal_aggregate(goal_id)).to_summary()
+
+    @timed('ActivityService.calculate_consistency_score')
+    async def calculate_consistency_score(self, goal_id: int) -> float:
+        """Calculate consistency score (0.0-1.0)"""
+        distinct_days, longest_streak = await self.repository.get_streak_stats(goal_id)
+        return consistency_score(distinct_days, longest_streak)
+
+class AsyncInsightService:
+    """Async counterpart of InsightService"""
+
+    def __init__(self, repository: AsyncBaseRepository, rules: RuleBook = None):
+        self.repository = repository
+        self.rules = rules or DEFAULT_RULES
+
+    @timed('InsightService.get_goal_stats')
+    async def get_goal_stats(self, goal_id: int) -> GoalStats:
+        """Aggregate, streaks and weekly window totals in one repository call"""
+        first_day, last_day = weekly_window()
+        return (await self.repository.get_goal_stats([goal_id], first_day, last_day))[goal_id]
+
+    @timed('InsightService.get_weekly_health_total')
+    async def get_weekly_health_total(self, goal_id: int) -> float:
+        """Calculate health activities total for the last 7 days, including today"""
+        first_day, last_day = weekly_window()
+        weekly_totals = await self.repository.get_day_totals(goal_id, first_day, last_day)
+        return weekly_totals.get("Health", 0)
+
+    @timed('InsightService.generate_wellness_insights')
+    async def generate_wellness_insights(self, goal_id: int) -> Dict[str, Any]:
+        """Generate wellness-related insights"""
+        features = goal_features(await self.get_goal_stats(goal_id))
+        decisions = self.rules.plan().evaluate(features, ('wellness_warning', 'recommendation'))
+        return wellness_insights(features, decisions)
+
+    @timed('InsightService.get_leaderboard')
+    async def get_leaderboard(self, metric: str, k: int) -> Dict[str, Any]:
+        """Top k goals on a metric; raises ValueError for unknown metrics"""
+        parse_leaderboard_metric(metric)
+        first_day, last_day = weekly_window()
+        return leaderboard_payload(metric, k, await self.repository.top_goals(metric, k, first_day, last_day))
+
+    @timed('InsightService.get_value_stats')
+    async def get_value_stats(self, goal_id: int, quantiles: Sequence[float],
+                              first_day: Optional[int] = None,
+                              last_day: Optional[int] = None) -> Dict[str, Any]:
+        """Value quantiles over the goal's history and distinct active days in a day window"""
+        return value_stats_payload(goal_id, await self.repository.get_goal_sketches(goal_id),
+                                   quantiles, first_day, last_day)
+
+    @timed('InsightService.get_productivity_recommendation')
+    async def get_productivity_recommendation(self, goal_id: int) -> Dict[str, Any]:
+        """Generate productivity recommendations"""
+        stats = await self.get_goal_stats(goal_id)
+        decisions = self.rules.plan().evaluate(goal_features(stats), ('productivity_recommendations',))
+        return productivity_recommendation(stats.aggregate, decisions)
+
+class AsyncDashboardService:
+    """Async counterpart of DashboardService"""
+
+    def __init__(self, repository: AsyncBaseRepository,
+                 activities_url: str = '/api/goals/{goal_id}/activities', rules: RuleBook = None):
+        self.repository = repository
+        self.rules = rules or DEFAULT_RULES
+        self.activity_service = AsyncActivityService(repository)
+        self.insight_service = AsyncInsightService(repository, self.rules)
+        self.activities_url = activities_url
+
+    @timed('DashboardService.build_dashboard')
+    async def build_dashboard(self, goal_id: int) -> Dict[str, Any]:
+        """Build the dashboard payload from one stats call"""
+        return goal_dashboard(goal_id, await self.insight_service.get_goal_stats(goal_id),
+                              self.rules.plan(), self.activities_url)
+
+    @timed('DashboardService.build_insights')
+    async def build_insights(self, goal_id: int) -> Dict[str, Any]:
+        """Build the optimization insights payload from one stats call"""
+        return goal_insights(goal_id, await self.insight_service.get_goal_stats(goal_id), self.rules.plan())
+
+    async def iter_bulk_insights(self, goal_ids: Optional[List[int]] = None,
+                                 **goal_filter) -> Iterator[Dict[str, Any]]:
+        """Insights for many goals from one grouped repository call"""
+        if goal_ids is not None:
+            goal_ids = list(dict.fromkeys(goal_ids))
+        first_day, last_day = weekly_window()
+        stats = await self.repository.get_goal_stats(goal_ids, first_day, last_day)
+        return iter_bulk_insights(stats, goal_ids, plan=self.rules.plan(), **goal_filter)
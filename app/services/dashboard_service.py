@@ -0,0 +1,146 @@
+from typing import Dict, Any, Iterator, List, Optional
+from app.metrics import timed
+from app.models.goal_aggregate import GoalStats
+from app.repository import BaseRepository
+from app.repository.activity_repository import get_activity_repository
+from app.services.activity_service import ActivityService
+from app.services.insight_service import (InsightService, weekly_window, wellness_insights,
+                                          productivity_recommendation)
+from app.services.rules import DEFAULT_RULES, DecisionPlan, RuleBook, goal_features
+
+def dashboard_payload(goal_id: int, summary: Dict[str, Any], consistency_score: float,
+                      wellness: Dict[str, Any], activities_url: str) -> Dict[str, Any]:
+    """Assemble the dashboard response body"""
+    if not summary["total_activities"]:
+        return {
+            "goal_id": goal_id,
+            "message": "No activities found",
+            "status": "success"
+        }
+    
+    return {
+        "goal_id": goal_id,
+        "summary": summary,
+        "activities_url": activities_url,
+        "consistency_score": consistency_score,
+        "wellness_warning": wellness["wellness_warning"],
+        "recommendation": wellness["recommendation"],
+        "status": "success"
+    }
+
+def insights_payload(goal_id: int, consistency_score: float,
+                     wellness: Dict[str, Any]) -> Dict[str, Any]:
+    """Assemble the optimization insights response body"""
+    return {
+        "goal_id": goal_id,
+        "consistency_score": consistency_score,
+        "weekly_health_total": wellness["weekly_health_total"],
+        "wellness_warning": wellness["wellness_warning"],
+        "recommendation": wellness["recommendation"],
+        "learning_total": wellness["learning_total"],
+        "health_total": wellness["health_total"],
+        "status": "success"
+    }
+
+def empty_insights_payload(goal_id: int) -> Dict[str, Any]:
+    """Insights response body for a goal with no activities"""
+    return {
+        "goal_id": goal_id,
+        "message": "No activities found",
+        "consistency_score": 0.0,
+        "wellness_warning": False,
+        "status": "success"
+    }
+
+def bulk_insight_payload(goal_id: int, stats: GoalStats, plan: DecisionPlan) -> Dict[str, Any]:
+    """Insights payload for one goal of a bulk request, plus its type totals"""
+    aggregate = stats.aggregate
+    if not aggregate.count:
+        return empty_insights_payload(goal_id)
+    
+    features = goal_features(stats)
+    decisions = plan.evaluate(features)
+    return {
+        **insights_payload(goal_id, features["consistency_score"], wellness_insights(features, decisions)),
+        "type_totals": aggregate.type_totals(),
+        "productivity_recommendations": productivity_recommendation(aggregate, decisions)["recommendations"]
+    }
+
+def iter_bulk_insights(stats: Dict[int, GoalStats], goal_ids: Optional[List[int]] = None,
+                       activity_type: Optional[str] = None, min_activities: int = 0,
+                       goal_id_min: Optional[int] = None, goal_id_max: Optional[int] = None,
+                       plan: Optional[DecisionPlan] = None) -> Iterator[Dict[str, Any]]:
+    """Payloads for the requested goals (or every goal) that pass the filter"""
+    plan = plan or DEFAULT_RULES.plan()
+    for goal_id in (goal_ids if goal_ids is not None else stats):
+        aggregate = stats[goal_id].aggregate
+        if aggregate.count < min_activities:
+            continue
+        if activity_type is not None and not aggregate.type_count(activity_type):
+            continue
+        if goal_id_min is not None and goal_id < goal_id_min:
+            continue
+        if goal_id_max is not None and goal_id > goal_id_max:
+            continue
+        yield bulk_insight_payload(goal_id, stats[goal_id], plan)
+
+def goal_dashboard(goal_id: int, stats: GoalStats, plan: DecisionPlan,
+                   activities_url: str) -> Dict[str, Any]:
+    """Dashboard payload from a goal's stats"""
+    summary = stats.aggregate.to_summary()
+    if not summary["total_activities"]:
+        return dashboard_payload(goal_id, summary, 0.0, {}, "")
+    
+    features = goal_features(stats)
+    wellness = wellness_insights(features, plan.evaluate(features, ('wellness_warning', 'recommendation')))
+    return dashboard_payload(goal_id, summary, features["consistency_score"], wellness,
+                             activities_url.format(goal_id=goal_id))
+
+def goal_insights(goal_id: int, stats: GoalStats, plan: DecisionPlan) -> Dict[str, Any]:
+    """Optimization insights payload from a goal's stats"""
+    if not stats.aggregate.count:
+        return empty_insights_payload(goal_id)
+    
+    features = goal_features(stats)
+    wellness = wellness_insights(features, plan.evaluate(features, ('wellness_warning', 'recommendation')))
+    return insights_payload(goal_id, features["consistency_score"], wellness)
+
+class DashboardService:
+    """Service layer that assembles the dashboard and insight payloads
+    
+    Each payload is built from one get_goal_stats() call and one
+    evaluation of the rule book's decision plan.
+    """
+    
+    def __init__(self, repository: BaseRepository = None,
+                 activities_url: str = '/api/goals/{goal_id}/activities', rules: RuleBook = None):
+        self.repository = repository or get_activity_repository()
+        self.rules = rules or DEFAULT_RULES
+        self.activity_service = ActivityService(self.repository)
+        self.insight_service = InsightService(self.repository, self.rules)
+        self.activities_url = activities_url
+    
+    @timed('DashboardService.build_dashboard')
+    def build_dashboard(self, goal_id: int) -> Dict[str, Any]:
+        """Build the dashboard payload for a goal"""
+        return goal_dashboard(goal_id, self.insight_service.get_goal_stats(goal_id),
+                              self.rules.plan(), self.activities_url)
+    
+    @timed('DashboardService.build_insights')
+    def build_insights(self, goal_id: int) -> Dict[str, Any]:
+        """Build the optimization insights payload for a goal"""
+        return goal_insights(goal_id, self.insight_service.get_goal_stats(goal_id), self.rules.plan())
+    
+    @timed('DashboardService.iter_bulk_insights')
+    def iter_bulk_insights(self, goal_ids: Optional[List[int]] = None,
+                           **goal_filter) -> Iterator[Dict[str, Any]]:
+        """Insights for many goals from one grouped repository call
+        
+        `goal_ids=None` covers every goal; `goal_filter` takes the keyword
+        filters of iter_bulk_insights().
+        """
+        if goal_ids is not None:
+            goal_ids = list(dict.fromkeys(goal_ids))
+        first_day, last_day = weekly_window()
+        stats = self.repository.get_goal_stats(goal_ids, first_day, last_day)
+        return iter_bulk_insights(stats, goal_ids, plan=self.rules.plan(), **goal_filter)
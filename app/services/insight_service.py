@@ -1,95 +1,137 @@
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
-from app.repository.activity_repository import InMemoryActivityRepository, get_activity_repository
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from app.models.activity import epoch_day_to_date, today_epoch_day
+from app.models.goal_aggregate import GoalAggregate, GoalStats, parse_leaderboard_metric
+from app.models.sketches import GoalSketches, TypeSketch, kll_rank_error
+from app.metrics import timed
+from app.repository import BaseRepository
+from app.repository.activity_repository import get_activity_repository
+from app.services.rules import DEFAULT_RULES, RuleBook, goal_features
+
+def weekly_window() -> Tuple[int, int]:
+    """First and last epoch day of the 7-day window ending today"""
+    today = today_epoch_day()
+    return today - 6, today
+
+def wellness_insights(features: Dict[str, Any], decisions: Dict[str, Any]) -> Dict[str, Any]:
+    """Wellness insights from a goal's features and the rule plan's decisions"""
+    return {
+        "weekly_health_total": features.get("weekly.Health", 0),
+        "wellness_warning": decisions["wellness_warning"],
+        "recommendation": decisions["recommendation"],
+        "learning_total": features.get("total.Learning", 0),
+        "health_total": features.get("total.Health", 0)
+    }
+
+def productivity_recommendation(aggregate: GoalAggregate, decisions: Dict[str, Any]) -> Dict[str, Any]:
+    """Productivity recommendations from a goal's aggregate and the rule plan's decisions"""
+    if not aggregate.count:
+        return {
+            "recommendations": ["Start logging activities to get personalized insights!"],
+            "total_activities": 0
+        }
+    
+    return {
+        "recommendations": decisions["productivity_recommendations"],
+        "total_activities": aggregate.count,
+        "activity_types": list(aggregate.by_type)
+    }
+
+def leaderboard_payload(metric: str, k: int, leaders: List[Tuple[Any, float]]) -> Dict[str, Any]:
+    """Ranked (goal_id, score) pairs in the leaderboard response shape"""
+    return {
+        "metric": metric,
+        "k": k,
+        "leaders": [{"rank": rank, "goal_id": goal_id, "score": score}
+                    for rank, (goal_id, score) in enumerate(leaders, 1)]
+    }
+
+def quantile_label(q: float) -> str:
+    """'p50' for 0.5, 'p99.9' for 0.999"""
+    return f"p{q * 100:g}"
+
+def type_sketch_stats(sketch: TypeSketch, quantiles: Sequence[float],
+                      first_day: Optional[int], last_day: Optional[int]) -> Dict[str, Any]:
+    """Count, range, value quantiles and active days in a day window from one type's sketches"""
+    values = sketch.values
+    return {
+        "count": values.count,
+        "min": values.min,
+        "max": values.max,
+        "quantiles": dict(zip(map(quantile_label, quantiles), values.quantiles(quantiles))),
+        # 0 while the sketch still holds every value
+        "quantile_rank_error": round(values.rank_error(), 4),
+        "distinct_days": sketch.days.count(first_day, last_day)
+    }
+
+def value_stats_payload(goal_id: int, sketches: GoalSketches, quantiles: Sequence[float],
+                        first_day: Optional[int], last_day: Optional[int]) -> Dict[str, Any]:
+    """The stats response: per-type and overall figures plus the error bounds that apply"""
+    return {
+        "goal_id": goal_id,
+        "window": {
+            "first_day": epoch_day_to_date(first_day).isoformat() if first_day is not None else None,
+            "last_day": epoch_day_to_date(last_day).isoformat() if last_day is not None else None
+        },
+        "by_type": {activity_type: type_sketch_stats(sketch, quantiles, first_day, last_day)
+                    for activity_type, sketch in sketches.by_type.items()},
+        "all": type_sketch_stats(sketches.combined(), quantiles, first_day, last_day),
+        "error_bounds": {
+            "quantile_rank_error": round(kll_rank_error(sketches.k), 4),
+            "quantile_confidence": 0.99,
+            "distinct_days_error": 0
+        }
+    }
 
 class InsightService:
-    """Service layer for insight generation"""
+    """Service layer for insight generation
+    
+    Thresholds and messages come from the rule book's decision plan, which
+    is evaluated against one feature vector built from a single
+    get_goal_stats() call per goal.
+    """
     
-    def __init__(self, repository: InMemoryActivityRepository = None):
+    def __init__(self, repository: BaseRepository = None, rules: RuleBook = None):
         self.repository = repository or get_activity_repository()
+        self.rules = rules or DEFAULT_RULES
     
+    @timed('InsightService.get_goal_stats')
+    def get_goal_stats(self, goal_id: int) -> GoalStats:
+        """Aggregate, streaks and weekly window totals in one repository call"""
+        first_day, last_day = weekly_window()
+        return self.repository.get_goal_stats([goal_id], first_day, last_day)[goal_id]
+    
+    @timed('InsightService.get_weekly_health_total')
     def get_weekly_health_total(self, goal_id: int) -> float:
-        """Calculate weekly health activities total"""
-        one_week_ago = datetime.now() - timedelta(days=7)
-        activities = self.repository.get_by_goal(goal_id)
-        
-        health_total = 0
-        for activity in activities:
-            if activity.activity_type == "Health":
-                activity_time = datetime.fromisoformat(activity.timestamp)
-                if activity_time >= one_week_ago:
-                    health_total += activity.value
+        """Calculate health activities total for the last 7 days, including today"""
+        first_day, last_day = weekly_window()
+        weekly_totals = self.repository.get_day_totals(goal_id, first_day, last_day)
         
-        return health_total
+        return weekly_totals.get("Health", 0)
     
+    @timed('InsightService.generate_wellness_insights')
     def generate_wellness_insights(self, goal_id: int) -> Dict[str, Any]:
         """Generate wellness-related insights"""
-        activities = self.repository.get_by_goal(goal_id)
-        
-        # Calculate totals
-        health_total = 0
-        learning_total = 0
-        
-        for activity in activities:
-            if activity.activity_type == "Health":
-                health_total += activity.value
-            elif activity.activity_type == "Learning":
-                learning_total += activity.value
-        
-        weekly_health = self.get_weekly_health_total(goal_id)
-        wellness_warning = weekly_health < 150
-        
-        # Generate recommendation
-        recommendation = ""
-        if weekly_health < 150:
-            if learning_total > 300:
-                recommendation = "High learning activity detected but physical wellness is low. Consider rebalancing your growth plan."
-            else:
-                recommendation = "Try to reach 150+ minutes of health activities per week for optimal wellness."
-        elif learning_total > 400:
-            recommendation = "Great learning consistency! Keep maintaining your study habits."
-        else:
-            recommendation = "Your activity pattern looks balanced. Keep tracking your progress!"
-        
-        return {
-            "weekly_health_total": weekly_health,
-            "wellness_warning": wellness_warning,
-            "recommendation": recommendation,
-            "learning_total": learning_total,
-            "health_total": health_total
-        }
+        features = goal_features(self.get_goal_stats(goal_id))
+        decisions = self.rules.plan().evaluate(features, ('wellness_warning', 'recommendation'))
+        return wellness_insights(features, decisions)
+    
+    @timed('InsightService.get_leaderboard')
+    def get_leaderboard(self, metric: str, k: int) -> Dict[str, Any]:
+        """Top k goals on a metric; raises ValueError for unknown metrics"""
+        parse_leaderboard_metric(metric)
+        first_day, last_day = weekly_window()
+        return leaderboard_payload(metric, k, self.repository.top_goals(metric, k, first_day, last_day))
     
+    @timed('InsightService.get_value_stats')
+    def get_value_stats(self, goal_id: int, quantiles: Sequence[float],
+                        first_day: Optional[int] = None, last_day: Optional[int] = None) -> Dict[str, Any]:
+        """Value quantiles over the goal's history and distinct active days in a day window"""
+        return value_stats_payload(goal_id, self.repository.get_goal_sketches(goal_id),
+                                   quantiles, first_day, last_day)
+    
+    @timed('InsightService.get_productivity_recommendation')
     def get_productivity_recommendation(self, goal_id: int) -> Dict[str, Any]:
         """Generate productivity recommendations"""
-        activities = self.repository.get_by_goal(goal_id)
-        
-        if not activities:
-            return {
-                "recommendations": ["Start logging activities to get personalized insights!"],
-                "total_activities": 0
-            }
-        
-        # Activity analysis
-        activity_count = len(activities)
-        activity_types = set(a.activity_type for a in activities)
-        
-        recommendations = []
-        
-        # Variety check
-        if len(activity_types) < 2:
-            recommendations.append("Try diversifying your activities across different types for holistic growth.")
-        
-        # Consistency encouragement
-        if activity_count > 10:
-            recommendations.append(f"Great consistency! You've logged {activity_count} activities.")
-        
-        # Health focus
-        health_activities = [a for a in activities if a.activity_type == "Health"]
-        if len(health_activities) < 3:
-            recommendations.append("Consider adding more health activities to your routine.")
-        
-        return {
-            "recommendations": recommendations or ["Keep up the good work! Continue tracking your progress."],
-            "total_activities": activity_count,
-            "activity_types": list(activity_types)
-        }
\ No newline at end of file
+        stats = self.get_goal_stats(goal_id)
+        decisions = self.rules.plan().evaluate(goal_features(stats), ('productivity_recommendations',))
+        return productivity_recommendation(stats.aggregate, decisions)
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import operator
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.models.goal_aggregate import GoalStats
+from app.services.activity_service import consistency_score
+
+# The built-in insight rules. A JSON file at INSIGHT_RULES_PATH with the same
+# shape replaces any of these decisions; the others keep their defaults.
+#
+# Each decision is evaluated in "first" mode (the `then` of the first rule
+# whose conditions all hold, else `default`) or "all" mode (the list of every
+# matching rule's `then`, else `default`). A condition is
+# [feature, operator, value]; string outputs may reference features as
+# {feature}. See goal_features() for the feature names.
+DEFAULT_INSIGHT_RULES: Dict[str, Any] = {
+    "wellness_warning": {
+        "mode": "first",
+        "rules": [
+            {"when": [["weekly.Health", "<", 150]], "then": True}
+        ],
+        "default": False
+    },
+    "recommendation": {
+        "mode": "first",
+        "rules": [
+            {"when": [["weekly.Health", "<", 150], ["total.Learning", ">", 300]],
+             "then": "High learning activity detected but physical wellness is low. "
+                     "Consider rebalancing your growth plan."},
+            {"when": [["weekly.Health", "<", 150]],
+             "then": "Try to reach 150+ minutes of health activities per week for optimal wellness."},
+            {"when": [["total.Learning", ">", 400]],
+             "then": "Great learning consistency! Keep maintaining your study habits."}
+        ],
+        "default": "Your activity pattern looks balanced. Keep tracking your progress!"
+    },
+    "productivity_recommendations": {
+        "mode": "all",
+        "rules": [
+            {"when": [["activity_types", "<", 2]],
+             "then": "Try diversifying your activities across different types for holistic growth."},
+            {"when": [["activities", ">", 10]],
+             "then": "Great consistency! You've logged {activities} activities."},
+            {"when": [["count.Health", "<", 3]],
+             "then": "Consider adding more health activities to your routine."}
+        ],
+        "default": ["Keep up the good work! Continue tracking your progress."]
+    }
+}
+
+FEATURES = ('activities', 'total_value', 'activity_types', 'active_days', 'longest_streak',
+            'consistency_score')
+# Per activity type: count.<type>, total.<type> and weekly.<type> (the weekly window total)
+TYPE_FEATURE_PREFIXES = ('count.', 'total.', 'weekly.')
+
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    '==': operator.eq, '!=': operator.ne
+}
+
+_PLACEHOLDER = re.compile(r'\{([^{}]+)\}')
+
+class RuleError(ValueError):
+    """An insight rule set that does not compile"""
+
+def goal_features(stats: GoalStats) -> Dict[str, Any]:
+    """The feature vector every rule is evaluated against, from one GoalStats"""
+    aggregate = stats.aggregate
+    features: Dict[str, Any] = {
+        "activities": aggregate.count,
+        "total_value": aggregate.total_value,
+        "activity_types": len(aggregate.by_type),
+        "active_days": stats.distinct_days,
+        "longest_streak": stats.longest_streak,
+        "consistency_score": consistency_score(stats.distinct_days, stats.longest_streak)
+    }
+    for activity_type, type_aggregate in aggregate.by_type.items():
+        features["count." + activity_type] = type_aggregate.count
+        features["total." + activity_type] = type_aggregate.total_value
+    for activity_type, total in stats.window_totals.items():
+        features["weekly." + activity_type] = total
+    return features
+
+def _check_feature(name: Any, where: str) -> str:
+    if isinstance(name, str):
+        if name in FEATURES:
+            return name
+        prefix, _, activity_type = name.partition('.')
+        if prefix + '.' in TYPE_FEATURE_PREFIXES and activity_type:
+            return name
+    raise RuleError(f"{where}: unknown feature {name!r}")
+
+def _format_feature(value: Any) -> str:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def _compile_output(value: Any, where: str) -> Callable[[Dict[str, Any]], Any]:
+    """A function building a rule's output; strings become feature templates"""
+    if not isinstance(value, str) or not _PLACEHOLDER.search(value):
+        return lambda features: value
+    for name in _PLACEHOLDER.findall(value):
+        _check_feature(name, where)
+
+    def render(features: Dict[str, Any]) -> str:
+        return _PLACEHOLDER.sub(lambda match: _format_feature(features.get(match.group(1), 0)), value)
+    return render
+
+class DecisionPlan:
+    """Rules compiled once: conditions shared across rules are evaluated once per goal"""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.spec = spec
+        self.fingerprint = hashlib.blake2b(json.dumps(spec, sort_keys=True).encode(),
+                                           digest_size=6).hexdigest()
+        self._conditions: List[Tuple[str, Callable[[Any, Any], bool], Any]] = []
+        self._decisions: Dict[str, Tuple[bool, List[Tuple[Tuple[int, ...], Callable]], Callable]] = {}
+
+        condition_index: Dict[Tuple[str, str, Any], int] = {}
+        for name, decision in spec.items():
+            where = f"decision {name!r}"
+            if not isinstance(decision, dict) or not isinstance(decision.get('rules', []), list):
+                raise RuleError(f"{where}: expected an object with a 'rules' list")
+            mode = decision.get('mode', 'first')
+            if mode not in ('first', 'all'):
+                raise RuleError(f"{where}: mode must be 'first' or 'all', not {mode!r}")
+
+            rules = []
+            for position, rule in enumerate(decision.get('rules', [])):
+                rule_where = f"{where} rule {position}"
+                if not isinstance(rule, dict) or 'then' not in rule:
+                    raise RuleError(f"{rule_where}: expected an object with 'when' and 'then'")
+                indexes = []
+                for condition in rule.get('when', []):
+                    if not isinstance(condition, (list, tuple)) or len(condition) != 3:
+                        raise RuleError(f"{rule_where}: a condition is [feature, operator, value]")
+                    feature, op, threshold = condition
+                    _check_feature(feature, rule_where)
+                    if op not in OPERATORS:
+                        raise RuleError(f"{rule_where}: unknown operator {op!r}")
+                    if isinstance(threshold, (list, dict)):
+                        raise RuleError(f"{rule_where}: compare against a number or string")
+                    key = (feature, op, threshold)
+                    if key not in condition_index:
+                        condition_index[key] = len(self._conditions)
+                        self._conditions.append((feature, OPERATORS[op], threshold))
+                    indexes.append(condition_index[key])
+                rules.append((tuple(indexes), _compile_output(rule['then'], rule_where)))
+
+            default = decision.get('default', [] if mode == 'all' else None)
+            self._decisions[name] = (mode == 'all', rules, _compile_output(default, where))
+
+    @property
+    def decisions(self) -> List[str]:
+        return list(self._decisions)
+
+    def evaluate(self, features: Dict[str, Any],
+                 names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Every decision (or the named ones) for one feature vector"""
+        results: List[Optional[bool]] = [None] * len(self._conditions)
+
+        def holds(index: int) -> bool:
+            result = results[index]
+            if result is None:
+                feature, compare, threshold = self._conditions[index]
+                try:
+                    result = results[index] = bool(compare(features.get(feature, 0), threshold))
+                except TypeError:
+                    result = results[index] = False
+            return result
+
+        decided = {}
+        for name in (names if names is not None else self._decisions):
+            collect_all, rules, default = self._decisions[name]
+            matched = []
+            for indexes, output in rules:
+                if all(holds(index) for index in indexes):
+                    matched.append(output(features))
+                    if not collect_all:
+                        break
+            if collect_all:
+                decided[name] = matched or default(features)
+            else:
+                decided[name] = matched[0] if matched else default(features)
+        return decided
+
+def compile_rules(spec: Dict[str, Any]) -> DecisionPlan:
+    """Compile a rule set, merged over the defaults, into a decision plan"""
+    if not isinstance(spec, dict):
+        raise RuleError("Insight rules must be a JSON object of decisions")
+    return DecisionPlan({**DEFAULT_INSIGHT_RULES, **spec})
+
+class RuleBook:
+    """The current decision plan, recompiled when the rules file changes
+
+    With no path the built-in rules are used. The file's mtime is checked
+    at most every `check_interval` seconds; a file that fails to load or
+    compile leaves the previous plan in place and is reported in
+    `last_error`. Errors at start-up are raised.
+    """
+
+    def __init__(self, path: str = '', check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.last_error: Optional[str] = None
+        self._mtime = self._current_mtime()
+        self._plan = self._load()
+        self._next_check = time.monotonic() + check_interval
+
+    def _current_mtime(self) -> Optional[float]:
+        return os.stat(self.path).st_mtime if self.path else None
+
+    def _load(self) -> DecisionPlan:
+        if not self.path:
+            return compile_rules({})
+        with open(self.path) as rules_file:
+            try:
+                spec = json.load(rules_file)
+            except ValueError as e:
+                raise RuleError(f"{self.path}: {e}")
+        return compile_rules(spec)
+
+    def plan(self) -> DecisionPlan:
+        if self.path and time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                mtime = self._current_mtime()
+                if mtime != self._mtime:
+                    self._plan, self._mtime = self._load(), mtime
+                    self.last_error = None
+            except (OSError, ValueError) as e:
+                self.last_error = str(e)
+        return self._plan
+
+DEFAULT_RULES = RuleBook()
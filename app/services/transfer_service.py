@@ -0,0 +1,147 @@
+import csv
+import gzip
+import io
+import json
+import sys
+from datetime import datetime
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+from app.encoding import dumps
+from app.models.activity import Activity
+from app.repository import BaseRepository
+from app.services.activity_service import validate_activity_data
+
+CSV_COLUMNS = ('id', 'goal_id', 'activity_type', 'value', 'timestamp', 'notes')
+EXPORT_PAGE_SIZE = 10_000
+
+def detect_format(path: str) -> str:
+    """'csv' or 'ndjson' from a file name, ignoring a trailing .gz"""
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    raise ValueError(f"Cannot tell the format of {path!r}; pass --format csv or ndjson")
+
+def open_text(path: str, mode: str = 'r') -> IO[str]:
+    """A text stream for a path, '-' (stdin/stdout) or a .gz file"""
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer if mode == 'r' else sys.stdout.buffer,
+                                encoding='utf-8', newline='' if mode == 'r' else None)
+    if path.endswith('.gz'):
+        # Level 6 rather than gzip's default 9: far faster for a few percent in size
+        return gzip.open(path, mode + 't', compresslevel=6, encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+# ========== READING ==========
+def iter_csv_records(stream: IO[str]) -> Iterator[Tuple[int, Any]]:
+    """(line number, record) per CSV row; a header row names the columns
+
+    Cells arrive as strings: empty ones are dropped so optional fields take
+    their defaults, and goal_id is read as an integer like the JSON API's.
+    """
+    reader = csv.DictReader(stream)
+    for row in reader:
+        record: Any = {name: cell for name, cell in row.items() if name and cell not in ('', None)}
+        if 'goal_id' in record:
+            try:
+                record['goal_id'] = int(record['goal_id'])
+            except ValueError:
+                record = ValueError(f"goal_id must be an integer, not {record['goal_id']!r}")
+        yield reader.line_num, record
+
+def iter_ndjson_records(stream: IO[str]) -> Iterator[Tuple[int, Any]]:
+    """(line number, record) per non-blank NDJSON line"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+
+READERS: Dict[str, Callable[[IO[str]], Iterator[Tuple[int, Any]]]] = {
+    'csv': iter_csv_records,
+    'ndjson': iter_ndjson_records
+}
+
+def iter_valid_chunks(records: Iterable[Tuple[int, Any]], chunk_size: int,
+                      on_error: Callable[[int, str], None]) -> Iterator[List[dict]]:
+    """Validate records as POST /api/activities does and group them into chunks
+
+    Rejected records are reported through on_error(line, message) and skipped.
+    """
+    chunk: List[dict] = []
+    for line_number, record in records:
+        try:
+            if isinstance(record, Exception):
+                raise record
+            chunk.append(validate_activity_data(record))
+        except ValueError as e:
+            on_error(line_number, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def import_activities(repository: BaseRepository, stream: IO[str], fmt: str,
+                      chunk_size: int = 50_000, max_errors: int = 100) -> Dict[str, Any]:
+    """Stream-parse, validate and bulk-load an activity file
+
+    Memory stays bounded by chunk_size whatever the file size (for the
+    on-disk backends). Returns counts plus the first max_errors rejections.
+    """
+    errors: List[Dict[str, Any]] = []
+    failed = 0
+
+    def reject(line_number: int, message: str) -> None:
+        nonlocal failed
+        failed += 1
+        if len(errors) < max_errors:
+            errors.append({"line": line_number, "error": message})
+
+    chunks = iter_valid_chunks(READERS[fmt](stream), chunk_size, reject)
+    created = repository.bulk_load(chunks)
+    return {"created": created, "failed": failed, "errors": errors}
+
+# ========== WRITING ==========
+def iter_export_activities(repository: BaseRepository, goal_ids: Optional[Iterable[Any]] = None,
+                           start: Optional[datetime] = None, end: Optional[datetime] = None,
+                           activity_type: Optional[str] = None,
+                           page_size: int = EXPORT_PAGE_SIZE) -> Iterator[Activity]:
+    """Activities of each goal (default: every goal) in [start, end), by timestamp
+
+    Goals are read page by page with the listing endpoint's keyset cursor,
+    so only one page is held at a time.
+    """
+    for goal_id in (goal_ids if goal_ids is not None else repository.goal_ids()):
+        after = None
+        while True:
+            page = repository.get_goal_page(goal_id, page_size, after=after, start=start, end=end,
+                                            activity_type=activity_type)
+            yield from page
+            if len(page) < page_size:
+                break
+            after = (page[-1].ts, page[-1].id)
+
+def export_activities(activities: Iterable[Activity], stream: IO[str], fmt: str) -> int:
+    """Write activities as CSV (with a header) or NDJSON; returns the row count"""
+    written = 0
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(CSV_COLUMNS)
+        for activity in activities:
+            writer.writerow((activity.id, activity.goal_id, activity.activity_type, activity.value,
+                             activity.timestamp, activity.notes if activity.notes is not None else ''))
+            written += 1
+    else:
+        for activity in activities:
+            # Encoded afresh rather than through to_json(), which would pin
+            # a cached copy on every in-memory activity exported
+            stream.write(dumps(activity.to_dict()).decode())
+            stream.write('\n')
+            written += 1
+    return written
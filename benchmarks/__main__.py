@@ -0,0 +1,78 @@
+"""Benchmark the service end to end
+
+    python -m benchmarks --size 10k --backend concurrent --save baseline.json
+    python -m benchmarks --size 10k --backend concurrent --compare baseline.json
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from benchmarks.generator import DEFAULT_TYPES, SIZES, DatasetSpec
+
+def parse_rows(value: str) -> int:
+    return SIZES[value.lower()] if value.lower() in SIZES else int(value)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=parse_rows, default=SIZES['10k'],
+                        help="rows to load: 10k, 1m, 10m or a number (default 10k)")
+    parser.add_argument('--goals', type=int, default=1000)
+    parser.add_argument('--types', default=','.join(DEFAULT_TYPES),
+                        help="comma-separated activity types")
+    parser.add_argument('--skew', type=float, default=1.1,
+                        help="Zipf exponent of activities per goal (0 = uniform)")
+    parser.add_argument('--span-days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--backend', default=os.environ.get('ACTIVITY_REPOSITORY', 'concurrent'),
+                        help="ACTIVITY_REPOSITORY backend to benchmark")
+    parser.add_argument('--mode', choices=('inprocess', 'http', 'both'), default='both')
+    parser.add_argument('--requests', type=int, default=2000,
+                        help="calls per endpoint / service scenario")
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--trace-allocations', action='store_true',
+                        help="record tracemalloc peaks per scenario (slow)")
+    parser.add_argument('--save', metavar='PATH', help="write the report as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="compare against a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="fractional change that counts as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    # Settings are read from the environment when app.config is imported,
+    # and on-disk backends get a scratch location
+    scratch = tempfile.TemporaryDirectory(prefix='life-design-bench-')
+    os.environ['ACTIVITY_REPOSITORY'] = args.backend
+    os.environ.setdefault('SQLITE_PATH', os.path.join(scratch.name, 'bench.db'))
+    os.environ.setdefault('DATA_DIR', os.path.join(scratch.name, 'data'))
+
+    from app.main import create_app
+    from benchmarks.harness import (run_benchmark, save_report, load_report, compare_reports,
+                                    format_report, format_comparison)
+
+    spec = DatasetSpec(rows=args.size, goals=args.goals, types=tuple(args.types.split(',')),
+                       skew=args.skew, span_days=args.span_days, seed=args.seed)
+    modes = ('inprocess', 'http') if args.mode == 'both' else (args.mode,)
+
+    with scratch:
+        report = run_benchmark(create_app, spec, modes, args.backend, requests=args.requests,
+                               batch_size=args.batch_size, trace_allocations=args.trace_allocations)
+    print(format_report(report))
+
+    if args.save:
+        save_report(report, args.save)
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare:
+        baseline = load_report(args.compare)
+        rows = compare_reports(baseline, report, args.tolerance)
+        print(f"\nCompared with {args.compare} (tolerance {args.tolerance:.0%})")
+        if (baseline["backend"], baseline["dataset"]) != (report["backend"], report["dataset"]):
+            print(f"note: baseline used backend={baseline['backend']} dataset={baseline['dataset']}")
+        print(format_comparison(rows))
+        if any(row["regressed"] for row in rows):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import itertools
+import random
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+# Named dataset sizes
+SIZES = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000
+}
+
+DEFAULT_TYPES = ('Learning', 'Health', 'Work', 'Mindfulness', 'Social')
+
+@dataclass
+class DatasetSpec:
+    """Shape of a synthetic activity dataset
+
+    The same spec and seed always produce the same rows, so numbers from
+    different runs, backends or commits describe the same workload.
+    """
+    rows: int = SIZES['10k']
+    goals: int = 1000
+    types: Tuple[str, ...] = DEFAULT_TYPES
+    # Zipf exponent for how activities spread over goals (0 = uniform)
+    skew: float = 1.1
+    span_days: int = 365
+    # ISO end of the span; defaults to today's midnight so the weekly
+    # insight window sees data
+    end: str = field(default_factory=lambda: datetime.now().replace(
+        hour=0, minute=0, second=0, microsecond=0).isoformat())
+    seed: int = 42
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['types'] = list(self.types)
+        return data
+
+def goal_weights(spec: DatasetSpec) -> List[float]:
+    """Cumulative Zipf weights over goal ids 1..goals"""
+    return list(itertools.accumulate(1 / (rank ** spec.skew) for rank in range(1, spec.goals + 1)))
+
+def sample_goal_ids(spec: DatasetSpec, count: int, seed_offset: int = 1) -> List[int]:
+    """Goal ids drawn with the dataset's skew, for choosing which goals to query"""
+    rng = random.Random(spec.seed + seed_offset)
+    return rng.choices(range(1, spec.goals + 1), cum_weights=goal_weights(spec), k=count)
+
+def generate_activities(spec: DatasetSpec, batch_size: int = 10_000) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the dataset as batches of activity payloads"""
+    rng = random.Random(spec.seed)
+    cum_weights = goal_weights(spec)
+    goal_ids = range(1, spec.goals + 1)
+    end = datetime.fromisoformat(spec.end)
+    span_seconds = spec.span_days * 86400
+
+    produced = 0
+    while produced < spec.rows:
+        size = min(batch_size, spec.rows - produced)
+        goals = rng.choices(goal_ids, cum_weights=cum_weights, k=size)
+        batch = []
+        for goal_id in goals:
+            activity_type = rng.choice(spec.types)
+            batch.append({
+                "goal_id": goal_id,
+                "activity_type": activity_type,
+                "value": float(rng.randint(5, 120)),
+                "timestamp": (end - timedelta(seconds=rng.randrange(span_seconds))).isoformat(),
+                "notes": None
+            })
+        produced += size
+        yield batch
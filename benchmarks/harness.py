@@ -0,0 +1,271 @@
+import http.client
+import json
+import math
+import platform
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from benchmarks.generator import DatasetSpec, generate_activities, sample_goal_ids
+
+# ========== MEASUREMENT ==========
+def percentile(sorted_values: Sequence[float], percent: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def measure(operation: Callable[..., Any], calls: Iterable[tuple], units_per_call: int = 1,
+            trace_allocations: bool = False) -> Dict[str, Any]:
+    """Run operation(*args) for each args tuple, timing every call
+
+    Throughput counts `units_per_call` units per call (rows for batch
+    loads, 1 otherwise). With `trace_allocations`, tracemalloc records the
+    peak traced memory of the phase, at a large cost in speed.
+    """
+    latencies: List[int] = []
+    blocks_before = sys.getallocatedblocks()
+    if trace_allocations:
+        tracemalloc.start()
+
+    started = time.perf_counter()
+    for args in calls:
+        call_started = time.perf_counter_ns()
+        operation(*args)
+        latencies.append(time.perf_counter_ns() - call_started)
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "calls": len(latencies),
+        "seconds": round(elapsed, 4),
+        "throughput": round(len(latencies) * units_per_call / elapsed, 1) if elapsed else 0.0
+    }
+    latencies.sort()
+    for percent in (50, 95, 99):
+        result[f"p{percent}_ms"] = round(percentile(latencies, percent) / 1e6, 4)
+    result["max_ms"] = round(latencies[-1] / 1e6, 4) if latencies else 0.0
+
+    if trace_allocations:
+        result["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    result["retained_blocks"] = sys.getallocatedblocks() - blocks_before
+    result["peak_rss_bytes"] = peak_rss_bytes()
+    return result
+
+# ========== CLIENTS ==========
+class InProcessClient:
+    """Calls the app through Flask's test client, without sockets"""
+    name = 'inprocess'
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                content_type: str = 'application/json') -> int:
+        response = self._client.open(path, method=method, data=body, content_type=content_type)
+        response.get_data()
+        return response.status_code
+
+    def close(self) -> None:
+        pass
+
+class _KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+class HttpClient:
+    """Calls the app over a real socket, served by werkzeug in a background thread"""
+    name = 'http'
+
+    def __init__(self, app):
+        self._server = make_server('127.0.0.1', 0, app, threaded=True,
+                                   request_handler=_KeepAliveHandler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self._connection = http.client.HTTPConnection('127.0.0.1', self._server.server_port)
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                content_type: str = 'application/json') -> int:
+        headers = {'Content-Type': content_type} if body is not None else {}
+        self._connection.request(method, path, body=body, headers=headers)
+        response = self._connection.getresponse()
+        response.read()
+        return response.status
+
+    def close(self) -> None:
+        self._connection.close()
+        self._server.shutdown()
+
+CLIENTS = {client.name: client for client in (InProcessClient, HttpClient)}
+
+def checked(client, method: str, path: str, body: Optional[bytes] = None,
+            content_type: str = 'application/json', expected: Tuple[int, ...] = (200, 201)) -> None:
+    status = client.request(method, path, body, content_type)
+    if status not in expected:
+        raise RuntimeError(f"{method} {path} returned {status}")
+
+# ========== SCENARIOS ==========
+def load_dataset(client, spec: DatasetSpec, batch_size: int, trace_allocations: bool) -> Dict[str, Any]:
+    """Ingest the dataset through POST /api/activities/batch as NDJSON"""
+    batches = ((('\n'.join(json.dumps(record) for record in batch)).encode(),)
+               for batch in generate_activities(spec, batch_size))
+    result = measure(lambda body: checked(client, 'POST', '/api/activities/batch', body,
+                                          'application/x-ndjson'),
+                     batches, trace_allocations=trace_allocations)
+    # Report rows per second, not batches per second
+    result["throughput"] = round(spec.rows / result["seconds"], 1) if result["seconds"] else 0.0
+    result["rows"] = spec.rows
+    return result
+
+def endpoint_scenarios(client, spec: DatasetSpec, requests: int,
+                       trace_allocations: bool) -> Dict[str, Dict[str, Any]]:
+    """Latency and throughput of each endpoint, on goals drawn with the dataset's skew"""
+    goal_ids = sample_goal_ids(spec, requests)
+    new_activity = json.dumps({"goal_id": 1, "activity_type": spec.types[0], "value": 30}).encode()
+
+    scenarios = {
+        "POST /api/activities": (
+            lambda: checked(client, 'POST', '/api/activities', new_activity), [()] * requests),
+        "GET /api/dashboard/{goal_id}": (
+            lambda goal_id: checked(client, 'GET', f'/api/dashboard/{goal_id}'),
+            [(goal_id,) for goal_id in goal_ids]),
+        "GET /api/insights/optimization": (
+            lambda goal_id: checked(client, 'GET', f'/api/insights/optimization?goal_id={goal_id}'),
+            [(goal_id,) for goal_id in goal_ids]),
+        "GET /api/goals/{goal_id}/activities": (
+            lambda goal_id: checked(client, 'GET', f'/api/goals/{goal_id}/activities?limit=100'),
+            [(goal_id,) for goal_id in goal_ids]),
+    }
+    return {name: measure(operation, calls, trace_allocations=trace_allocations)
+            for name, (operation, calls) in scenarios.items()}
+
+def service_scenarios(repository, spec: DatasetSpec, requests: int,
+                      trace_allocations: bool) -> Dict[str, Dict[str, Any]]:
+    """Latency and throughput of each service method, bypassing HTTP and the response cache"""
+    from app.services.activity_service import ActivityService
+    from app.services.insight_service import InsightService
+
+    activity_service = ActivityService(repository)
+    insight_service = InsightService(repository)
+    goal_calls = [(goal_id,) for goal_id in sample_goal_ids(spec, requests, seed_offset=2)]
+
+    def create_activity():
+        activity_service.create_activity({"goal_id": 1, "activity_type": spec.types[0], "value": 30.0})
+
+    scenarios = {
+        "ActivityService.create_activity": (create_activity, [()] * requests),
+        "ActivityService.get_goal_summary": (activity_service.get_goal_summary, goal_calls),
+        "ActivityService.calculate_consistency_score": (activity_service.calculate_consistency_score, goal_calls),
+        "InsightService.get_weekly_health_total": (insight_service.get_weekly_health_total, goal_calls),
+        "InsightService.generate_wellness_insights": (insight_service.generate_wellness_insights, goal_calls),
+        "InsightService.get_productivity_recommendation": (insight_service.get_productivity_recommendation, goal_calls),
+    }
+    return {name: measure(operation, calls, trace_allocations=trace_allocations)
+            for name, (operation, calls) in scenarios.items()}
+
+def run_benchmark(create_app: Callable, spec: DatasetSpec, modes: Sequence[str], backend: str,
+                  requests: int = 2000, batch_size: int = 10_000,
+                  trace_allocations: bool = False) -> Dict[str, Any]:
+    """Run every scenario against a fresh app per mode and return the report"""
+    report: Dict[str, Any] = {
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": backend,
+        "dataset": spec.to_dict(),
+        "requests": requests,
+        "results": {}
+    }
+
+    for mode in modes:
+        app = create_app('production')
+        client = CLIENTS[mode](app)
+        try:
+            results = {"load": load_dataset(client, spec, batch_size, trace_allocations)}
+            results.update(endpoint_scenarios(client, spec, requests, trace_allocations))
+            if mode == 'inprocess':
+                results.update(service_scenarios(app.extensions['activity_repository'], spec,
+                                                 requests, trace_allocations))
+        finally:
+            client.close()
+            close = getattr(app.extensions['activity_repository'], 'close', None)
+            if close is not None:
+                close()
+        report["results"][mode] = results
+
+    report["peak_rss_bytes"] = peak_rss_bytes()
+    return report
+
+# ========== BASELINES ==========
+def save_report(report: Dict[str, Any], path: str) -> None:
+    with open(path, 'w') as baseline_file:
+        json.dump(report, baseline_file, indent=2)
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any],
+                    tolerance: float = 0.10) -> List[Dict[str, Any]]:
+    """Per-scenario throughput and p95 changes against a baseline
+
+    A scenario regresses when its throughput falls, or its p95 latency
+    rises, by more than `tolerance` (a fraction).
+    """
+    rows = []
+    for mode, results in current["results"].items():
+        for name, result in results.items():
+            before = baseline.get("results", {}).get(mode, {}).get(name)
+            if before is None:
+                continue
+            throughput_change = (result["throughput"] / before["throughput"] - 1) \
+                if before["throughput"] else 0.0
+            p95_change = (result["p95_ms"] / before["p95_ms"] - 1) if before["p95_ms"] else 0.0
+            rows.append({
+                "mode": mode,
+                "scenario": name,
+                "throughput_before": before["throughput"],
+                "throughput_after": result["throughput"],
+                "throughput_change": round(throughput_change, 4),
+                "p95_before_ms": before["p95_ms"],
+                "p95_after_ms": result["p95_ms"],
+                "p95_change": round(p95_change, 4),
+                "regressed": throughput_change < -tolerance or p95_change > tolerance
+            })
+    return rows
+
+# ========== OUTPUT ==========
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f"backend={report['backend']} rows={report['dataset']['rows']} "
+             f"goals={report['dataset']['goals']} skew={report['dataset']['skew']} "
+             f"peak_rss={report['peak_rss_bytes'] / 2**20:.1f} MiB"]
+    header = f"{'scenario':<50} {'ops/s':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    for mode, results in report["results"].items():
+        lines += ['', f"[{mode}]", header]
+        for name, result in results.items():
+            lines.append(f"{name:<50} {result['throughput']:>12,.1f} {result['p50_ms']:>9.3f} "
+                         f"{result['p95_ms']:>9.3f} {result['p99_ms']:>9.3f}")
+    return '\n'.join(lines)
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'mode':<10} {'scenario':<50} {'ops/s':>9} {'p95':>9}"]
+    for row in rows:
+        flag = '  REGRESSED' if row["regressed"] else ''
+        lines.append(f"{row['mode']:<10} {row['scenario']:<50} "
+                     f"{row['throughput_change']:>+9.1%} {row['p95_change']:>+9.1%}{flag}")
+    return '\n'.join(lines)
@@ -0,0 +1,108 @@
+"""Bulk import and export of activity history
+
+    python cli.py import history.csv
+    python cli.py import backfill.ndjson.gz --chunk-size 100000
+    python cli.py export --goal 1 --goal 2 --from 2024-01-01T00:00:00 -o goals.ndjson
+    python cli.py export --format csv > everything.csv
+
+The backend comes from ACTIVITY_REPOSITORY (or --backend) and must keep its
+data on disk: sqlite or durable. Imports validate every record as
+POST /api/activities does and should run while the service is stopped.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+PERSISTENT_BACKENDS = ('sqlite', 'durable')
+FORMATS = ('csv', 'ndjson')
+
+def parse_time(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ISO timestamp: {value}")
+
+def run_import(repository, args) -> int:
+    from app.services.transfer_service import detect_format, import_activities, open_text
+
+    fmt = args.format or detect_format(args.path)
+    started = time.perf_counter()
+    with open_text(args.path) as stream:
+        result = import_activities(repository, stream, fmt, chunk_size=args.chunk_size,
+                                   max_errors=args.max_errors)
+    seconds = time.perf_counter() - started
+
+    for error in result['errors']:
+        print(f"{args.path}:{error['line']}: {error['error']}", file=sys.stderr)
+    if result['failed'] > len(result['errors']):
+        print(f"... {result['failed'] - len(result['errors'])} more rejected", file=sys.stderr)
+    print(f"Imported {result['created']} activities in {seconds:.1f}s "
+          f"({result['created'] / seconds if seconds else 0:,.0f}/s), rejected {result['failed']}",
+          file=sys.stderr)
+    return 1 if result['failed'] else 0
+
+def run_export(repository, args) -> int:
+    from app.services.transfer_service import (detect_format, export_activities,
+                                               iter_export_activities, open_text)
+
+    fmt = args.format or (detect_format(args.output) if args.output != '-' else 'ndjson')
+    started = time.perf_counter()
+    activities = iter_export_activities(repository, args.goal, args.start, args.end, args.activity_type)
+    with open_text(args.output, 'w') as stream:
+        written = export_activities(activities, stream, fmt)
+    print(f"Exported {written} activities in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python cli.py', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', default=os.environ.get('ACTIVITY_REPOSITORY', 'concurrent'),
+                        help="ACTIVITY_REPOSITORY backend (sqlite or durable)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    importer = commands.add_parser('import', help="load a CSV or NDJSON file ('-' for stdin)")
+    importer.add_argument('path')
+    importer.add_argument('--format', choices=FORMATS,
+                          help="default: from the file extension (.csv, .ndjson, .jsonl, plus .gz)")
+    importer.add_argument('--chunk-size', type=int, default=50_000,
+                          help="records validated and inserted per transaction")
+    importer.add_argument('--max-errors', type=int, default=100,
+                          help="rejected records to print (all are counted)")
+
+    exporter = commands.add_parser('export', help="write activities as NDJSON or CSV")
+    exporter.add_argument('--goal', type=int, action='append',
+                          help="goal to export (repeatable; default every goal)")
+    exporter.add_argument('--from', dest='start', type=parse_time, help="inclusive ISO timestamp")
+    exporter.add_argument('--to', dest='end', type=parse_time, help="exclusive ISO timestamp")
+    exporter.add_argument('--activity-type')
+    exporter.add_argument('--format', choices=FORMATS,
+                          help="default: from the output extension, else ndjson")
+    exporter.add_argument('-o', '--output', default='-', help="file to write ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    if args.backend not in PERSISTENT_BACKENDS:
+        parser.error(f"backend {args.backend!r} keeps nothing after this process exits; "
+                     f"use one of {', '.join(PERSISTENT_BACKENDS)}")
+
+    # Settings are read from the environment when app.config is imported
+    os.environ['ACTIVITY_REPOSITORY'] = args.backend
+    from app.config import load_settings
+    from app.repository.activity_repository import get_activity_repository
+
+    repository = get_activity_repository(load_settings())
+    try:
+        if args.command == 'import':
+            return run_import(repository, args)
+        return run_export(repository, args)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        close = getattr(repository, 'close', None)
+        if close is not None:
+            close()
+
+if __name__ == '__main__':
+    sys.exit(main())
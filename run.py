@@ -1,8 +1,29 @@
+import logging
+import sys
 from app.main import create_app
 
-app = create_app()
-
 if __name__ == '__main__':
-    print("Starting Life Design Service...")
-    print("API available at: http://localhost:5000")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    if '--asgi' in sys.argv[1:]:
+        # Async serving mode: python run.py --asgi (requires uvicorn)
+        import uvicorn
+        from app.asgi import create_asgi_app
+        print("Starting Life Design Service (ASGI)...")
+        print("API available at: http://localhost:5000")
+        uvicorn.run(create_asgi_app(), host='0.0.0.0', port=5000)
+    elif '--prefork' in sys.argv[1:]:
+        # Production mode: python run.py --prefork (needs ACTIVITY_REPOSITORY=sqlite)
+        from app.config import load_settings
+        from app.server import PreforkServer
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(message)s')
+        print("Starting Life Design Service (pre-fork)...")
+        server = PreforkServer.from_settings(lambda: create_app('production', background_jobs=False),
+                                             load_settings('production'), host='0.0.0.0', port=5000)
+        try:
+            server.run()
+        except ValueError as e:
+            sys.exit(f"error: {e}")
+    else:
+        app = create_app()
+        print("Starting Life Design Service...")
+        print("API available at: http://localhost:5000")
+        app.run(debug=app.config['DEBUG'], host='0.0.0.0', port=5000)
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from app.asgi import create_asgi_app
+from app.main import create_app
+from app.repository.activity_repository import InMemoryActivityRepository
+from app.repository.concurrent_repository import ConcurrentInMemoryActivityRepository
+from app.repository.durable_repository import DurableInMemoryActivityRepository
+from app.repository.sqlite_repository import SQLiteActivityRepository
+
+BACKENDS = ['memory', 'concurrent', 'durable', 'sqlite', 'columnar', 'sharded']
+
+def activity_data(goal_id=1, activity_type='Health', value=1.0,
+                  timestamp='2024-01-01T08:00:00', notes=None) -> dict:
+    """A repository-ready activity payload"""
+    return {'goal_id': goal_id, 'activity_type': activity_type, 'value': value,
+            'timestamp': timestamp, 'notes': notes}
+
+@pytest.fixture(params=BACKENDS)
+def repository(request, tmp_path):
+    """One empty repository of each backend"""
+    backend = request.param
+    if backend == 'memory':
+        repository = InMemoryActivityRepository()
+    elif backend == 'concurrent':
+        repository = ConcurrentInMemoryActivityRepository()
+    elif backend == 'durable':
+        repository = DurableInMemoryActivityRepository(str(tmp_path), fsync_policy='snapshot')
+    elif backend == 'sqlite':
+        repository = SQLiteActivityRepository(str(tmp_path / 'activities.db'))
+    elif backend == 'columnar':
+        pytest.importorskip('numpy')
+        from app.repository.columnar_repository import ColumnarActivityRepository
+        repository = ColumnarActivityRepository()
+    else:
+        from app.repository.sharded_repository import ShardedActivityRepository
+        repository = ShardedActivityRepository(2)
+
+    yield repository
+    if hasattr(repository, 'close'):
+        repository.close()
+
+@pytest.fixture
+def app():
+    """The Flask app on the default (concurrent) backend, without background threads"""
+    app = create_app('default', background_jobs=False)
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def call(app, method, path, body=b'', query_string=b'', headers=()):
+    """Run one request through the ASGI app, returning (status, body bytes)"""
+    received = []
+    sent = []
+
+    async def receive():
+        if received:
+            return {'type': 'http.disconnect'}
+        received.append(True)
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query_string,
+             'headers': [(b'content-type', b'application/json'), *headers]}
+    asyncio.run(app(scope, receive, send))
+    status = next(m['status'] for m in sent if m['type'] == 'http.response.start')
+    return status, b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body')
+
+@pytest.fixture
+def asgi_app():
+    return create_asgi_app('default')
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from tests.conftest import call
+
+def test_metrics_use_the_flask_route_labels(asgi_app):
+    activity = {'goal_id': 4, 'activity_type': 'Health', 'value': 20}
+    assert call(asgi_app, 'POST', '/api/activities', json.dumps(activity).encode())[0] == 201
+    assert call(asgi_app, 'GET', '/api/dashboard/4')[0] == 200
+    assert call(asgi_app, 'GET', '/api/no-such-route')[0] == 404
+
+    status, body = call(asgi_app, 'GET', '/api/metrics')
+    text = body.decode()
+    assert status == 200
+    assert 'route="/api/dashboard/<int:goal_id>",status="200"' in text
+    assert 'function="DashboardService.build_dashboard"' in text
+    assert 'method="get_goal_version"' in text
+    assert 'no-such-route' not in text
+
+def test_profiles_endpoint(asgi_app):
+    asgi_app.settings['PROFILING_ENABLED'] = True
+    call(asgi_app, 'GET', '/api/health', query_string=b'profile=1')
+
+    status, body = call(asgi_app, 'GET', '/api/metrics/profiles')
+    profiles = json.loads(body)
+    assert status == 200
+    assert profiles['enabled'] is True
+    assert [entry['path'] for entry in profiles['profiles']] == ['/api/health?profile=1']
+
+@pytest.mark.parametrize('method, path, body, query_string', [
+    ('GET', '/api/activities', b'', b''),
+    ('POST', '/api/activities', b'{"goal_id": 1,', b''),
+    ('POST', '/api/activities/batch', b'[{"goal_id": 1', b''),
+    ('POST', '/api/insights/bulk', b'not json', b''),
+    ('GET', '/api/leaderboard', b'', b'k=0'),
+    ('GET', '/api/goals/1/activities', b'', b'limit=0'),
+    ('GET', '/api/goals/1/stats', b'', b'quantiles=2'),
+    ('GET', '/api/insights/optimization', b'', b'goal_id='),
+    ('GET', '/api/no-such-route', b'', b''),
+])
+def test_flask_and_asgi_agree_on_errors(asgi_app, client, method, path, body, query_string):
+    status, asgi_body = call(asgi_app, method, path, body, query_string)
+    response = client.open(path, method=method, data=body, query_string=query_string.decode(),
+                           content_type='application/json')
+    assert status == response.status_code >= 400
+    assert json.loads(asgi_body) == response.get_json()
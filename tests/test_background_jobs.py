@@ -0,0 +1,33 @@
+import logging
+
+from app.api.cache import ResponseCache
+from app.main import BACKGROUND_JOBS, create_app, start_jobs, stop_background_jobs
+from app.repository.activity_repository import InMemoryActivityRepository
+from app.repository.concurrent_repository import ConcurrentInMemoryActivityRepository
+from app.services.rules import RuleBook
+
+SETTINGS = {'RAW_RETENTION_DAYS': 7, 'PRECOMPUTE_WORKERS': 2}
+
+def test_no_jobs_on_a_backend_that_is_not_thread_safe(caplog):
+    with caplog.at_level(logging.WARNING):
+        jobs = start_jobs(InMemoryActivityRepository(), ResponseCache(), RuleBook(), SETTINGS)
+    assert jobs == dict.fromkeys(BACKGROUND_JOBS)
+    assert 'not thread-safe' in caplog.text
+
+def test_every_job_starts_on_a_thread_safe_backend():
+    jobs = start_jobs(ConcurrentInMemoryActivityRepository(), ResponseCache(), RuleBook(), SETTINGS)
+    try:
+        assert all(jobs[name] is not None for name in BACKGROUND_JOBS)
+        assert jobs['compactor'].retention_days == 7
+    finally:
+        for job in jobs.values():
+            job.stop()
+
+def test_app_extensions_follow_the_gate():
+    app = create_app('default')
+    try:
+        assert app.extensions['precompute'] is not None
+        assert app.extensions['dashboard_stream'] is not None
+    finally:
+        stop_background_jobs(app)
+    assert all(app.extensions[name] is None for name in BACKGROUND_JOBS)
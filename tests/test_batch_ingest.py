@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from app.repository.activity_repository import InMemoryActivityRepository
+from app.repository.concurrent_repository import ConcurrentInMemoryActivityRepository
+from tests.conftest import activity_data
+
+def record(**overrides):
+    return {'goal_id': 1, 'activity_type': 'Health', 'value': 30,
+            'timestamp': '2024-01-01T08:00:00', **overrides}
+
+def test_batch_reports_invalid_records_and_stores_the_rest(client):
+    response = client.post('/api/activities/batch', json=[
+        record(),
+        record(goal_id=[1]),
+        record(activity_type={'a': 1}),
+        record(goal_id=True),
+        record(activity_type=''),
+        record(value='lots'),
+        record(timestamp=1700000000),
+        {'goal_id': 1, 'value': 5},
+        record(value=15),
+    ])
+    body = response.get_json()
+
+    assert response.status_code == 207
+    assert body['status'] == 'partial'
+    assert body['created'] == 2
+    assert [error['index'] for error in body['errors']] == [1, 2, 3, 4, 5, 6, 7]
+    assert body['errors'][-1]['error'] == 'Missing required field: activity_type'
+
+    summary = client.get('/api/dashboard/1').get_json()['summary']
+    assert summary['total_activities'] == 2
+    assert summary['total_value'] == 45.0
+
+def test_batch_of_valid_records(client):
+    response = client.post('/api/activities/batch', json={'activities': [record(goal_id=goal_id)
+                                                                         for goal_id in (1, 2, 2)]})
+    assert response.status_code == 201
+    assert response.get_json()['created'] == 3
+    assert client.get('/api/dashboard/2').get_json()['summary']['total_activities'] == 2
+
+def test_ndjson_batch_reports_lines_that_are_not_json(client):
+    lines = [json.dumps(record()), '{not json', '', json.dumps(record(goal_id='1'))]
+    response = client.post('/api/activities/batch', data='\n'.join(lines),
+                           content_type='application/x-ndjson')
+    body = response.get_json()
+
+    assert response.status_code == 207
+    assert body['created'] == 1
+    assert [error['index'] for error in body['errors']] == [1, 2]
+    assert body['errors'][0]['error'].startswith('Invalid JSON')
+
+@pytest.mark.parametrize('payload', ['{"goal_id": 1}', 'not json at all', '42'])
+def test_batch_body_that_is_not_a_list_fails_whole(client, payload):
+    response = client.post('/api/activities/batch', data=payload, content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+
+def test_single_activity_rejects_non_string_timestamp(app, client):
+    response = client.post('/api/activities', json=record(timestamp=True))
+    assert response.status_code == 400
+    assert app.extensions['activity_repository'].get_all() == []
+
+@pytest.mark.parametrize('repository_class', [InMemoryActivityRepository,
+                                              ConcurrentInMemoryActivityRepository])
+def test_rejected_batch_leaves_the_store_unchanged(repository_class):
+    repository = repository_class()
+    kept = repository.add(activity_data(goal_id=3))
+
+    for batch in ([activity_data(), activity_data(goal_id=[1])],
+                  [activity_data(), activity_data(activity_type={'a': 1})],
+                  [activity_data(value='5')]):
+        with pytest.raises(TypeError):
+            repository.add_many(batch)
+
+    assert repository.get_all() == [kept]
+    assert repository.get_goal_aggregate(1).count == 0
+    assert repository.goal_ids() == [3]
+
+    # The next id is not one a failed batch could have left a row under
+    added = repository.add(activity_data())
+    assert added.id != kept.id
+    assert repository.get_by_goal(1) == [added]
+
+def test_over_long_activity_type_is_a_record_error(client):
+    response = client.post('/api/activities/batch', json=[record(), record(activity_type='x' * 70_000)])
+    body = response.get_json()
+
+    assert response.status_code == 207
+    assert body['created'] == 1
+    assert body['errors'][0]['index'] == 1
+    assert '65535 bytes' in body['errors'][0]['error']
+    assert client.post('/api/activities', json=record(activity_type='é' * 40_000)).status_code == 400
@@ -0,0 +1,98 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.repository.activity_repository import InMemoryActivityRepository
+from app.services.transfer_service import (detect_format, export_activities, import_activities,
+                                           iter_export_activities, open_text)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CSV = """goal_id,activity_type,value,timestamp,notes
+1,Health,30,2024-01-01T08:00:00,morning run
+1,Learning,45,2024-01-02T09:00:00,
+2,Health,20,2024-01-03T07:30:00,
+x,Health,10,2024-01-04T07:30:00,
+2,,5,2024-01-05T07:30:00,
+"""
+
+def cli(*args, tmp_path, backend='sqlite'):
+    """Run cli.py in a fresh interpreter, as settings are read from the environment at import"""
+    env = {**os.environ, 'SQLITE_PATH': str(tmp_path / 'activities.db'), 'DATA_DIR': str(tmp_path / 'data')}
+    env.pop('ACTIVITY_REPOSITORY', None)
+    if backend:
+        args = ('--backend', backend) + args
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'cli.py'), *args], cwd=tmp_path, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+def test_import_then_export_round_trips(tmp_path):
+    source = tmp_path / 'history.csv'
+    source.write_text(CSV)
+
+    imported = cli('import', str(source), '--chunk-size', '2', tmp_path=tmp_path)
+    assert imported.returncode == 1
+    assert f"{source}:5: goal_id must be an integer" in imported.stderr
+    assert "Imported 3 activities" in imported.stderr and "rejected 2" in imported.stderr
+
+    exported = cli('export', '--goal', '1', '--goal', '2', tmp_path=tmp_path)
+    assert exported.returncode == 0
+    rows = [json.loads(line) for line in exported.stdout.splitlines()]
+    assert [(row['goal_id'], row['activity_type'], row['value'], row['timestamp'], row['notes'])
+            for row in rows] == [
+        (1, 'Health', 30, '2024-01-01T08:00:00', 'morning run'),
+        (1, 'Learning', 45, '2024-01-02T09:00:00', None),
+        (2, 'Health', 20, '2024-01-03T07:30:00', None),
+    ]
+
+    window = cli('export', '--from', '2024-01-02T00:00:00', '--activity-type', 'Health',
+                 '-o', 'health.csv.gz', tmp_path=tmp_path)
+    assert window.returncode == 0
+    with open_text(str(tmp_path / 'health.csv.gz')) as stream:
+        assert stream.read().splitlines()[1:] == ['3,2,Health,20.0,2024-01-03T07:30:00,']
+
+def test_csv_export_imports_into_another_backend(tmp_path):
+    (tmp_path / 'history.csv').write_text(CSV)
+    cli('import', 'history.csv', tmp_path=tmp_path)
+    assert cli('export', '-o', 'all.csv', tmp_path=tmp_path).returncode == 0
+
+    assert cli('import', 'all.csv', tmp_path=tmp_path, backend='durable').returncode == 0
+    exported = cli('export', tmp_path=tmp_path, backend='durable')
+    assert [json.loads(line)['value'] for line in exported.stdout.splitlines()] == [30, 45, 20]
+
+def test_in_memory_backends_are_refused(tmp_path):
+    result = cli('export', tmp_path=tmp_path, backend=None)
+    assert result.returncode == 2
+    assert "keeps nothing after this process exits" in result.stderr
+
+def test_import_reports_every_rejection_up_to_max_errors():
+    repository = InMemoryActivityRepository()
+    lines = ['{"goal_id": 1, "activity_type": "Health", "value": 1}', 'not json', '',
+             '{"goal_id": 1}', '{"goal_id": 2, "activity_type": "Health", "value": 2}']
+    result = import_activities(repository, io.StringIO('\n'.join(lines)), 'ndjson',
+                               chunk_size=1, max_errors=1)
+
+    assert (result['created'], result['failed']) == (2, 2)
+    assert [error['line'] for error in result['errors']] == [2]
+    assert result['errors'][0]['error'].startswith('Invalid JSON')
+
+def test_export_pages_through_every_goal():
+    repository = InMemoryActivityRepository()
+    repository.add_many([{'goal_id': goal_id, 'activity_type': 'Health', 'value': value,
+                          'timestamp': f'2024-01-01T0{value}:00:00'}
+                         for goal_id in (1, 2) for value in range(5)])
+    stream = io.StringIO()
+    written = export_activities(iter_export_activities(repository, page_size=2), stream, 'ndjson')
+
+    rows = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert written == 10
+    assert [(row['goal_id'], row['value']) for row in rows] == [(g, v) for g in (1, 2) for v in range(5)]
+
+def test_format_comes_from_the_extension():
+    assert detect_format('a.csv.gz') == 'csv'
+    assert detect_format('a.jsonl') == 'ndjson'
+    with pytest.raises(ValueError):
+        detect_format('a.txt')
@@ -0,0 +1,75 @@
+import random
+from datetime import timedelta
+
+import pytest
+
+from app.models.activity import epoch_day_to_datetime, today_epoch_day
+from app.repository.activity_repository import InMemoryActivityRepository
+from app.repository.compactor import RetentionCompactor, start_compactor
+from tests.conftest import activity_data
+
+FIRST_DAY = 19_800
+
+def load(repository, seed=2):
+    rnd = random.Random(seed)
+    repository.add_many([
+        activity_data(goal_id=rnd.randrange(1, 4), activity_type=rnd.choice(['Health', 'Learning']),
+                      value=float(rnd.randrange(1, 30)),
+                      timestamp=(epoch_day_to_datetime(FIRST_DAY) + timedelta(
+                          minutes=rnd.randrange(60 * 24 * 20))).isoformat())
+        for _ in range(200)
+    ])
+
+def summaries(repository):
+    """Everything that must survive compaction, per goal"""
+    start, end = epoch_day_to_datetime(FIRST_DAY), epoch_day_to_datetime(FIRST_DAY + 20)
+    return {goal_id: (repository.get_goal_aggregate(goal_id).to_summary(),
+                      repository.get_streak_stats(goal_id),
+                      repository.get_day_totals(goal_id, FIRST_DAY + 3, FIRST_DAY + 12),
+                      repository.sum_by_type(goal_id, start, end))
+            for goal_id in (1, 2, 3)}
+
+def test_compaction_keeps_summaries_and_drops_old_rows(repository):
+    load(repository)
+    before = summaries(repository)
+    versions = {goal_id: repository.get_goal_version(goal_id) for goal_id in (1, 2, 3)}
+    rows = len(repository.get_all())
+    boundary = FIRST_DAY + 10
+    old_rows = sum(1 for a in repository.get_all() if a.day < boundary)
+
+    dropped = repository.compact(boundary)
+
+    # Backends without rollups keep every row
+    assert dropped in (0, old_rows)
+    assert summaries(repository) == before
+    assert len(repository.get_all()) == rows - dropped
+    if dropped:
+        assert all(a.day >= boundary for a in repository.get_all())
+        assert all(repository.get_goal_version(goal_id) > versions[goal_id] for goal_id in (1, 2, 3))
+
+def test_writes_after_compaction_are_counted_once():
+    repository = InMemoryActivityRepository()
+    load(repository)
+    repository.compact(FIRST_DAY + 10)
+    totals = repository.sum_by_type(1)
+    repository.add(activity_data(goal_id=1, activity_type='Health', value=100,
+                                 timestamp=epoch_day_to_datetime(FIRST_DAY + 2).isoformat()))
+
+    assert repository.sum_by_type(1)['Health'] == totals['Health'] + 100
+
+def test_retention_compactor_keeps_the_window():
+    repository = InMemoryActivityRepository()
+    today = today_epoch_day()
+    for days_ago in (0, 1, 2, 5, 30):
+        repository.add(activity_data(timestamp=epoch_day_to_datetime(today - days_ago).isoformat()))
+
+    compactor = RetentionCompactor(repository, retention_days=3)
+    assert compactor.run_once() == 2
+    assert sorted(today - a.day for a in repository.get_all()) == [0, 1, 2]
+    assert compactor.rows_compacted == 2
+    assert repository.get_goal_aggregate(1).count == 5
+
+def test_compactor_is_off_without_a_retention_window():
+    assert start_compactor(InMemoryActivityRepository(), {'RAW_RETENTION_DAYS': 0}) is None
+    with pytest.raises(ValueError):
+        RetentionCompactor(InMemoryActivityRepository(), retention_days=0)
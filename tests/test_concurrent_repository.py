@@ -0,0 +1,102 @@
+import random
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.repository.concurrent_repository import ConcurrentInMemoryActivityRepository
+from app.models.activity import today_epoch_day
+from tests.conftest import activity_data
+
+WRITERS = 8
+BATCHES = 40
+GOALS = 12
+
+@pytest.fixture
+def fast_switching():
+    """Switch threads as often as possible so races show up in a short test"""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+def random_activity(rnd: random.Random) -> dict:
+    moment = datetime(2024, 1, 1) + timedelta(days=rnd.randrange(30), minutes=rnd.randrange(1440))
+    return activity_data(goal_id=rnd.randrange(GOALS), activity_type=rnd.choice(['Health', 'Learning']),
+                         value=float(rnd.randrange(1, 100)), timestamp=moment.isoformat())
+
+def test_concurrent_writers_and_readers_stay_consistent(fast_switching):
+    repository = ConcurrentInMemoryActivityRepository(stripes=4)
+    errors = []
+    writing = threading.Event()
+    writing.set()
+
+    def write(seed: int) -> None:
+        rnd = random.Random(seed)
+        try:
+            for batch in range(BATCHES):
+                if batch % 2:
+                    repository.add(random_activity(rnd))
+                else:
+                    repository.add_many([random_activity(rnd) for _ in range(rnd.randrange(1, 20))])
+        except Exception as e:
+            errors.append(e)
+
+    def read() -> None:
+        rnd = random.Random()
+        try:
+            while writing.is_set():
+                goal_id = rnd.randrange(GOALS)
+                aggregate = repository.get_goal_aggregate(goal_id)
+                assert aggregate.count == sum(t.count for t in aggregate.by_type.values())
+                repository.get_goal_stats(None, today_epoch_day() - 6, today_epoch_day())
+                repository.get_goal_page(goal_id, 10)
+                repository.get_goal_sketches(goal_id).combined()
+                repository.get_by_type('Health')
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=write, args=(seed,)) for seed in range(WRITERS)]
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    writing.clear()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
+
+    activities = repository.get_all()
+    assert len({a.id for a in activities}) == len(activities)
+    for goal_id in range(GOALS):
+        rows = [a for a in activities if a.goal_id == goal_id]
+        aggregate = repository.get_goal_aggregate(goal_id)
+        assert aggregate.count == len(rows)
+        assert aggregate.total_value == pytest.approx(sum(a.value for a in rows))
+        assert [day.isoformat() for day in repository.get_active_dates(goal_id)] == \
+            sorted({a.timestamp[:10] for a in rows})
+        assert repository.get_goal_sketches(goal_id).combined().values.count == len(rows)
+        assert len(repository.get_goal_page(goal_id, len(rows) + 1)) == len(rows)
+
+def test_ids_are_unique_across_threads():
+    repository = ConcurrentInMemoryActivityRepository()
+    ids = []
+    lock = threading.Lock()
+
+    def write() -> None:
+        added = [repository.add(activity_data()).id for _ in range(200)]
+        with lock:
+            ids.extend(added)
+
+    threads = [threading.Thread(target=write) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(ids)) == 1200
+    assert repository.get_goal_aggregate(1).count == 1200
+    assert repository.get_goal_version(1) == 1200
@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+from app.repository.durable_repository import DurableInMemoryActivityRepository, encode_activity
+from app.models.activity import Activity
+from tests.conftest import activity_data
+
+def open_repository(data_dir, **kwargs):
+    return DurableInMemoryActivityRepository(str(data_dir), fsync_policy='snapshot', **kwargs)
+
+def stored(repository):
+    return sorted((a.id, a.goal_id, a.activity_type, a.value, a.ts, a.notes) for a in repository.get_all())
+
+def test_wal_is_replayed_on_reopen(tmp_path):
+    repository = open_repository(tmp_path)
+    repository.add(activity_data(notes='first'))
+    repository.add_many([activity_data(goal_id=2, value=2.5), activity_data(activity_type='Learning')])
+    before = stored(repository)
+    repository.close()
+
+    reopened = open_repository(tmp_path)
+    assert stored(reopened) == before
+    assert reopened.recovery_stats['wal_records'] == 3
+    assert reopened.get_goal_aggregate(1).count == 2
+    # Ids continue after the replayed ones
+    assert reopened.add(activity_data()).id == 4
+    reopened.close()
+
+def test_torn_tail_is_cut_off(tmp_path):
+    repository = open_repository(tmp_path)
+    repository.add_many([activity_data(value=float(value)) for value in range(5)])
+    before = stored(repository)
+    repository.close()
+
+    # A crash part-way through an append leaves half a record behind
+    wal_path = os.path.join(tmp_path, 'activities.wal')
+    intact_size = os.path.getsize(wal_path)
+    torn = encode_activity(Activity(id=6, **activity_data(value=99.0)))
+    with open(wal_path, 'ab') as wal_file:
+        wal_file.write(torn[:len(torn) // 2])
+
+    reopened = open_repository(tmp_path)
+    assert stored(reopened) == before
+    assert os.path.getsize(wal_path) == intact_size
+
+    # Writes after recovery append to the clean end and survive the next restart
+    reopened.add(activity_data(value=7.0))
+    after = stored(reopened)
+    reopened.close()
+    assert stored(open_repository(tmp_path)) == after
+
+def test_corrupt_record_stops_replay(tmp_path):
+    repository = open_repository(tmp_path)
+    for value in range(4):
+        repository.add(activity_data(value=float(value)))
+    repository.close()
+
+    wal_path = os.path.join(tmp_path, 'activities.wal')
+    record_size = os.path.getsize(wal_path) // 4
+    with open(wal_path, 'r+b') as wal_file:
+        # Flip a payload byte of the third record so its crc no longer matches
+        wal_file.seek(2 * record_size + record_size - 1)
+        byte = wal_file.read(1)
+        wal_file.seek(-1, os.SEEK_CUR)
+        wal_file.write(bytes([byte[0] ^ 0xFF]))
+
+    reopened = open_repository(tmp_path)
+    assert [a.value for a in sorted(reopened.get_all(), key=lambda a: a.id)] == [0.0, 1.0]
+    reopened.close()
+
+def test_snapshot_plus_wal_tail(tmp_path):
+    repository = open_repository(tmp_path)
+    repository.add_many([activity_data(goal_id=goal_id) for goal_id in range(1, 11)])
+    assert repository.snapshot() == 10
+    repository.add_many([activity_data(goal_id=3, value=5.0), activity_data(goal_id=11)])
+    before = stored(repository)
+    repository.close()
+
+    reopened = open_repository(tmp_path)
+    assert stored(reopened) == before
+    assert reopened.recovery_stats['snapshot_records'] == 10
+    assert reopened.recovery_stats['wal_records'] == 2
+    assert reopened.get_goal_aggregate(3).total_value == 6.0
+    reopened.close()
+
+def test_rejected_batch_never_reaches_the_log(tmp_path):
+    repository = open_repository(tmp_path)
+    repository.add(activity_data())
+    try:
+        repository.add_many([activity_data(), activity_data(activity_type=['not', 'hashable'])])
+    except TypeError:
+        pass
+    repository.close()
+
+    reopened = open_repository(tmp_path)
+    assert len(reopened.get_all()) == 1
+    reopened.close()
+
+def test_over_long_activity_type_is_rejected_before_the_log(tmp_path):
+    repository = open_repository(tmp_path)
+    with pytest.raises(ValueError, match='longer than 65535 bytes'):
+        repository.add_many([activity_data(), activity_data(activity_type='x' * 70_000)])
+    assert repository.get_all() == []
+    repository.close()
+
+    reopened = open_repository(tmp_path)
+    assert reopened.recovery_stats['wal_records'] == 0
+    reopened.close()
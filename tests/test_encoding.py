@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from app import encoding
+from app.api.endpoints import activity_page_body
+from app.models.activity import Activity
+
+PAYLOAD = {"goal_id": 7, "name": "Läufe ✓", "values": [1, 2.5, -0.125], "nested": {"ok": True, "none": None}}
+
+@pytest.fixture(params=['json', 'orjson'])
+def encoder(request):
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+    previous = encoding.current_encoder().name
+    yield encoding.set_encoder(request.param)
+    encoding.set_encoder(previous)
+
+def test_encoders_round_trip_the_same_json(encoder):
+    encoded = encoding.dumps(PAYLOAD)
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded) == PAYLOAD
+    assert encoding.loads(encoded) == PAYLOAD
+    assert b' ' not in encoding.dumps([1, {"a": 2}])
+
+def test_unknown_encoder_is_rejected():
+    with pytest.raises(ValueError):
+        encoding.get_encoder('pickle')
+
+def test_activity_json_is_built_once(encoder):
+    activity = Activity(1, 2, 'Health', 3.5, '2024-01-01T08:00:00', notes='é')
+    encoded = activity.to_json()
+    assert json.loads(encoded) == activity.to_dict()
+    assert activity.to_json() is encoded
+
+def test_page_body_is_valid_json(encoder):
+    activities = [Activity(i, 2, 'Health', float(i), f'2024-01-0{i}T08:00:00') for i in (1, 2, 3)]
+    body = json.loads(activity_page_body(2, activities, 'next'))
+    assert body == {"goal_id": 2, "activities": [a.to_dict() for a in activities], "count": 3,
+                    "next_cursor": "next", "status": "success"}
+    assert json.loads(activity_page_body(2, [], None))["activities"] == []
+    assert encoding.join_array([b'1', b'"a"']) == b'[1,"a"]'
+
+def test_flask_responses_use_the_configured_encoder(client):
+    response = client.get('/api/insights/rules')
+    assert response.status_code == 200
+    assert response.data == encoding.dumps(response.get_json())
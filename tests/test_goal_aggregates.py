@@ -0,0 +1,74 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.goal_aggregate import GoalAggregate
+from app.repository.activity_repository import InMemoryActivityRepository
+from app.services.dashboard_service import DashboardService
+from tests.conftest import activity_data
+
+def random_records(rnd: random.Random, count: int) -> list:
+    records = []
+    for _ in range(count):
+        moment = datetime(2024, 2, 1) + timedelta(hours=rnd.randrange(24 * 20))
+        records.append(activity_data(goal_id=rnd.randrange(1, 4), activity_type=rnd.choice(['Health', 'Learning']),
+                                     value=float(rnd.randrange(1, 50)), timestamp=moment.isoformat()))
+    return records
+
+def rescan(repository, goal_id) -> GoalAggregate:
+    aggregate = GoalAggregate(goal_id=goal_id)
+    for activity in repository.get_by_goal(goal_id):
+        aggregate.update(activity)
+    return aggregate
+
+def test_aggregates_match_a_rescan_after_every_write(repository):
+    rnd = random.Random(3)
+    for batch in range(6):
+        records = random_records(rnd, rnd.randrange(1, 15))
+        if batch % 2:
+            repository.add_many(records)
+        else:
+            for record in records:
+                repository.add(record)
+
+        for goal_id in (1, 2, 3):
+            expected = rescan(repository, goal_id).to_summary()
+            summary = repository.get_goal_aggregate(goal_id).to_summary()
+            assert summary['total_activities'] == expected['total_activities']
+            assert summary['total_value'] == pytest.approx(expected['total_value'])
+            assert summary.get('last_activity') == expected.get('last_activity')
+            assert summary['activity_by_type'].keys() == expected['activity_by_type'].keys()
+
+def test_unknown_goal_has_an_empty_aggregate(repository):
+    repository.add(activity_data(goal_id=1))
+    assert repository.get_goal_aggregate(99).to_summary() == {
+        "total_activities": 0,
+        "total_value": 0,
+        "average_value": 0,
+        "activity_by_type": {}
+    }
+
+def test_version_changes_with_each_write_to_the_goal(repository):
+    assert repository.get_goal_version(1) == 0
+    repository.add(activity_data(goal_id=1))
+    first = repository.get_goal_version(1)
+    repository.add_many([activity_data(goal_id=1), activity_data(goal_id=1)])
+    second = repository.get_goal_version(1)
+    repository.add(activity_data(goal_id=2))
+
+    assert 0 < first < second
+    assert repository.get_goal_version(1) == second
+
+def test_dashboard_does_not_rescan_history(monkeypatch):
+    repository = InMemoryActivityRepository()
+    repository.add_many([activity_data(value=value) for value in (1, 2, 3)])
+
+    def rescan_history(*args, **kwargs):
+        raise AssertionError("dashboard rescanned the goal's activities")
+    monkeypatch.setattr(repository, 'get_by_goal', rescan_history)
+    monkeypatch.setattr(repository, 'get_all', rescan_history)
+
+    dashboard = DashboardService(repository).build_dashboard(1)
+    assert dashboard['summary']['total_activities'] == 3
+    assert dashboard['summary']['total_value'] == 6
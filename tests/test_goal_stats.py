@@ -0,0 +1,107 @@
+import json
+import random
+import threading
+from datetime import datetime, timedelta
+
+from app.repository import BaseRepository
+from app.repository.activity_repository import InMemoryActivityRepository
+from app.repository.sqlite_repository import SQLiteActivityRepository
+from tests.conftest import activity_data
+
+def test_sqlite_goal_stats_see_one_snapshot(tmp_path):
+    path = str(tmp_path / 'activities.db')
+    repository = SQLiteActivityRepository(path)
+    repository.add(activity_data(goal_id=0))
+
+    def write() -> None:
+        # Every write creates a goal, which a torn read would miss in one query
+        writer = SQLiteActivityRepository(path)
+        for goal_id in range(1, 1000):
+            writer.add(activity_data(goal_id=goal_id))
+        writer.close()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    try:
+        while thread.is_alive():
+            stats = repository.get_goal_stats(None, 19_700, 19_706)
+            assert all(goal_stats.aggregate.count == goal_stats.distinct_days == 1
+                       for goal_stats in stats.values())
+    finally:
+        thread.join()
+        repository.close()
+
+def test_sqlite_goal_stats_match_memory_before_1970(tmp_path):
+    sqlite = SQLiteActivityRepository(str(tmp_path / 'activities.db'))
+    memory = InMemoryActivityRepository()
+    timestamps = ['1969-12-29T12:00:00', '1969-12-30T23:00:00', '1969-12-31T01:00:00', '1970-01-02T06:00:00']
+    for repository in (sqlite, memory):
+        repository.add_many([activity_data(goal_id=goal_id, timestamp=timestamp)
+                             for goal_id in (1, 2) for timestamp in timestamps])
+
+    for goal_ids in (None, [1]):
+        expected = memory.get_goal_stats(goal_ids, -3, 1)
+        got = sqlite.get_goal_stats(goal_ids, -3, 1)
+        assert {goal_id: (stats.distinct_days, stats.longest_streak) for goal_id, stats in got.items()} == \
+            {goal_id: (stats.distinct_days, stats.longest_streak) for goal_id, stats in expected.items()}
+    assert got[1].longest_streak == 3
+    sqlite.close()
+
+def test_goal_stats_match_the_scanning_default(repository):
+    rnd = random.Random(4)
+    records = []
+    for _ in range(200):
+        moment = datetime(2024, 1, 1) + timedelta(hours=rnd.randrange(24 * 30))
+        records.append(activity_data(goal_id=rnd.randrange(1, 8),
+                                     activity_type=rnd.choice(['Health', 'Learning']), value=float(rnd.randrange(1, 20)), timestamp=moment.isoformat()))
+    repository.add_many(records)
+    first_day, last_day = 19_730, 19_736
+
+    for goal_ids in (None, [2, 5, 99]):
+        expected = BaseRepository.get_goal_stats(repository, goal_ids, first_day, last_day)
+        stats = repository.get_goal_stats(goal_ids, first_day, last_day)
+        assert stats.keys() == expected.keys()
+        for goal_id, goal_stats in stats.items():
+            assert goal_stats.aggregate.to_summary() == expected[goal_id].aggregate.to_summary()
+            assert (goal_stats.distinct_days, goal_stats.longest_streak) == \
+                (expected[goal_id].distinct_days, expected[goal_id].longest_streak)
+            assert goal_stats.window_totals == expected[goal_id].window_totals
+
+def test_bulk_insights_match_the_single_goal_endpoint(client):
+    for goal_id, activity_type in ((1, 'Health'), (2, 'Learning'), (3, 'Health')):
+        client.post('/api/activities', json={'goal_id': goal_id, 'activity_type': activity_type, 'value': 10})
+
+    response = client.post('/api/insights/bulk', json={'goal_ids': [3, 1, 42]})
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['count'] == 3
+    assert [goal['goal_id'] for goal in body['goals']] == [3, 1, 42]
+    assert body['goals'][2]['message'] == 'No activities found'
+    single = client.get('/api/insights/optimization?goal_id=1').get_json()
+    assert {name: body['goals'][1][name] for name in single} == single
+
+    filtered = client.post('/api/insights/bulk', json={'filter': {'activity_type': 'Health'}}).get_json()
+    assert [goal['goal_id'] for goal in filtered['goals']] == [1, 3]
+
+def test_bulk_insights_stream_ndjson(client):
+    client.post('/api/activities', json={'goal_id': 1, 'activity_type': 'Health', 'value': 10})
+    response = client.post('/api/insights/bulk', json={'goal_ids': [1, 2]},
+                           headers={'Accept': 'application/x-ndjson'})
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line)['goal_id'] for line in response.data.splitlines()] == [1, 2]
+
+def test_bulk_insights_read_the_repository_once(app, client, monkeypatch):
+    repository = app.extensions['activity_repository']
+    calls = []
+    get_goal_stats = repository.get_goal_stats
+    monkeypatch.setattr(repository, 'get_goal_stats',
+                        lambda *args: calls.append(args) or get_goal_stats(*args))
+
+    client.post('/api/insights/bulk', json={'goal_ids': list(range(50))})
+    assert len(calls) == 1
+
+def test_bulk_insights_reject_bad_requests(client):
+    for body in ({}, {'goal_ids': 'all'}, {'filter': {'colour': 'red'}}, {'filter': {'min_activities': '2'}}):
+        response = client.post('/api/insights/bulk', json=body)
+        assert response.status_code == 400
+        assert response.get_json()['status'] == 'error'
@@ -0,0 +1,115 @@
+import random
+from datetime import timedelta
+
+import pytest
+
+from app.models.activity import epoch_day_to_datetime, today_epoch_day
+from app.models.goal_aggregate import RankIndex, parse_leaderboard_metric
+from app.repository import BaseRepository
+from app.services.insight_service import weekly_window
+from tests.conftest import activity_data
+
+METRICS = ['consistency_score', 'total_value', 'weekly_total', 'total.Health', 'weekly.Learning']
+
+def test_rank_index_orders_by_score_then_first_insertion():
+    ranks = RankIndex()
+    for goal_id, score in [('a', 5), ('b', 9), ('c', 5), ('d', 1)]:
+        ranks.set(goal_id, score)
+    assert ranks.top(3) == [('b', 9), ('a', 5), ('c', 5)]
+
+    ranks.set('a', 5)
+    ranks.set('d', 7)
+    ranks.set('b', 0)
+    ranks.discard('c')
+    ranks.discard('missing')
+    assert ranks.top(10) == [('d', 7), ('a', 5)]
+    assert len(ranks) == 2
+
+def test_rank_index_matches_a_sort_across_buckets(monkeypatch):
+    monkeypatch.setattr(RankIndex, 'BUCKET_SIZE', 4)
+    rnd = random.Random(3)
+    ranks = RankIndex()
+    scores = {}
+    for _ in range(500):
+        goal_id = rnd.randrange(60)
+        score = rnd.choice([0, rnd.randrange(1, 20)])
+        ranks.set(goal_id, score)
+        if score:
+            scores[goal_id] = score
+        else:
+            scores.pop(goal_id, None)
+
+    assert len(ranks) == len(scores)
+    assert [score for _, score in ranks.top(25)] == sorted(scores.values(), reverse=True)[:25]
+    assert all(scores[goal_id] == score for goal_id, score in ranks.top(len(scores)))
+
+@pytest.mark.parametrize('metric', ['streak', 'total.', 'weekly', 'daily.Health'])
+def test_unknown_metrics_are_rejected(metric):
+    with pytest.raises(ValueError):
+        parse_leaderboard_metric(metric)
+
+def load(repository, seed=5):
+    """Integer values on days around the current weekly window, so every total is exact"""
+    rnd = random.Random(seed)
+    today = today_epoch_day()
+    repository.add_many([
+        activity_data(goal_id=rnd.randrange(1, 25), activity_type=rnd.choice(['Health', 'Learning']),
+                      value=float(rnd.randrange(1, 40)),
+                      timestamp=(epoch_day_to_datetime(today - rnd.randrange(20))
+                                 + timedelta(minutes=rnd.randrange(60 * 24))).isoformat())
+        for _ in range(300)
+    ])
+
+def assert_same_ranking(leaders, scores, k):
+    """Same scores in order as a full scan; goals tied at the cut may differ by backend"""
+    assert [score for _, score in leaders] == sorted(scores.values(), reverse=True)[:k]
+    assert all(scores[goal_id] == score for goal_id, score in leaders)
+
+@pytest.mark.parametrize('metric', METRICS)
+def test_top_goals_match_a_full_scan(repository, metric):
+    load(repository)
+    first_day, last_day = weekly_window()
+    leaders = repository.top_goals(metric, 5, first_day, last_day)
+    scores = dict(BaseRepository.top_goals(repository, metric, 100, first_day, last_day))
+
+    assert scores
+    assert_same_ranking(leaders, scores, 5)
+
+def test_rankings_follow_later_writes(repository):
+    load(repository)
+    first_day, last_day = weekly_window()
+    for metric in METRICS:
+        repository.top_goals(metric, 5, first_day, last_day)
+
+    today = epoch_day_to_datetime(today_epoch_day()).isoformat()
+    repository.add(activity_data(goal_id=3, activity_type='Health', value=5000.0, timestamp=today))
+    repository.add_many([activity_data(goal_id=99, activity_type='Learning', value=4000.0, timestamp=today)])
+
+    for metric in METRICS:
+        leaders = repository.top_goals(metric, 5, first_day, last_day)
+        scores = dict(BaseRepository.top_goals(repository, metric, 100, first_day, last_day))
+        assert_same_ranking(leaders, scores, 5)
+    assert repository.top_goals('total.Health', 1, first_day, last_day)[0][0] == 3
+    assert repository.top_goals('weekly.Learning', 1, first_day, last_day)[0][0] == 99
+
+def test_leaderboard_endpoint(client):
+    today = epoch_day_to_datetime(today_epoch_day()).isoformat()
+    for goal_id, value in [(1, 10), (2, 30), (3, 20)]:
+        client.post('/api/activities', json=activity_data(goal_id=goal_id, value=value, timestamp=today))
+
+    response = client.get('/api/leaderboard?metric=weekly.Health&k=2')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['metric'], body['k']) == ('weekly.Health', 2)
+    assert body['leaders'] == [{"rank": 1, "goal_id": 2, "score": 30},
+                               {"rank": 2, "goal_id": 3, "score": 20}]
+
+    assert client.get('/api/leaderboard').get_json()['metric'] == 'consistency_score'
+    assert client.get('/api/leaderboard?k=100000').get_json()['k'] == 100
+    assert client.get('/api/leaderboard?k=many').get_json()['k'] == 10
+
+@pytest.mark.parametrize('query', ['metric=streak', 'metric=total.', 'k=0', 'k=-3'])
+def test_leaderboard_rejects_bad_arguments(client, query):
+    response = client.get(f'/api/leaderboard?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
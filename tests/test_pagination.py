@@ -0,0 +1,91 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.activity import to_epoch_us
+from tests.conftest import activity_data
+
+START = datetime(2024, 3, 1)
+
+def load(repository, count=60, seed=11):
+    """Activities of goal 1 inserted out of timestamp order, with repeated timestamps"""
+    rnd = random.Random(seed)
+    records = []
+    for _ in range(count):
+        moment = START + timedelta(hours=rnd.randrange(48))
+        records.append(activity_data(activity_type=rnd.choice(['Health', 'Learning']),
+                                     value=float(rnd.randrange(100)), timestamp=moment.isoformat()))
+    repository.add_many(records[:count // 2])
+    for record in records[count // 2:]:
+        repository.add(record)
+    repository.add(activity_data(goal_id=2))
+    return sorted(repository.get_by_goal(1), key=lambda a: (a.ts, a.id))
+
+def walk(repository, limit, **filters):
+    """Every page of goal 1, following the keyset cursor"""
+    pages = []
+    after = None
+    while True:
+        page = repository.get_goal_page(1, limit, after=after, **filters)
+        if not page:
+            return pages
+        assert len(page) <= limit
+        pages.append(page)
+        after = (page[-1].ts, page[-1].id)
+
+@pytest.mark.parametrize('limit', [1, 7, 100])
+def test_pages_cover_the_goal_in_order(repository, limit):
+    expected = load(repository)
+    pages = walk(repository, limit)
+    assert [a.id for page in pages for a in page] == [a.id for a in expected]
+    assert all(len(page) == limit for page in pages[:-1])
+
+def test_pages_within_window_and_type(repository):
+    expected = load(repository)
+    start, end = START + timedelta(hours=6), START + timedelta(hours=30)
+    pages = walk(repository, 5, start=start, end=end, activity_type='Health')
+    assert [a.id for page in pages for a in page] == [
+        a.id for a in expected
+        if to_epoch_us(start) <= a.ts < to_epoch_us(end) and a.activity_type == 'Health'
+    ]
+
+def test_writes_between_pages_do_not_repeat_rows(repository):
+    load(repository)
+    first = repository.get_goal_page(1, 10)
+    # An activity older than the cursor lands behind it, a newer one ahead
+    repository.add(activity_data(timestamp=(START - timedelta(days=1)).isoformat()))
+    newest = repository.add(activity_data(timestamp=(START + timedelta(days=5)).isoformat()))
+
+    after = (first[-1].ts, first[-1].id)
+    rest = []
+    while True:
+        page = repository.get_goal_page(1, 10, after=after)
+        if not page:
+            break
+        rest.extend(page)
+        after = (page[-1].ts, page[-1].id)
+
+    seen = [a.id for a in first + rest]
+    assert len(seen) == len(set(seen))
+    assert rest[-1].id == newest.id
+
+def test_api_cursor_walk(client):
+    for hour in (5, 1, 3, 3, 2, 4):
+        client.post('/api/activities', json={'goal_id': 7, 'activity_type': 'Health', 'value': hour,
+                                             'timestamp': (START + timedelta(hours=hour)).isoformat()})
+
+    values = []
+    url = '/api/goals/7/activities?limit=4'
+    while url:
+        body = client.get(url).get_json()
+        values.extend(activity['value'] for activity in body['activities'])
+        cursor = body['next_cursor']
+        url = f'/api/goals/7/activities?limit=4&cursor={cursor}' if cursor else None
+
+    assert values == [1.0, 2.0, 3.0, 3.0, 4.0, 5.0]
+
+def test_api_rejects_bad_cursor_and_limit(client):
+    assert client.get('/api/goals/1/activities?cursor=not-a-cursor').status_code == 400
+    assert client.get('/api/goals/1/activities?limit=0').status_code == 400
+    assert client.get('/api/goals/1/activities?from=yesterday').status_code == 400
@@ -0,0 +1,117 @@
+import sys
+import threading
+import time
+
+from app.api import precompute as precompute_module
+from app.api.cache import ResponseCache, goal_response_key
+from app.api.precompute import PrecomputeScheduler, start_precompute
+from app.main import create_app, stop_background_jobs
+from app.repository.concurrent_repository import ConcurrentInMemoryActivityRepository
+from app.services.rules import RuleBook
+from tests.conftest import activity_data
+
+def scheduler_for(repository, active_days: int = 7) -> PrecomputeScheduler:
+    return PrecomputeScheduler(repository, ResponseCache(), RuleBook(), '/api/goals/{goal_id}/activities',
+                               workers=0, active_days=active_days)
+
+def test_touch_ignores_goals_without_activities():
+    repository = ConcurrentInMemoryActivityRepository()
+    repository.add(activity_data(goal_id=1))
+    scheduler = scheduler_for(repository)
+
+    for goal_id in range(1, 50):
+        scheduler.touch(goal_id, repository.get_goal_version(goal_id))
+    assert scheduler.stats()['active_goals'] == 1
+
+def test_touch_during_day_boundary():
+    scheduler = scheduler_for(ConcurrentInMemoryActivityRepository())
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    done = threading.Event()
+    errors = []
+
+    def touch() -> None:
+        goal_id = 0
+        while not done.is_set():
+            goal_id += 1
+            scheduler.touch(goal_id, 1)
+
+    thread = threading.Thread(target=touch)
+    thread.start()
+    try:
+        for _ in range(100):
+            scheduler.start_new_day()
+    except RuntimeError as e:
+        errors.append(e)
+    finally:
+        done.set()
+        thread.join()
+        sys.setswitchinterval(interval)
+    assert errors == []
+
+def wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+def cache_keys(scheduler, goal_id):
+    version = scheduler.repository.get_goal_version(goal_id)
+    fingerprint = scheduler.rules.plan().fingerprint
+    return [goal_response_key(kind, goal_id, version, fingerprint) for kind in PrecomputeScheduler.KINDS]
+
+def test_burst_of_writes_is_computed_once():
+    repository = ConcurrentInMemoryActivityRepository()
+    scheduler = PrecomputeScheduler(repository, ResponseCache(), RuleBook(), '/api/goals/{goal_id}/activities',
+                                    workers=1, coalesce_seconds=0.2).start()
+    try:
+        for _ in range(20):
+            repository.add(activity_data(goal_id=1))
+            scheduler.mark_dirty([1])
+        assert wait_for(lambda: scheduler.stats()['computed'] == 1)
+        assert all(scheduler.cache.contains(key) for key in cache_keys(scheduler, 1))
+        assert scheduler.stats()['pending'] == 0
+    finally:
+        scheduler.stop()
+
+def test_precompute_skips_cached_payloads():
+    repository = ConcurrentInMemoryActivityRepository()
+    repository.add(activity_data(goal_id=1))
+    scheduler = scheduler_for(repository)
+    for key in cache_keys(scheduler, 1):
+        scheduler.cache.put(key, b'cached')
+
+    scheduler.precompute(1)
+    assert [scheduler.cache.get(key) for key in cache_keys(scheduler, 1)] == [b'cached', b'cached']
+
+def test_new_day_requeues_recent_goals_and_forgets_idle_ones(monkeypatch):
+    scheduler = scheduler_for(ConcurrentInMemoryActivityRepository(), active_days=3)
+    today = precompute_module.today_epoch_day()
+    scheduler.touch(1, 1)
+    monkeypatch.setattr(precompute_module, 'today_epoch_day', lambda: today + 2)
+    scheduler.touch(2, 1)
+
+    monkeypatch.setattr(precompute_module, 'today_epoch_day', lambda: today + 3)
+    scheduler.start_new_day()
+    assert scheduler.stats()['active_goals'] == 1
+    assert scheduler.stats()['pending'] == 1
+
+def test_requests_are_served_from_precomputed_payloads():
+    app = create_app('default')
+    try:
+        client = app.test_client()
+        client.post('/api/activities', json=activity_data(goal_id=3))
+        precompute = app.extensions['precompute']
+        assert wait_for(lambda: precompute.stats()['computed'] == 1)
+
+        assert client.get('/api/dashboard/3').status_code == 200
+        stats = app.extensions['response_cache'].stats()
+        assert (stats['hits'], stats['misses']) == (1, 0)
+    finally:
+        stop_background_jobs(app)
+
+def test_zero_workers_disable_precompute():
+    assert start_precompute(ConcurrentInMemoryActivityRepository(), ResponseCache(), RuleBook(), '',
+                            {'PRECOMPUTE_WORKERS': 0}) is None
@@ -0,0 +1,74 @@
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.activity import to_epoch_us
+from app.models.goal_aggregate import GoalTimeline
+from tests.conftest import activity_data
+
+START = datetime(2024, 5, 1)
+
+def test_timeline_stays_sorted_through_late_inserts():
+    rnd = random.Random(6)
+    timeline = GoalTimeline()
+    keys = []
+    next_id = 1
+    # Small late batches are inserted in place, large ones re-sorted
+    for size in (10, 3, 100, 1, 70, 5):
+        batch = []
+        for _ in range(size):
+            batch.append(SimpleNamespace(ts=rnd.randrange(1000), id=next_id))
+            next_id += 1
+        timeline.insert_many(batch)
+        keys.extend((activity.ts, activity.id) for activity in batch)
+        assert list(zip(timeline.timestamps, timeline.ids)) == sorted(keys)
+
+    first, last = timeline.window(200, 400)
+    assert list(timeline.ids[first:last]) == [activity_id for ts, activity_id in sorted(keys) if 200 <= ts < 400]
+
+def test_drop_before_returns_the_older_ids():
+    timeline = GoalTimeline()
+    timeline.insert_many(SimpleNamespace(ts=ts, id=ts) for ts in (5, 1, 9, 3))
+    assert list(timeline.drop_before(5)) == [1, 3]
+    assert list(timeline.ids) == [5, 9]
+
+def load(repository, seed=12):
+    """Goal 1's activities out of timestamp order, with ties; goal 2 as noise"""
+    rnd = random.Random(seed)
+    records = [activity_data(activity_type=rnd.choice(['Health', 'Learning']), value=float(rnd.randrange(10)),
+                             timestamp=(START + timedelta(hours=rnd.randrange(72))).isoformat())
+               for _ in range(120)]
+    repository.add_many(records[:80])
+    for record in records[80:]:
+        repository.add(record)
+    repository.add(activity_data(goal_id=2, timestamp=START.isoformat()))
+    return repository.get_by_goal(1)
+
+@pytest.mark.parametrize('start, end', [
+    (None, None),
+    (START + timedelta(hours=10), START + timedelta(hours=30)),
+    (START + timedelta(hours=24), None),
+    (None, START),
+    (START + timedelta(hours=5), START + timedelta(hours=5)),
+])
+def test_range_matches_a_filtered_scan(repository, start, end):
+    activities = load(repository)
+    start_us = to_epoch_us(start) if start is not None else None
+    end_us = to_epoch_us(end) if end is not None else None
+
+    for activity_type in (None, 'Health'):
+        expected = sorted(
+            (a for a in activities
+             if (start_us is None or a.ts >= start_us) and (end_us is None or a.ts < end_us)
+             and activity_type in (None, a.activity_type)),
+            key=lambda a: (a.ts, a.id))
+        got = repository.get_by_goal_range(1, start, end, activity_type)
+        assert [a.id for a in got] == [a.id for a in expected]
+
+    totals = {}
+    for a in activities:
+        if (start_us is None or a.ts >= start_us) and (end_us is None or a.ts < end_us):
+            totals[a.activity_type] = totals.get(a.activity_type, 0) + a.value
+    assert repository.sum_by_type(1, start, end) == totals
@@ -0,0 +1,64 @@
+import json
+
+from app.api import cache as cache_module
+from app.api.cache import ResponseCache, goal_response_key
+from tests.conftest import call
+
+ACTIVITY = {'goal_id': 1, 'activity_type': 'Health', 'value': 30, 'timestamp': '2024-01-01T08:00:00'}
+
+def test_lru_evicts_the_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.put('a', b'1')
+    cache.put('b', b'2')
+    assert cache.get('a') == b'1'
+    cache.put('c', b'3')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1'
+    assert cache.stats() == {"entries": 2, "max_entries": 2, "hits": 2, "misses": 1,
+                             "hit_ratio": 0.6667, "evictions": 1}
+
+def test_conditional_get_returns_304_until_the_goal_changes(client):
+    client.post('/api/activities', json=ACTIVITY)
+    for url in ('/api/dashboard/1', '/api/insights/optimization?goal_id=1'):
+        first = client.get(url)
+        assert first.status_code == 200 and first.headers['ETag']
+
+        unchanged = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+        assert unchanged.status_code == 304
+        assert unchanged.data == b''
+        assert unchanged.headers['ETag'] == first.headers['ETag']
+
+    etag = client.get('/api/dashboard/1').headers['ETag']
+    client.post('/api/activities', json=ACTIVITY)
+    changed = client.get('/api/dashboard/1', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['summary']['total_activities'] == 2
+
+def test_repeated_gets_are_served_from_the_cache(app, client):
+    client.post('/api/activities', json=ACTIVITY)
+    first = client.get('/api/dashboard/1')
+    second = client.get('/api/dashboard/1')
+
+    assert first.data == second.data
+    stats = app.extensions['response_cache'].stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+def test_etag_changes_at_midnight(client, monkeypatch):
+    client.post('/api/activities', json=ACTIVITY)
+    today = cache_module.today_epoch_day()
+    etag = client.get('/api/dashboard/1').headers['ETag']
+
+    monkeypatch.setattr(cache_module, 'today_epoch_day', lambda: today + 1)
+    assert client.get('/api/dashboard/1', headers={'If-None-Match': etag}).status_code == 200
+
+def test_asgi_conditional_get(asgi_app):
+    call(asgi_app, 'POST', '/api/activities', json.dumps(ACTIVITY).encode())
+    status, body = call(asgi_app, 'GET', '/api/dashboard/1')
+    key = goal_response_key('dashboard', 1, 1, asgi_app.rules.plan().fingerprint)
+    etag = '"%s"' % '-'.join(str(part) for part in key)
+
+    assert status == 200
+    assert call(asgi_app, 'GET', '/api/dashboard/1', headers=[(b'if-none-match', etag.encode())]) == (304, b'')
+    assert call(asgi_app, 'GET', '/api/dashboard/1', headers=[(b'if-none-match', b'"stale"')]) == (200, body)
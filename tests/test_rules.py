@@ -0,0 +1,117 @@
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.goal_aggregate import GoalAggregate, GoalStats
+from app.services.rules import DEFAULT_RULES, RuleBook, RuleError, compile_rules, goal_features
+from tests.conftest import activity_data
+
+def stats_for(*activities, window_totals=None) -> GoalStats:
+    """GoalStats of goal 1 from (activity_type, value) pairs"""
+    aggregate = GoalAggregate(goal_id=1)
+    for activity_type, value in activities:
+        aggregate.update(SimpleNamespace(activity_type=activity_type, value=value, ts=0))
+    return GoalStats(aggregate, distinct_days=3, longest_streak=2, window_totals=window_totals or {})
+
+class CountingFeatures(dict):
+    """Features that count how often each one is read"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.reads = {}
+
+    def get(self, key, default=None):
+        self.reads[key] = self.reads.get(key, 0) + 1
+        return super().get(key, default)
+
+def test_default_rules_decide_from_goal_features():
+    features = goal_features(stats_for(('Learning', 350), ('Health', 60), window_totals={'Health': 60}))
+    decisions = DEFAULT_RULES.plan().evaluate(features)
+
+    assert features['total.Learning'] == 350 and features['weekly.Health'] == 60
+    assert decisions['wellness_warning'] is True
+    assert decisions['recommendation'].startswith("High learning activity detected")
+    assert decisions['productivity_recommendations'] == [
+        "Consider adding more health activities to your routine."]
+
+def test_first_and_all_modes_with_templates():
+    plan = compile_rules({
+        "badge": {"mode": "first", "rules": [
+            {"when": [["activities", ">=", 3]], "then": "{activities} activities"},
+            {"when": [["activities", ">=", 1]], "then": "started"}
+        ], "default": "none"},
+        "notes": {"mode": "all", "rules": [
+            {"when": [["total.Health", ">", 10]], "then": "health {total.Health}"},
+            {"when": [["activity_types", "==", 2]], "then": "two types"}
+        ]}
+    })
+
+    three = goal_features(stats_for(('Health', 12.0), ('Learning', 1), ('Health', 1)))
+    assert plan.evaluate(three, ['badge', 'notes']) == {"badge": "3 activities",
+                                                         "notes": ["health 13", "two types"]}
+    assert plan.evaluate(goal_features(stats_for()), ['badge', 'notes']) == {"badge": "none", "notes": []}
+
+def test_shared_conditions_are_evaluated_once():
+    plan = compile_rules({})
+    features = CountingFeatures(goal_features(stats_for(('Learning', 500))))
+    plan.evaluate(features)
+    # weekly.Health < 150 appears in three rules across two decisions
+    assert features.reads['weekly.Health'] == 1
+
+def test_mismatched_types_do_not_match():
+    plan = compile_rules({"flag": {"rules": [{"when": [["activities", ">", "many"]], "then": True}],
+                                   "default": False}})
+    assert plan.evaluate({"activities": 3}, ['flag']) == {"flag": False}
+
+@pytest.mark.parametrize('spec', [
+    [],
+    {"x": {"rules": [{"when": [["colour", "==", 1]], "then": 1}]}},
+    {"x": {"rules": [{"when": [["activities", "~", 1]], "then": 1}]}},
+    {"x": {"rules": [{"when": [["activities", ">"]], "then": 1}]}},
+    {"x": {"rules": [{"when": []}]}},
+    {"x": {"mode": "some", "rules": []}},
+    {"x": {"rules": [{"when": [], "then": "{nope}"}]}},
+])
+def test_invalid_rules_are_rejected(spec):
+    with pytest.raises(RuleError):
+        compile_rules(spec)
+
+def test_rule_book_reloads_a_changed_file_and_keeps_the_last_good_plan(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({"wellness_warning": {"rules": [], "default": True}}))
+    rules = RuleBook(str(path), check_interval=0)
+    first = rules.plan()
+    assert first.evaluate({}, ['wellness_warning']) == {"wellness_warning": True}
+
+    path.write_text(json.dumps({"wellness_warning": {"rules": [], "default": False}}))
+    os.utime(path, (1, 1))
+    second = rules.plan()
+    assert second.fingerprint != first.fingerprint
+    assert second.evaluate({}, ['wellness_warning']) == {"wellness_warning": False}
+
+    path.write_text('{"broken"')
+    os.utime(path, (2, 2))
+    assert rules.plan() is second
+    assert rules.last_error
+
+    with pytest.raises(RuleError):
+        RuleBook(str(path))
+
+def test_custom_rules_change_the_served_insights(app, client, tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({"recommendation": {"rules": [
+        {"when": [["activities", ">=", 1]], "then": "Logged {activities}"}
+    ]}}))
+    client.post('/api/activities', json=activity_data(timestamp='2024-01-01T08:00:00'))
+    default = client.get('/api/insights/optimization?goal_id=1')
+
+    app.extensions['insight_rules'] = RuleBook(str(path))
+    custom = client.get('/api/insights/optimization?goal_id=1')
+    assert custom.get_json()['recommendation'] == "Logged 1"
+    assert custom.headers['ETag'] != default.headers['ETag']
+
+    served = client.get('/api/insights/rules').get_json()
+    assert served['source'] == str(path)
+    assert served['fingerprint'] == app.extensions['insight_rules'].plan().fingerprint
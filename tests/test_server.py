@@ -0,0 +1,23 @@
+import pytest
+
+from app.main import create_app, stop_background_jobs
+from app.server import PreforkServer, warm_shared_state
+from tests.conftest import activity_data
+
+def test_prefork_names_the_supported_backend():
+    server = PreforkServer(lambda: create_app('default', background_jobs=False), port=0)
+    with pytest.raises(ValueError, match='supports only ACTIVITY_REPOSITORY=sqlite'):
+        server.run()
+
+def test_warm_up_caches_no_day_keyed_payloads(app):
+    app.extensions['activity_repository'].add_many([activity_data(goal_id=goal_id) for goal_id in range(5)])
+
+    assert warm_shared_state(app, 3) == 3
+    assert app.extensions['response_cache'].stats()['entries'] == 0
+
+def test_wsgi_module_exposes_the_app():
+    import wsgi
+    try:
+        assert wsgi.app.test_client().get('/api/health').status_code == 200
+    finally:
+        stop_background_jobs(wsgi.app)
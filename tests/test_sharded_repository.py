@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from app.repository.sharded_repository import ConsistentHashRing, ShardedActivityRepository
+from tests.conftest import activity_data
+
+GOALS = 200
+
+def test_adding_a_node_moves_only_its_share():
+    before = ConsistentHashRing(range(4))
+    after = before.copy()
+    after.add(4)
+
+    moved = [goal_id for goal_id in range(10_000) if before.node_for(goal_id) != after.node_for(goal_id)]
+    assert all(after.node_for(goal_id) == 4 for goal_id in moved)
+    # Roughly a fifth of the goals, never most of them
+    assert 0.1 < len(moved) / 10_000 < 0.3
+
+@pytest.fixture
+def sharded():
+    repository = ShardedActivityRepository(2)
+    yield repository
+    repository.close()
+
+def test_add_shard_keeps_every_goal(sharded):
+    sharded.add_many([activity_data(goal_id=goal_id % GOALS, value=float(goal_id),
+                                    timestamp=f'2024-01-{goal_id % 28 + 1:02d}T09:00:00')
+                      for goal_id in range(GOALS * 3)])
+    before = {goal_id: (sharded.get_goal_aggregate(goal_id).total_value,
+                        sharded.get_streak_stats(goal_id),
+                        [a.id for a in sharded.get_by_goal(goal_id)])
+              for goal_id in range(GOALS)}
+    versions = {goal_id: sharded.get_goal_version(goal_id) for goal_id in range(GOALS)}
+
+    moved = sharded.add_shard()
+    assert sharded.shard_count == 3
+    assert 0 < moved < GOALS
+
+    after = {goal_id: (sharded.get_goal_aggregate(goal_id).total_value,
+                       sharded.get_streak_stats(goal_id),
+                       [a.id for a in sharded.get_by_goal(goal_id)])
+             for goal_id in range(GOALS)}
+    assert after == before
+    # A moved goal's version moves forward, so no cached response is reused wrongly
+    assert all(sharded.get_goal_version(goal_id) >= version for goal_id, version in versions.items())
+    assert len(sharded.get_all()) == GOALS * 3
+
+    # Writes after the move reach the new owners
+    added = sharded.add_many([activity_data(goal_id=goal_id) for goal_id in range(GOALS)])
+    assert len({a.id for a in added}) == GOALS
+    assert all(sharded.get_goal_aggregate(goal_id).count == 4 for goal_id in range(GOALS))
+
+def test_broadcast_during_add_shard_sees_every_goal(sharded):
+    sharded.add_many([activity_data(goal_id=goal_id) for goal_id in range(GOALS)])
+    thread = threading.Thread(target=sharded.add_shard)
+    thread.start()
+    try:
+        while thread.is_alive():
+            assert sorted(sharded.goal_ids()) == list(range(GOALS))
+    finally:
+        thread.join()
+    assert sorted(sharded.goal_ids()) == list(range(GOALS))
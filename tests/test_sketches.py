@@ -0,0 +1,138 @@
+import bisect
+import random
+
+import pytest
+
+from app.models.sketches import DEFAULT_K, DayBitmap, GoalSketches, KllSketch, kll_rank_error
+from app.models.activity import Activity
+
+@pytest.fixture(autouse=True)
+def seeded_compaction():
+    """KLL compaction picks its offsets with the random module; fix them per test"""
+    state = random.getstate()
+    random.seed(0)
+    yield
+    random.setstate(state)
+
+def rank_error(sorted_values, value, q) -> float:
+    """Distance from q to the nearest rank `value` holds in the exact data"""
+    low = bisect.bisect_left(sorted_values, value) / len(sorted_values)
+    high = bisect.bisect_right(sorted_values, value) / len(sorted_values)
+    return 0.0 if low <= q <= high else min(abs(q - low), abs(q - high))
+
+QUANTILES = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+DISTRIBUTIONS = {
+    'uniform': lambda rnd: rnd.random(),
+    'lognormal': lambda rnd: rnd.lognormvariate(3, 1.5),
+    'few_values': lambda rnd: float(rnd.randrange(5)),
+}
+
+def test_exact_below_k():
+    values = [float(v) for v in random.Random(1).sample(range(1000), DEFAULT_K - 1)]
+    sketch = KllSketch()
+    for value in values:
+        sketch.update(value)
+
+    assert sketch.rank_error() == 0.0
+    exact = sorted(values)
+    for q in QUANTILES:
+        assert rank_error(exact, sketch.quantile(q), q) <= 1 / len(values)
+
+@pytest.mark.parametrize('distribution', sorted(DISTRIBUTIONS))
+@pytest.mark.parametrize('count', [1_000, 50_000])
+def test_rank_error_within_bound(distribution, count):
+    rnd = random.Random(count)
+    values = [DISTRIBUTIONS[distribution](rnd) for _ in range(count)]
+    sketch = KllSketch()
+    for value in values:
+        sketch.update(value)
+
+    exact = sorted(values)
+    bound = kll_rank_error(DEFAULT_K)
+    assert sketch.rank_error() == bound
+    for q in QUANTILES:
+        assert rank_error(exact, sketch.quantile(q), q) <= bound
+    assert (sketch.count, sketch.min, sketch.max) == (count, exact[0], exact[-1])
+    assert sketch.quantiles([0, 1]) == [exact[0], exact[-1]]
+
+def test_retained_values_stay_bounded():
+    sketch = KllSketch()
+    rnd = random.Random(7)
+    for _ in range(200_000):
+        sketch.update(rnd.random())
+    # About 3k values however long the stream, plus the minimum-width low levels
+    assert sum(len(level) for level in sketch._levels) < 4 * DEFAULT_K
+
+def test_merge_keeps_the_bound():
+    rnd = random.Random(3)
+    values = [rnd.gauss(0, 1) for _ in range(30_000)]
+    parts = [KllSketch() for _ in range(3)]
+    for index, value in enumerate(values):
+        parts[index % 3].update(value)
+
+    merged = KllSketch()
+    for part in parts:
+        merged.merge(part)
+
+    exact = sorted(values)
+    assert merged.count == len(values)
+    for q in QUANTILES:
+        assert rank_error(exact, merged.quantile(q), q) <= kll_rank_error(DEFAULT_K)
+
+def test_empty_sketch():
+    assert KllSketch().quantiles([0.5, 0.9]) == [None, None]
+
+def test_day_bitmap_counts_windows():
+    rnd = random.Random(5)
+    days = {rnd.randrange(19_000, 19_400) for _ in range(150)}
+    bitmap = DayBitmap()
+    for day in days:
+        bitmap.add(day)
+
+    for first_day, last_day in [(None, None), (19_100, 19_199), (18_000, 19_000),
+                                (19_399, 40_000), (19_300, 19_200)]:
+        expected = sum(1 for day in days
+                       if (first_day is None or day >= first_day) and (last_day is None or day <= last_day))
+        assert bitmap.count(first_day, last_day) == expected
+
+    other = DayBitmap()
+    other.add(18_990)
+    other.merge(bitmap)
+    assert other.count() == len(days) + 1
+
+def test_day_bitmap_outlier_adds_one_chunk():
+    bitmap = DayBitmap()
+    for day in range(19_000, 19_030):
+        bitmap.add(day)
+    # 1970-01-01 and 9999-12-31 next to a month of 2022
+    bitmap.add(0)
+    bitmap.add(2_932_896)
+
+    assert len(bitmap.chunks) == 3
+    assert all(bits.bit_length() <= 1024 for bits in bitmap.chunks.values())
+    assert bitmap.count() == 32
+    assert bitmap.count(19_000, 19_009) == 10
+    assert bitmap.count(1, 2_932_895) == 30
+    assert bitmap.count(-5, 0) == 1
+
+    other = DayBitmap()
+    other.add(-1)
+    other.merge(bitmap)
+    copy = other.copy()
+    copy.add(19_100)
+    assert (other.count(), copy.count()) == (33, 34)
+
+def test_goal_sketches_split_by_type():
+    sketches = GoalSketches()
+    for index in range(300):
+        sketches.update(Activity(id=index, goal_id=1, activity_type='Health' if index % 3 else 'Learning',
+                                 value=float(index), timestamp=index * 3_600_000_000))
+
+    assert sketches.by_type['Learning'].values.count == 100
+    assert sketches.by_type['Health'].values.count == 200
+    combined = sketches.combined()
+    assert combined.values.count == 300
+    assert combined.days.count() == 13
+    copy = sketches.copy()
+    copy.update(Activity(id=301, goal_id=1, activity_type='Health', value=1.0, timestamp=0))
+    assert sketches.by_type['Health'].values.count == 200
@@ -0,0 +1,68 @@
+import random
+from datetime import date, datetime, timedelta
+
+from app.repository.activity_repository import InMemoryActivityRepository
+from app.repository.sqlite_repository import SQLiteActivityRepository
+from tests.conftest import activity_data
+
+TIMESTAMPS = ['1969-12-30T12:00:00', '1969-12-31T00:00:00', '1969-12-31T23:59:59',
+              '1970-01-01T00:00:00', '1970-01-02T06:00:00']
+
+def test_active_days_before_1970_round_down(tmp_path):
+    sqlite = SQLiteActivityRepository(str(tmp_path / 'activities.db'))
+    memory = InMemoryActivityRepository()
+    for repository in (sqlite, memory):
+        repository.add_many([activity_data(timestamp=timestamp) for timestamp in TIMESTAMPS])
+
+    expected = [date(1969, 12, 30), date(1969, 12, 31), date(1970, 1, 1), date(1970, 1, 2)]
+    assert sqlite.get_active_dates(1) == memory.get_active_dates(1) == expected
+    sqlite.close()
+
+def load_both(tmp_path, seed=5, count=300):
+    """The same random history in a SQLite and an in-memory repository"""
+    rnd = random.Random(seed)
+    records = []
+    for _ in range(count):
+        moment = datetime(2024, 1, 1) + timedelta(minutes=rnd.randrange(60 * 24 * 40))
+        records.append(activity_data(goal_id=rnd.randrange(1, 6),
+                                     activity_type=rnd.choice(['Health', 'Learning', 'Work']),
+                                     value=float(rnd.randrange(1, 100)), timestamp=moment.isoformat()))
+    sqlite = SQLiteActivityRepository(str(tmp_path / 'activities.db'))
+    memory = InMemoryActivityRepository()
+    for repository in (sqlite, memory):
+        repository.add_many(records[:count // 2])
+        for record in records[count // 2:]:
+            repository.add(record)
+    return sqlite, memory
+
+def test_pushed_down_queries_match_memory(tmp_path):
+    sqlite, memory = load_both(tmp_path)
+    start, end = datetime(2024, 1, 10), datetime(2024, 1, 25, 12)
+
+    assert sqlite.goal_ids() == sorted(memory.goal_ids())
+    for goal_id in range(1, 7):
+        # Whole-number values, so the totals agree exactly whatever the summation order
+        assert sqlite.get_goal_aggregate(goal_id).to_summary() == memory.get_goal_aggregate(goal_id).to_summary()
+        assert sqlite.sum_by_type(goal_id, start, end) == memory.sum_by_type(goal_id, start, end)
+        assert sqlite.get_day_totals(goal_id, 19_740, 19_746) == memory.get_day_totals(goal_id, 19_740, 19_746)
+        assert sqlite.get_active_dates(goal_id) == memory.get_active_dates(goal_id)
+        assert sqlite.get_streak_stats(goal_id) == memory.get_streak_stats(goal_id)
+        assert [a.id for a in sqlite.get_by_goal_range(goal_id, start, end, 'Health')] == \
+            [a.id for a in memory.get_by_goal_range(goal_id, start, end, 'Health')]
+    sqlite.close()
+
+def test_bulk_load_rebuilds_indexes_and_survives_reopen(tmp_path):
+    path = str(tmp_path / 'activities.db')
+    repository = SQLiteActivityRepository(path)
+    chunks = [[activity_data(goal_id=goal_id, value=float(i)) for i in range(10)] for goal_id in (1, 2, 3)]
+    assert repository.bulk_load(chunks) == 30
+    repository.close()
+
+    reopened = SQLiteActivityRepository(path)
+    indexes = {name for (name,) in reopened._connection().execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'activities'")}
+    assert {'idx_activities_goal_ts', 'idx_activities_goal_type'} <= indexes
+    assert reopened.get_goal_aggregate(2).total_value == 45
+    assert reopened.get_goal_version(2) == 1
+    assert reopened.add(activity_data(goal_id=2)).id == 31
+    reopened.close()
@@ -0,0 +1,54 @@
+import random
+from types import SimpleNamespace
+
+from app.models.goal_aggregate import GoalDayIndex, longest_run
+from app.models.activity import epoch_day_to_datetime
+from tests.conftest import activity_data
+
+def day_activity(day: int, activity_type: str = 'Health', value: float = 1.0):
+    return SimpleNamespace(day=day, activity_type=activity_type, value=value)
+
+def test_gap_filled_later_joins_both_runs():
+    index = GoalDayIndex()
+    for day in (10, 11, 12, 14, 15):
+        index.update(day_activity(day))
+    assert index.longest_streak == 3
+
+    index.update(day_activity(13))
+    assert index.longest_streak == 6
+    assert index.distinct_days == 6
+
+def test_days_in_any_order_give_the_sorted_streak():
+    rnd = random.Random(8)
+    for _ in range(50):
+        days = rnd.sample(range(200), rnd.randrange(1, 80))
+        index = GoalDayIndex()
+        for day in days + days[:5]:
+            index.update(day_activity(day))
+        assert index.distinct_days == len(days)
+        assert index.longest_streak == longest_run(sorted(days))
+
+def test_window_totals_match_the_daily_sum():
+    rnd = random.Random(9)
+    index = GoalDayIndex()
+    entries = [(rnd.randrange(100), rnd.choice(['Health', 'Learning']), float(rnd.randrange(10)))
+               for _ in range(300)]
+    for day, activity_type, value in entries:
+        index.update(day_activity(day, activity_type, value))
+
+    for first_day, last_day in [(0, 99), (3, 4), (5, 40), (17, 17), (50, 20)]:
+        expected = {}
+        for day, activity_type, value in entries:
+            if first_day <= day <= last_day:
+                expected[activity_type] = expected.get(activity_type, 0) + value
+        assert index.window_totals(first_day, last_day) == expected
+
+def test_repositories_track_streaks_from_late_activities(repository):
+    day = 19_800
+    for offset in (0, 1, 2, 4, 5):
+        repository.add(activity_data(timestamp=epoch_day_to_datetime(day + offset).isoformat()))
+    assert repository.get_streak_stats(1) == (5, 3)
+
+    # A late activity fills the gap
+    repository.add(activity_data(timestamp=epoch_day_to_datetime(day + 3).isoformat()))
+    assert repository.get_streak_stats(1) == (6, 6)
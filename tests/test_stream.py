@@ -0,0 +1,136 @@
+import json
+import time
+
+import pytest
+
+from app.api.cache import ResponseCache
+from app.api.endpoints import GOAL_ACTIVITIES_URL
+from app.api.stream import DashboardBroadcaster, StreamLimitError, StreamSubscriber, merge_patch
+from app.main import create_app, stop_background_jobs
+from app.repository.concurrent_repository import ConcurrentInMemoryActivityRepository
+from app.services.rules import RuleBook
+from tests.conftest import activity_data
+
+def apply_patch(target, patch):
+    """Apply a JSON merge patch (RFC 7386)"""
+    result = dict(target)
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        elif isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = apply_patch(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+def parse_events(chunks):
+    """(event, id, data) of each Server-Sent Event in some encoded chunks"""
+    events = []
+    for message in b''.join(chunks).decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], int(fields['id']), json.loads(fields['data'])))
+    return events
+
+def broadcaster(**kwargs):
+    """A broadcaster over a fresh repository; tests call push() unless they start() it"""
+    return DashboardBroadcaster(ConcurrentInMemoryActivityRepository(), ResponseCache(), RuleBook(),
+                                GOAL_ACTIVITIES_URL, **kwargs)
+
+def test_merge_patch_sends_only_changes():
+    before = {"a": 1, "b": {"x": 1, "y": 2}, "c": [1], "gone": True}
+    after = {"a": 1, "b": {"x": 1, "y": 3, "z": 0}, "c": [1, 2], "new": "v"}
+    patch = merge_patch(before, after)
+
+    assert patch == {"b": {"y": 3, "z": 0}, "c": [1, 2], "new": "v", "gone": None}
+    assert apply_patch(before, patch) == after
+    assert merge_patch(after, after) == {}
+
+def test_subscribers_get_a_snapshot_then_deltas():
+    stream = broadcaster()
+    repository = stream.repository
+    repository.add(activity_data(timestamp='2024-01-01T08:00:00'))
+    first = stream.subscribe(StreamSubscriber(1))
+    stream.push(1)
+
+    [(event, version, snapshot)] = parse_events(first.get(0))
+    assert (event, version) == ('snapshot', repository.get_goal_version(1))
+    assert snapshot == stream.dashboard_service.build_dashboard(1)
+
+    repository.add(activity_data(activity_type='Learning', value=90, timestamp='2024-01-02T08:00:00'))
+    stream.push(1)
+    [(event, version, delta)] = parse_events(first.get(0))
+    assert (event, version) == ('delta', repository.get_goal_version(1))
+    assert apply_patch(snapshot, delta) == stream.dashboard_service.build_dashboard(1)
+    assert len(delta) < len(snapshot)
+
+    # Unchanged goals push nothing; late subscribers start from the latest snapshot
+    stream.push(1)
+    assert first.get(0) == []
+    second = stream.subscribe(StreamSubscriber(1))
+    [(event, _, latest)] = parse_events(second.get(0))
+    assert event == 'snapshot' and latest == apply_patch(snapshot, delta)
+
+def test_stalled_subscriber_resyncs_from_a_snapshot():
+    subscriber = StreamSubscriber(1)
+    for n in range(StreamSubscriber.MAX_PENDING):
+        subscriber.push(b'delta %d' % n, b'snapshot')
+    subscriber.push(b'one too many', b'snapshot')
+    assert subscriber.get(0) == [b'snapshot']
+
+def test_subscriptions_are_limited_and_released():
+    stream = broadcaster(max_subscribers=1)
+    subscriber = stream.subscribe(StreamSubscriber(1))
+    with pytest.raises(StreamLimitError):
+        stream.subscribe(StreamSubscriber(2))
+
+    stream.unsubscribe(subscriber)
+    stream.unsubscribe(subscriber)
+    assert stream.stats()['subscribers'] == 0
+    stream.subscribe(StreamSubscriber(2))
+
+def test_burst_of_writes_is_pushed_once():
+    stream = broadcaster(coalesce_seconds=0.3, poll_seconds=60).start()
+    try:
+        subscriber = stream.subscribe(StreamSubscriber(1))
+        assert [event for event, _, _ in parse_events(subscriber.get(5))] == ['snapshot']
+
+        for day in range(1, 9):
+            stream.repository.add(activity_data(timestamp=f'2024-01-0{day}T08:00:00'))
+            stream.notify([1, 2])
+        events = parse_events(subscriber.get(5))
+
+        assert [(event, version) for event, version, _ in events] == [
+            ('delta', stream.repository.get_goal_version(1))]
+        assert stream.stats()['computed'] == 2
+    finally:
+        stream.stop()
+    assert subscriber.closed
+
+def test_stream_endpoint_needs_the_background_jobs(client):
+    response = client.get('/api/goals/1/stream')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'error'
+
+def test_stream_endpoint_sends_server_sent_events():
+    app = create_app('default')
+    try:
+        client = app.test_client()
+        client.post('/api/activities', json=activity_data(timestamp='2024-01-01T08:00:00'))
+        response = client.get('/api/goals/1/stream', buffered=False)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+        chunks = iter(response.response)
+        assert next(chunks) == b'retry: 3000\n\n'
+        [(event, _, snapshot)] = parse_events([next(chunks)])
+        assert event == 'snapshot' and snapshot['goal_id'] == 1
+        response.close()
+
+        deadline = time.monotonic() + 5
+        while app.extensions['dashboard_stream'].stats()['subscribers'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert app.extensions['dashboard_stream'].stats()['subscribers'] == 0
+    finally:
+        stop_background_jobs(app)
@@ -0,0 +1,6 @@
+from app.main import create_app
+
+# WSGI entry point for external servers: gunicorn wsgi:app, flask --app wsgi run.
+# run.py builds its app only when run as a script, so that --prefork and --asgi
+# do not start a Flask app (and its background threads) they never serve.
+app = create_app()